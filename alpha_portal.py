@@ -1,11 +1,12 @@
 from flask import Flask, jsonify, request, render_template
 from python_agent_runner.agents.genesis_agent import GenesisAgent
+from python_agent_runner.shared.embedding_cache import embed_texts, get_embedding_cache
+from python_agent_runner.shared.llm_client import get_llm_client
 import uuid
 import threading
 import json
 from collections import deque
 import logging
-import ollama
 import chromadb
 
 # --- NEW: Setup for RAG ---
@@ -21,6 +22,7 @@ except Exception as e:
 
 app = Flask(__name__)
 tasks = {}
+llm_client = get_llm_client()
 
 class TaskLogHandler(logging.Handler):
     def __init__(self, task_id):
@@ -31,13 +33,16 @@ class TaskLogHandler(logging.Handler):
     def emit(self, record):
         tasks[self.task_id]['logs'].append(self.format(record))
 
-def run_miso_pipeline(task_id, objective, project_name):
+def run_miso_pipeline(task_id, objective, project_name, incremental=False):
     task_handler = TaskLogHandler(task_id)
     logging.getLogger().addHandler(task_handler)
     tasks[task_id]['status'] = 'RUNNING'
+    tasks[task_id]['progress'] = {}
+    def record_progress(event):
+        tasks[task_id]['progress'][event['file']] = event
     try:
-        genesis_agent = GenesisAgent()
-        proposal = {"project_name": project_name, "objective": objective}
+        genesis_agent = GenesisAgent(progress_callback=record_progress)
+        proposal = {"project_name": project_name, "objective": objective, "incremental": incremental}
         result = genesis_agent.create_codebase(proposal)
         tasks[task_id]['result'] = result
         tasks[task_id]['status'] = 'COMPLETE'
@@ -60,7 +65,8 @@ def create_task():
     task_id = str(uuid.uuid4())
     project_name = " ".join(objective.split()[:4]).replace(" ", "_")
     tasks[task_id] = {'status': 'PENDING'}
-    thread = threading.Thread(target=run_miso_pipeline, args=(task_id, objective, project_name))
+    incremental = bool(request.json.get('incremental', False))
+    thread = threading.Thread(target=run_miso_pipeline, args=(task_id, objective, project_name, incremental))
     thread.start()
     return jsonify({"task_id": task_id})
 
@@ -69,7 +75,18 @@ def get_status(task_id):
     task = tasks.get(task_id)
     if not task: return jsonify({"error": "Task not found"}), 404
     log_output = "\n".join(task.get('logs', ['No logs yet...']))
-    return jsonify({"task_id": task_id, "status": task.get('status'), "log_output": log_output, "result": task.get('result')})
+    progress = dict(task.get('progress', {}))
+    return jsonify({"task_id": task_id, "status": task.get('status'), "log_output": log_output, "progress": progress, "result": task.get('result')})
+
+@app.route('/api/llm/stats')
+def get_llm_stats():
+    """Returns per-model LLM call counters plus response and embedding cache statistics."""
+    embedding_cache = get_embedding_cache()
+    return jsonify({
+        "models": llm_client.get_stats(),
+        "cache": llm_client.get_cache_stats(),
+        "embeddings": embedding_cache.get_stats() if embedding_cache else {"mode": "off"},
+    })
 
 @app.route('/api/query', methods=['POST'])
 def handle_query():
@@ -83,12 +100,12 @@ def handle_query():
     logging.info(f"Received query: {question}")
 
     try:
-        response = ollama.embeddings(model='mxbai-embed-large', prompt=question)
-        results = code_collection.query(query_embeddings=[response["embedding"]], n_results=5)
+        embedding = embed_texts(llm_client, 'mxbai-embed-large', [question])[0]
+        results = code_collection.query(query_embeddings=[embedding.tolist()], n_results=5)
         context_docs = "\n---\n".join(results['documents'][0])
     
         prompt = f"You are MISO, an AI Software Architect. Answer the user's question based ONLY on the following relevant snippets from your own source code. If the answer is not in the context, say so.\n\n**CONTEXT:**\n{context_docs}\n\n**QUESTION:**\n{question}\n\n**ANSWER:**"
-        llm_response = ollama.chat(model="llama3", messages=[{'role': 'user', 'content': prompt}])
+        llm_response = llm_client.chat(model="llama3", messages=[{'role': 'user', 'content': prompt}])
         answer = llm_response['message']['content']
     except Exception as e:
         logging.error(f"Error during RAG query: {e}")
@@ -1,57 +1,151 @@
 import os
+import json
+import hashlib
+import time
 import chromadb
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from langchain.text_splitter import PythonCodeTextSplitter
-import ollama
+from python_agent_runner.shared.embedding_cache import embed_texts
+from python_agent_runner.shared.llm_client import get_llm_client
 import logging
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
-def create_code_index():
-    """Reads MISO's source code, chunks it, and stores it in a ChromaDB vector store."""
+EMBEDDING_MODEL = 'mxbai-embed-large'
+MANIFEST_NAME = "index_manifest.json"
+
+def _sha256(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def _chunk_ids(file_path, chunk_texts):
+    """Stable chunk IDs: file path + chunk content hash (+ occurrence number for repeated chunks)."""
+    ids, seen = [], {}
+    for text in chunk_texts:
+        digest = _sha256(text)[:16]
+        occurrence = seen.get(digest, 0)
+        seen[digest] = occurrence + 1
+        ids.append(f"{file_path}::{digest}" + (f"::{occurrence}" if occurrence else ""))
+    return ids
+
+def _load_manifest(db_directory):
+    try:
+        with open(os.path.join(db_directory, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+def _save_manifest(db_directory, manifest):
+    path = os.path.join(db_directory, MANIFEST_NAME)
+    with open(path + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+def _embed_batch(llm_client, batch):
+    """Embeds a batch of chunks, with one request for those not in the embedding cache. Returns (batch, embeddings)."""
+    embeddings = embed_texts(llm_client, EMBEDDING_MODEL, [chunk["text"] for chunk in batch], batch_size=len(batch))
+    return batch, embeddings.tolist()
+
+def create_code_index(batch_size=32, max_workers=4):
+    """
+    Reads MISO's source code, chunks it, and stores it in a ChromaDB vector store.
+    Chunks are embedded in batches of batch_size by up to max_workers concurrent
+    requests and written to the collection with bulk upserts.
+
+    Indexing is incremental: a manifest of file hashes records what is already
+    stored, only new or modified files are re-chunked, only chunks whose stable
+    ID is not yet in the collection are embedded, and chunks of deleted or
+    modified files that no longer exist are removed.
+    """
     logging.info("Starting MISO codebase indexing...")
-    
+
     SOURCE_DIRECTORY = "python_agent_runner"
     DB_DIRECTORY = "miso_code_db"
     COLLECTION_NAME = "miso_source_code"
 
-    # 1. Load and Chunk Code
-    documents = []
+    # 1. Find new, modified and deleted files
+    client = chromadb.PersistentClient(path=DB_DIRECTORY)
+    collection = client.get_or_create_collection(name=COLLECTION_NAME)
+    max_add_size = client.get_max_batch_size()
+
+    manifest = _load_manifest(DB_DIRECTORY)
+    if manifest is None:
+        logging.info("No index manifest found. Rebuilding the index from scratch.")
+        legacy_ids = collection.get(include=[])["ids"]
+        for offset in range(0, len(legacy_ids), max_add_size):
+            collection.delete(ids=legacy_ids[offset:offset + max_add_size])
+        manifest = {"files": {}}
+
+    current_files = {}
     for root, _, files in os.walk(SOURCE_DIRECTORY):
         for file in files:
             if file.endswith('.py'):
                 file_path = os.path.join(root, file)
-                logging.info(f"Loading: {file_path}")
                 with open(file_path, 'r', encoding='utf-8') as f:
                     code = f.read()
-                documents.append({"code": code, "source": file_path})
+                current_files[file_path] = (code, _sha256(code))
 
-    text_splitter = PythonCodeTextSplitter(chunk_size=2000, chunk_overlap=200)
-    chunks = []
-    for doc in documents:
-        split_chunks = text_splitter.create_documents([doc["code"]])
-        for chunk in split_chunks:
-            chunks.append({"text": chunk.page_content, "metadata": {"source": doc["source"]}})
-    
-    logging.info(f"Split codebase into {len(chunks)} chunks.")
-
-    # 2. Setup Vector Database
-    client = chromadb.PersistentClient(path=DB_DIRECTORY)
-    collection = client.get_or_create_collection(name=COLLECTION_NAME)
+    indexed_files = manifest["files"]
+    changed = [p for p, (_, digest) in current_files.items() if indexed_files.get(p, {}).get("sha256") != digest]
+    deleted = [p for p in indexed_files if p not in current_files]
+    logging.info(f"{len(current_files)} source files: {len(changed)} new or modified, {len(deleted)} deleted, "
+                 f"{len(current_files) - len(changed)} unchanged.")
 
-    # 3. Embed and Store
-    logging.info("Generating embeddings and storing in vector DB. This may take a few minutes...")
-    for i, chunk in enumerate(chunks):
-        response = ollama.embeddings(
-            model='mxbai-embed-large',
-            prompt=chunk["text"]
-        )
-        collection.add(
-            ids=[str(i)],
-            embeddings=[response["embedding"]],
-            documents=[chunk["text"]],
-            metadatas=[chunk["metadata"]]
+    # 2. Chunk changed files and work out which chunks to embed and which to remove
+    text_splitter = PythonCodeTextSplitter(chunk_size=2000, chunk_overlap=200)
+    chunks, stale_ids = [], []
+    for file_path in deleted:
+        stale_ids.extend(indexed_files.pop(file_path).get("chunk_ids", []))
+    for file_path in changed:
+        code, digest = current_files[file_path]
+        logging.info(f"Chunking: {file_path}")
+        texts = [chunk.page_content for chunk in text_splitter.create_documents([code])]
+        ids = _chunk_ids(file_path, texts)
+        old_ids = set(indexed_files.get(file_path, {}).get("chunk_ids", []))
+        existing = set(collection.get(ids=ids, include=[])["ids"]) if ids else set()
+        stale_ids.extend(old_ids - set(ids))
+        chunks.extend(
+            {"id": chunk_id, "text": text, "metadata": {"source": file_path}}
+            for chunk_id, text in zip(ids, texts) if chunk_id not in existing
         )
-    
+        indexed_files[file_path] = {"sha256": digest, "chunk_ids": ids}
+
+    for offset in range(0, len(stale_ids), max_add_size):
+        collection.delete(ids=stale_ids[offset:offset + max_add_size])
+    logging.info(f"Removed {len(stale_ids)} stale chunks. {len(chunks)} chunks need embedding.")
+
+    # 3. Embed (batched, concurrent) and Store (bulk upserts from this thread only)
+    logging.info(f"Embedding {len(chunks)} chunks in batches of {batch_size} with {max_workers} worker(s)...")
+    llm_client = get_llm_client()
+    # The client is shared, so the raised embedding limit only lasts for this run.
+    previous_limit = llm_client.model_limits.get(EMBEDDING_MODEL, llm_client.max_concurrency)
+    llm_client.set_model_limit(EMBEDDING_MODEL, max_workers)
+    try:
+        started = time.perf_counter()
+        stored = 0
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(_embed_batch, llm_client, chunks[start:start + batch_size])
+                for start in range(0, len(chunks), batch_size)
+            ]
+            for future in as_completed(futures):
+                batch, embeddings = future.result()
+                for offset in range(0, len(batch), max_add_size):
+                    part = batch[offset:offset + max_add_size]
+                    collection.upsert(
+                        ids=[chunk["id"] for chunk in part],
+                        embeddings=embeddings[offset:offset + max_add_size],
+                        documents=[chunk["text"] for chunk in part],
+                        metadatas=[chunk["metadata"] for chunk in part]
+                    )
+                stored += len(batch)
+                logging.info(f"Stored {stored}/{len(chunks)} chunks.")
+    finally:
+        llm_client.set_model_limit(EMBEDDING_MODEL, previous_limit)
+
+    elapsed = time.perf_counter() - started
+    throughput = stored / elapsed if elapsed > 0 else 0.0
+    logging.info(f"Embedded and stored {stored} chunks in {elapsed:.1f}s ({throughput:.1f} chunks/sec).")
+    _save_manifest(DB_DIRECTORY, manifest)
     logging.info(f"? Successfully indexed {collection.count()} code chunks into ChromaDB at '{DB_DIRECTORY}'.")
 
 if __name__ == "__main__":
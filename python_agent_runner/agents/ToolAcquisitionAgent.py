@@ -1,29 +1,58 @@
 import os
 import logging
+import re
+import shutil
 import subprocess
 import sys
 import ast
 import json
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlparse
-import ollama
+from ..shared.env_cache import EnvironmentCache, local_references
+from ..shared.git_mirror import GitMirrorCache
+from ..shared.llm_client import get_llm_client
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
+GENERATED_TESTS_DIR = "miso_generated_tests"
+TEST_FILE_INDEX = re.compile(r"test_miso_(\d+)")
+
 class ToolAcquisitionAgent:
     """
     Orchestrates the conversion of a code repository into validated, executable tools for MISO.
     """
-    def __init__(self):
+    def __init__(self, max_workers=8, test_workers=None, env_cache_dir=".miso_cache/envs",
+                 mirror_cache_dir=".miso_cache/git_mirrors"):
+        """
+        max_workers bounds concurrent test generation requests. test_workers > 1 runs the
+        batched pytest session on that many pytest-xdist worker processes; the default uses
+        one per core. pytest-xdist is always installed, so the environment (and its cache
+        key) does not depend on the host. Environments are cloned
+        from templates cached in env_cache_dir; None builds each one from scratch. Repositories
+        are checked out from bare mirrors kept in mirror_cache_dir; None clones them directly.
+        """
         self.logger = logging.getLogger(self.__class__.__name__)
         self.base_dir = "research_subjects"
         os.makedirs(self.base_dir, exist_ok=True)
-        self.ollama_client = ollama.Client()
+        self.llm_client = get_llm_client()
+        self.max_workers = max_workers
+        self.test_workers = test_workers or os.cpu_count() or 1
+        self.env_cache = EnvironmentCache(env_cache_dir) if env_cache_dir else None
+        self.git_mirrors = GitMirrorCache(mirror_cache_dir) if mirror_cache_dir else None
         self.logger.info("Tool Acquisition Agent initialized.")
 
-    def _clone_repository(self, github_url):
+    def _clone_repository(self, github_url, refresh=True):
+        """
+        Returns a working copy of the repository in research_subjects. With the mirror cache
+        it is a shallow checkout of a local bare mirror, refreshed incrementally when refresh
+        is set; otherwise a full clone that is reused as-is once it exists.
+        """
         try:
             repo_name = os.path.splitext(os.path.basename(urlparse(github_url).path))[0]
             clone_dir = os.path.join(self.base_dir, repo_name)
+            if self.git_mirrors and (not os.path.isdir(clone_dir) or os.path.isdir(os.path.join(clone_dir, ".git"))):
+                return self.git_mirrors.checkout(github_url, clone_dir, refresh=refresh)
             if os.path.isdir(clone_dir):
                 self.logger.info(f"Repository '{repo_name}' already exists. Using existing directory.")
                 return clone_dir
@@ -48,13 +77,25 @@ class ToolAcquisitionAgent:
         venv_path = os.path.join(repo_path, ".venv")
         pip_executable = os.path.join(venv_path, 'Scripts', 'pip.exe') if sys.platform == "win32" else os.path.join(venv_path, 'bin', 'pip')
         python_executable = os.path.join(venv_path, 'Scripts', 'python.exe') if sys.platform == "win32" else os.path.join(venv_path, 'bin', 'python')
+        # Install pytest and any other dependencies
+        deps_to_install = ["pytest", "pytest-xdist"] + dependencies
+        local = local_references(deps_to_install)
+        if local:
+            self.logger.info(f"Requirements reference files in the repository ({', '.join(local)}); not using the environment cache.")
+        if self.env_cache and not local:
+            try:
+                python_executable, how = self.env_cache.provision(venv_path, deps_to_install)
+                self.logger.info(f"Environment is ready ({how}).")
+                return "success", python_executable
+            except Exception as e:
+                self.logger.warning(f"Environment cache failed ({e}); installing directly.")
         try:
             if not os.path.isdir(venv_path):
                 subprocess.run([sys.executable, "-m", "venv", venv_path], check=True, capture_output=True, text=True, encoding='utf-8')
-            # Install pytest and any other dependencies
-            deps_to_install = ["pytest"] + dependencies
             self.logger.info(f"Installing {len(deps_to_install)} packages...")
-            subprocess.run([pip_executable, "install"] + deps_to_install, check=True, capture_output=True, text=True, encoding='utf-8')
+            # Relative requirement lines are written relative to the repository.
+            subprocess.run([pip_executable, "install"] + deps_to_install, check=True, capture_output=True, text=True,
+                           encoding='utf-8', cwd=repo_path)
             self.logger.info("Environment is ready.")
             return "success", python_executable
         except Exception as e:
@@ -63,8 +104,10 @@ class ToolAcquisitionAgent:
 
     def _scan_for_python_files(self, repo_path):
         python_files, venv_path = [], os.path.join(repo_path, ".venv")
+        tests_path = os.path.join(repo_path, GENERATED_TESTS_DIR)
         for root, _, files in os.walk(repo_path):
             if os.path.commonpath([root, venv_path]) == venv_path: continue
+            if os.path.commonpath([root, tests_path]) == tests_path: continue
             for file in files:
                 if file.endswith(".py"): python_files.append(os.path.join(root, file))
         return python_files
@@ -108,9 +151,8 @@ class ToolAcquisitionAgent:
         except Exception as e:
             return "failure", str(e)
 
-    def _generate_and_run_tests(self, python_interpreter, repo_path, tool_candidates):
-        self.logger.info("Generating and running tests for tool candidates...")
-        test_results = {}
+    def _generate_test(self, module_path, func):
+        """Asks the LLM for one pytest test of a candidate function and returns its code."""
         system_prompt = """You are a senior Python QA engineer. Your task is to write a single, simple pytest test for a given function.
 
 Rules:
@@ -119,27 +161,89 @@ Rules:
 - The test should make a simple, valid call to the function and assert a reasonable expectation.
 - DO NOT use any external files or network access. Use only simple, inline mock data.
 - Your response must be ONLY the Python code inside a `python ... ` block."""
+        user_prompt = f"Write a simple pytest test for the function {func['name']} from module {module_path}.\n\nFunction details:\n- Name: {func['name']}\n- Args: {func['args']}\n- Docstring: {func['docstring']}"
+        response = self.llm_client.chat(model='llama3', messages=[{'role': 'system', 'content': system_prompt}, {'role': 'user', 'content': user_prompt}])
+        return response['message']['content'].strip().replace("`python", "").replace("`", "")
+
+    def _run_test_session(self, python_interpreter, repo_path, test_files):
+        """
+        Runs every generated test file in one pytest session (spread over pytest-xdist
+        workers when enabled) and returns {file index: {"status", "output"}} parsed from
+        the session's JUnit XML report.
+        """
+        report_path = os.path.join(repo_path, GENERATED_TESTS_DIR, "report.xml")
+        command = [python_interpreter, "-m", "pytest", *test_files, "-q", "-p", "no:cacheprovider",
+                   "--continue-on-collection-errors", f"--junitxml={report_path}"]
+        if self.test_workers > 1 and len(test_files) > 1:
+            command += ["-n", str(min(self.test_workers, len(test_files)))]
+        self.logger.info(f"Running {len(test_files)} generated test file(s) in one pytest session...")
+        try:
+            result = subprocess.run(command, capture_output=True, text=True, encoding='utf-8',
+                                    timeout=120 + 10 * len(test_files), cwd=repo_path)
+        except subprocess.TimeoutExpired:
+            return {}, "The test session timed out."
+        if not os.path.exists(report_path):
+            return {}, (result.stdout + "\n" + result.stderr).strip()
 
+        outcomes = {}
+        for case in ET.parse(report_path).getroot().iter("testcase"):
+            match = TEST_FILE_INDEX.search(f"{case.get('classname', '')} {case.get('name', '')} {case.get('file', '')}")
+            if not match:
+                continue
+            problem = next((child for child in case if child.tag in ("failure", "error", "skipped")), None)
+            outcome = outcomes.setdefault(int(match.group(1)), {"passed": 0, "problems": []})
+            if problem is None:
+                outcome["passed"] += 1
+            else:
+                outcome["problems"].append(f"{case.get('name')}: {problem.tag}: {(problem.text or problem.get('message') or '').strip()}")
+        return {
+            index: {"status": "failure" if outcome["problems"] or not outcome["passed"] else "success",
+                    "output": "\n".join(outcome["problems"]) or f"{outcome['passed']} test(s) passed."}
+            for index, outcome in outcomes.items()
+        }, None
+
+    def _generate_and_run_tests(self, python_interpreter, repo_path, tool_candidates):
+        """
+        Generates one test file per candidate function concurrently (at most max_workers
+        LLM requests in flight), then runs them all in a single pytest session and maps
+        each file's results back to its tool.
+        """
+        self.logger.info("Generating and running tests for tool candidates...")
+        tools = []
         for file_path, functions in tool_candidates.items():
             module_path = os.path.relpath(file_path, repo_path).replace(os.sep, '.').replace('.py', '')
-            for func in functions:
-                user_prompt = f"Write a simple pytest test for the function {func['name']} from module {module_path}.\n\nFunction details:\n- Name: {func['name']}\n- Args: {func['args']}\n- Docstring: {func['docstring']}"
-                try:
-                    response = self.ollama_client.chat(model='llama3', messages=[{'role': 'system', 'content': system_prompt}, {'role': 'user', 'content': user_prompt}])
-                    test_code = response['message']['content'].strip().replace("`python", "").replace("`", "")
-                    
-                    test_file_path = os.path.join(repo_path, "test_miso_generated.py")
-                    with open(test_file_path, "w", encoding="utf-8") as f: f.write(test_code)
+            tools.extend((f"{module_path}.{func['name']}", module_path, func) for func in functions)
 
-                    # Execute the test
-                    status, output = self._execute_code(python_interpreter, f"import pytest; pytest.main(['{test_file_path}'])", repo_path)
-                    test_results[f"{module_path}.{func['name']}"] = {"status": status, "output": output.strip()}
-                    os.remove(test_file_path)
+        tests_dir = os.path.join(repo_path, GENERATED_TESTS_DIR)
+        shutil.rmtree(tests_dir, ignore_errors=True)
+        os.makedirs(tests_dir)
+        test_results, test_files = {}, {}
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = [executor.submit(self._generate_test, module_path, func) for _, module_path, func in tools]
+                for index, ((tool_name, _, func), future) in enumerate(zip(tools, futures)):
+                    try:
+                        test_code = future.result()
+                        ast.parse(test_code)
+                    except Exception as e:
+                        self.logger.error(f"Failed to generate test for {func['name']}: {e}")
+                        test_results[tool_name] = {"status": "failure", "output": str(e)}
+                        continue
+                    test_file_path = os.path.join(tests_dir, f"test_miso_{index:04d}_{func['name']}.py")
+                    with open(test_file_path, "w", encoding="utf-8") as f: f.write(test_code)
+                    test_files[index] = test_file_path
+            self.logger.info(f"Generated {len(test_files)} of {len(tools)} test file(s).")
 
-                except Exception as e:
-                    self.logger.error(f"Failed to generate or run test for {func['name']}: {e}")
-                    test_results[f"{module_path}.{func['name']}"] = {"status": "failure", "output": str(e)}
-        return test_results
+            if test_files:
+                outcomes, session_error = self._run_test_session(python_interpreter, repo_path, list(test_files.values()))
+                for index in test_files:
+                    tool_name = tools[index][0]
+                    test_results[tool_name] = outcomes.get(index) or {
+                        "status": "failure", "output": session_error or "No test results were reported for this tool."
+                    }
+        finally:
+            shutil.rmtree(tests_dir, ignore_errors=True)
+        return {tool_name: test_results[tool_name] for tool_name, _, _ in tools}
 
     def acquire_tool_from_repository(self, github_url):
         """ Main entry point for the tool acquisition process. """
@@ -1,10 +1,10 @@
 import logging
 import json
-import ollama
 import requests
 import fitz
 import os
 from langchain.text_splitter import RecursiveCharacterTextSplitter
+from ..shared.llm_client import get_llm_client
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
@@ -13,6 +13,7 @@ class AnalysisAgent:
     def __init__(self, model="llama3"):
         self.logger = logging.getLogger(self.__class__.__name__)
         self.model = model
+        self.llm_client = get_llm_client()
         self.text_splitter = RecursiveCharacterTextSplitter(chunk_size=7000, chunk_overlap=200)
 
     def _download_pdf(self, pdf_url: str, temp_path: str) -> bool:
@@ -55,14 +56,14 @@ class AnalysisAgent:
         for i, chunk in enumerate(chunks):
             try:
                 prompt = f"Summarize key findings from this section:\n\n{chunk}"
-                response = ollama.chat(model=self.model, messages=[{'role': 'user', 'content': prompt}])
+                response = self.llm_client.chat(model=self.model, messages=[{'role': 'user', 'content': prompt}])
                 chunk_summaries.append(response['message']['content'])
             except Exception as e:
                 self.logger.error(f"Failed to analyze chunk {i+1}: {e}")
         
         try:
             synthesis_prompt = self._create_synthesis_prompt(paper.get('title'), chunk_summaries)
-            final_response = ollama.chat(model=self.model, messages=[{'role': 'user', 'content': synthesis_prompt}], format='json')
+            final_response = self.llm_client.chat(model=self.model, messages=[{'role': 'user', 'content': synthesis_prompt}], format='json')
             report = json.loads(final_response['message']['content'])
             
             report['paper_title'] = paper.get('title', 'Unknown Title')
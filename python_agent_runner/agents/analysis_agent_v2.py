@@ -1,9 +1,9 @@
 import logging
 import json
-import ollama
 import requests
 import fitz  # PyMuPDF
 import os
+from ..shared.llm_client import get_llm_client
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
@@ -15,6 +15,7 @@ class AnalysisAgentV2:
     def __init__(self, model="llama3"):
         self.logger = logging.getLogger(self.__class__.__name__)
         self.model = model
+        self.llm_client = get_llm_client()
         self.logger.info("AnalysisAgentV2 (Student) initialized.")
 
     def _download_pdf(self, pdf_url: str, temp_path: str) -> bool:
@@ -83,7 +84,7 @@ class AnalysisAgentV2:
         self.logger.info("Performing direct long-context analysis...")
         try:
             synthesis_prompt = self._create_synthesis_prompt(paper.get('title'), full_text)
-            final_response = ollama.chat(model=self.model, messages=[{'role': 'user', 'content': synthesis_prompt}], format='json')
+            final_response = self.llm_client.chat(model=self.model, messages=[{'role': 'user', 'content': synthesis_prompt}], format='json')
             report_str = final_response['message']['content']
             report = json.loads(report_str)
             self.logger.info("Successfully generated final analysis report with long-context method.")
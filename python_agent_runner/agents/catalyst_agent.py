@@ -1,6 +1,6 @@
 import logging
 import json
-import ollama
+from ..shared.llm_client import get_llm_client
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
@@ -9,6 +9,7 @@ class CatalystAgent:
     def __init__(self, model="llama3"):
         self.logger = logging.getLogger(self.__class__.__name__)
         self.model = model
+        self.llm_client = get_llm_client()
         self.logger.info("CatalystAgent initialized.")
 
     def _create_novelty_prompt(self, paper: dict) -> str:
@@ -38,7 +39,7 @@ class CatalystAgent:
         """Takes a paper and returns a novelty score and justification."""
         prompt = self._create_novelty_prompt(paper)
         try:
-            response = ollama.chat(
+            response = self.llm_client.chat(
                 model=self.model,
                 messages=[{'role': 'user', 'content': prompt}],
                 format='json'
@@ -1,16 +1,68 @@
 import logging
-import ollama
 import os
+import time
+from ..shared.llm_client import get_llm_client
+from ..shared.context_selector import select_context, format_context_entry
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
+class _FenceStripper:
+    """
+    Removes the markdown fences wrapping a streamed answer as it arrives: an
+    opening fence on the first line and a closing fence on the last one. Fences
+    anywhere else are part of the code and kept. Text is released line by line,
+    so a fence split across chunks is still caught; leading and trailing blank
+    lines are dropped like str.strip() would.
+    """
+    def __init__(self):
+        self._partial = ""
+        self._pending = []  # Blank and fence lines held back until later content shows they are not the end.
+        self._opened = False
+        self._started = False
+
+    def _emit_line(self, line: str) -> str:
+        is_fence = line.strip().startswith("```")
+        if not self._started:
+            if is_fence and not self._opened:
+                self._opened = True  # Only a fence before any code is the opening one.
+                return ""
+            if not line.strip():
+                return ""
+            self._started = True
+            return line
+        if is_fence or not line.strip():
+            self._pending.append(line)
+            return ""
+        out = "".join(self._pending) + line
+        self._pending = []
+        return out
+
+    def feed(self, text: str) -> str:
+        """Returns the text that is safe to write after adding a new chunk."""
+        self._partial += text
+        *lines, self._partial = self._partial.split("\n")
+        return "".join(self._emit_line(line + "\n") for line in lines)
+
+    def finish(self) -> str:
+        """Flushes the last (unterminated) line, dropping a closing fence and trailing whitespace."""
+        tail = self._emit_line(self._partial) if self._partial.strip() else ""
+        self._partial = ""
+        fences = [i for i, line in enumerate(self._pending) if line.strip().startswith("```")]
+        held = self._pending[:fences[-1]] if fences else []
+        self._pending = []
+        return (tail + "".join(held)).rstrip()
+
+
 class CodeGenerationAgent:
     """
     Generates code for a single file based on a detailed description and project context.
+    Only the most relevant file summaries that fit in context_token_budget are sent to the model.
     """
-    def __init__(self, model="llama3"):
+    def __init__(self, model="llama3", context_token_budget=3000):
         self.logger = logging.getLogger(self.__class__.__name__)
         self.model = model
+        self.context_token_budget = context_token_budget
+        self.llm_client = get_llm_client()
         self.logger.info(f"CodeGenerationAgent initialized with model: {self.model}")
 
     def _get_language_from_path(self, file_path: str) -> str:
@@ -27,7 +79,7 @@ class CodeGenerationAgent:
         language = self._get_language_from_path(file_path)
         
         context_summary = "\n".join(
-            f"--- File: {path} ---\n{summary}\n"
+            format_context_entry(path, summary)
             for path, summary in project_context.items()
         )
 
@@ -49,16 +101,32 @@ class CodeGenerationAgent:
         3.  Your entire response must be ONLY the raw source code. Do not add any explanatory text, comments, or markdown fences.
         """
 
-    def generate_code(self, file_path: str, file_description: str, project_context: dict) -> str:
+    def _select_context(self, file_path: str, file_description: str, project_context: dict, related_paths=None) -> tuple:
+        """Ranks the available summaries for this file and packs them under the token budget."""
+        selected, usage = select_context(file_path, file_description, project_context, self.context_token_budget, related_paths)
+        self.logger.info(f"Context for {file_path}: {len(usage['included'])}/{usage['available_files']} summaries, "
+                         f"{usage['used_tokens']}/{usage['budget_tokens']} tokens.")
+        if usage['dropped']:
+            self.logger.info(f"Dropped from context for {file_path} (over budget): {usage['dropped']}")
+        return selected, usage
+
+    def generate_code(self, file_path: str, file_description: str, project_context: dict, output_path: str = None, on_progress=None, related_paths=None) -> str:
         """
         Generates and returns the code for a single file, using project context.
         Returns the generated source code, or None if an error occurred.
+        related_paths are files the plan declares this file depends on; they rank first for context.
+
+        With output_path, the model's token stream is written to that file as it
+        arrives (see generate_code_streaming).
         """
+        if output_path:
+            return self.generate_code_streaming(file_path, file_description, project_context, output_path, on_progress, related_paths=related_paths)
         self.logger.info(f"Generating code for: {file_path} with context...")
-        prompt = self._create_generation_prompt(file_path, file_description, project_context)
+        context, _ = self._select_context(file_path, file_description, project_context, related_paths)
+        prompt = self._create_generation_prompt(file_path, file_description, context)
 
         try:
-            response = ollama.chat(
+            response = self.llm_client.chat(
                 model=self.model,
                 messages=[{'role': 'user', 'content': prompt}]
             )
@@ -68,3 +136,53 @@ class CodeGenerationAgent:
         except Exception as e:
             self.logger.error(f"Failed to generate code for {file_path}: {e}")
             return None
+
+    def generate_code_streaming(self, file_path: str, file_description: str, project_context: dict, output_path: str, on_progress=None, progress_interval=0.25, related_paths=None) -> str:
+        """
+        Streams generated code for a single file into output_path as tokens arrive,
+        stripping code fences on the fly. on_progress, if given, receives events
+        {"file", "state", "bytes", "chunks", "elapsed_s"} with state "started",
+        "streaming" (throttled to progress_interval seconds), "done" or "failed", plus
+        "context_tokens" (prompt context budget usage).
+        Returns the generated source code, or None if an error occurred (the partial file is removed).
+        """
+        self.logger.info(f"Streaming code generation for: {file_path} with context...")
+        context, usage = self._select_context(file_path, file_description, project_context, related_paths)
+        prompt = self._create_generation_prompt(file_path, file_description, context)
+        stripper = _FenceStripper()
+        written, chunks, bytes_written = [], 0, 0
+        started = last_report = time.perf_counter()
+
+        def report(state):
+            if on_progress:
+                on_progress({"file": file_path, "state": state, "bytes": bytes_written, "chunks": chunks,
+                             "elapsed_s": round(time.perf_counter() - started, 3), "context_tokens": usage['used_tokens']})
+
+        report("started")
+        try:
+            os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+            with open(output_path, 'w', encoding='utf-8') as f:
+                stream = self.llm_client.chat(model=self.model, messages=[{'role': 'user', 'content': prompt}], stream=True)
+                for chunk in stream:
+                    chunks += 1
+                    text = stripper.feed(chunk['message']['content'] or "")
+                    if text:
+                        f.write(text)
+                        f.flush()
+                        written.append(text)
+                        bytes_written += len(text.encode('utf-8'))
+                    if time.perf_counter() - last_report >= progress_interval:
+                        last_report = time.perf_counter()
+                        report("streaming")
+                tail = stripper.finish()
+                f.write(tail)
+                written.append(tail)
+                bytes_written += len(tail.encode('utf-8'))
+            report("done")
+            self.logger.info(f"Successfully streamed {chunks} chunks of code for {file_path}.")
+            return "".join(written)
+        except Exception as e:
+            self.logger.error(f"Failed to generate code for {file_path}: {e}")
+            report("failed")
+            if os.path.exists(output_path): os.remove(output_path)
+            return None
@@ -1,20 +1,77 @@
 import logging
 import json
 import os
+import hashlib
+import threading
 import numpy as np
-import ollama
+from concurrent.futures import ThreadPoolExecutor
 from langchain.text_splitter import PythonCodeTextSplitter
-from sklearn.cluster import DBSCAN
+from ..shared.clustering import CLUSTERING_METHODS, cluster_embeddings
+from ..shared.embedding_cache import embed_texts
+from ..shared.llm_client import get_llm_client
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
+class _SummaryCheckpoint:
+    """
+    Append-only JSONL record of finished summaries for one project, keyed by
+    (model, level, text hash), so an interrupted indexing run can resume.
+    """
+    def __init__(self, path: str, model: str):
+        self.path = path
+        self.model = model
+        self._lock = threading.Lock()
+        self._summaries = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                        self._summaries[record["key"]] = record["summary"]
+                    except (json.JSONDecodeError, KeyError):
+                        continue  # A torn last line from an interrupted write
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def _key(self, text: str, level: int) -> str:
+        return hashlib.sha256(f"{self.model}\n{level}\n{text}".encode('utf-8')).hexdigest()
+
+    def __len__(self):
+        return len(self._summaries)
+
+    def get(self, text: str, level: int):
+        return self._summaries.get(self._key(text, level))
+
+    def put(self, text: str, level: int, summary: str):
+        key = self._key(text, level)
+        with self._lock:
+            self._summaries[key] = summary
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({"key": key, "level": level, "summary": summary}) + "\n")
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
 class CodexIndexerAgent:
     """
     Analyzes a completed project and builds a hierarchical knowledge tree using a RAPTOR-like methodology.
+    Summaries are produced by a pool of max_workers threads and checkpointed under
+    checkpoint_dir as they finish, so an interrupted build resumes where it stopped.
+    Each level is grouped with one of the CLUSTERING_METHODS into clusters of
+    roughly cluster_size nodes (see shared/clustering.py).
     """
-    def __init__(self, model="llama3"):
+    def __init__(self, model="llama3", max_workers=4, checkpoint_dir=".miso_cache/codex_checkpoints",
+                 clustering="gmm", cluster_size=6):
         self.logger = logging.getLogger(self.__class__.__name__)
+        if clustering not in CLUSTERING_METHODS:
+            raise ValueError(f"Unknown clustering method '{clustering}'. Expected one of {sorted(CLUSTERING_METHODS)}.")
         self.model = model
+        self.clustering = clustering
+        self.cluster_size = cluster_size
+        self.max_workers = max_workers
+        self.checkpoint_dir = checkpoint_dir
+        self.llm_client = get_llm_client()
         self.text_splitter = PythonCodeTextSplitter(chunk_size=1024, chunk_overlap=100)
         self.logger.info("CodexIndexerAgent initialized.")
 
@@ -33,23 +90,43 @@ class CodexIndexerAgent:
         return all_chunks
 
     def _get_embeddings(self, texts: list) -> np.ndarray:
-        """Generates embeddings for a list of texts."""
+        """Generates embeddings for a list of texts, reusing cached vectors."""
         self.logger.info(f"Generating embeddings for {len(texts)} text(s)...")
-        embeddings = [ollama.embeddings(model='mxbai-embed-large', prompt=text)['embedding'] for text in texts]
-        return np.array(embeddings)
+        return embed_texts(self.llm_client, 'mxbai-embed-large', texts)
 
     def _summarize_text(self, text: str, level: int) -> str:
         """Uses an LLM to summarize a piece of text."""
         self.logger.info(f"Summarizing text at level {level}...")
         prompt = f"You are a code analysis AI. Summarize the following code snippet(s) into a high-level concept. Focus on the 'what' and 'why', not the 'how'.\n\nCODE:\n{text}"
-        response = ollama.chat(model=self.model, messages=[{'role': 'user', 'content': prompt}])
+        response = self.llm_client.chat(model=self.model, messages=[{'role': 'user', 'content': prompt}])
         return response['message']['content']
 
+    def _summarize_many(self, texts: list, level: int, checkpoint: _SummaryCheckpoint) -> list:
+        """Summarizes texts concurrently, skipping any already in the checkpoint. Preserves order."""
+        summaries = [checkpoint.get(text, level) for text in texts]
+        pending = [i for i, summary in enumerate(summaries) if summary is None]
+        if len(pending) < len(texts):
+            self.logger.info(f"Resuming level {level}: {len(texts) - len(pending)}/{len(texts)} summaries loaded from checkpoint.")
+
+        def summarize(i):
+            summary = self._summarize_text(texts[i], level)
+            checkpoint.put(texts[i], level, summary)
+            return summary
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for i, summary in zip(pending, executor.map(summarize, pending)):
+                summaries[i] = summary
+        return summaries
+
+    def _checkpoint_for(self, project_path: str) -> _SummaryCheckpoint:
+        abs_path = os.path.abspath(project_path)
+        name = f"{os.path.basename(abs_path)}_{hashlib.sha256(abs_path.encode('utf-8')).hexdigest()[:12]}.jsonl"
+        return _SummaryCheckpoint(os.path.join(self.checkpoint_dir, name), self.model)
+
     def _cluster_chunks(self, embeddings: np.ndarray) -> list:
         """Clusters embeddings and returns a list of cluster labels."""
-        self.logger.info(f"Clustering {len(embeddings)} embeddings...")
-        clustering = DBSCAN(eps=0.5, min_samples=2, metric='cosine').fit(embeddings)
-        return clustering.labels_
+        self.logger.info(f"Clustering {len(embeddings)} embeddings with '{self.clustering}'...")
+        return cluster_embeddings(embeddings, method=self.clustering, cluster_size=self.cluster_size)
 
     def index_project(self, project_path: str) -> dict:
         """Main method to perform RAPTOR indexing on a project directory."""
@@ -59,9 +136,13 @@ class CodexIndexerAgent:
         if not leaf_chunks:
             return {"error": "No Python files found to index."}
 
+        checkpoint = self._checkpoint_for(project_path)
+        if len(checkpoint):
+            self.logger.info(f"Found checkpoint with {len(checkpoint)} finished summaries at {checkpoint.path}.")
+
         # Level 0: Initial summarization of raw code chunks
         self.logger.info("--- Building Level 0 of the knowledge tree ---")
-        summaries = [self._summarize_text(chunk['text'], 0) for chunk in leaf_chunks]
+        summaries = self._summarize_many([chunk['text'] for chunk in leaf_chunks], 0, checkpoint)
         
         tree = {
             "level_0": [{"summary": s, "source_chunk": c['text']} for s, c in zip(summaries, leaf_chunks)]
@@ -86,14 +167,17 @@ class CodexIndexerAgent:
                 if label not in clusters: clusters[label] = []
                 clusters[label].append(current_summaries[i])
 
+            cluster_items = [items for label, items in clusters.items() if label != -1]
+            cluster_summaries = iter(self._summarize_many(
+                ["\n\n---\n\n".join(items) for items in cluster_items], current_level, checkpoint
+            ))
             for label, items in clusters.items():
                 if label == -1: # Noise points become their own nodes
                     for item in items:
                         next_level_summaries.append(item)
                         level_nodes.append({"summary": item, "children": [item]})
                 else: # Cluster items get summarized
-                    combined_text = "\n\n---\n\n".join(items)
-                    new_summary = self._summarize_text(combined_text, current_level)
+                    new_summary = next(cluster_summaries)
                     next_level_summaries.append(new_summary)
                     level_nodes.append({"summary": new_summary, "children": items})
 
@@ -104,5 +188,6 @@ class CodexIndexerAgent:
                 break
         
         tree["root"] = current_summaries[0]
+        checkpoint.remove()
         self.logger.info("Successfully built RAPTOR knowledge tree.")
         return tree
@@ -1,29 +1,55 @@
+import ast
 import logging
-import ollama
-import subprocess
 import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from ..shared.analyzer_daemon import run_analyzer
+from ..shared.code_patch import PatchError, apply_line_edits, error_windows, format_windows, parse_line_edits
+from ..shared.llm_client import get_llm_client
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
+# Checks whose outcome depends on other files of the project. They are deferred to a
+# project-level pass so a file is not "repaired" against siblings that do not exist yet.
+CROSS_FILE_CHECKS = ["import-error", "no-name-in-module", "no-member", "relative-beyond-top-level"]
+PYLINT_MESSAGE = re.compile(r"^(.+?):(\d+):(\d+): ([EF]\d{4}): ")
+# Files shorter than this are cheaper to rewrite whole than to patch through context windows.
+PATCH_MIN_LINES = 60
+
 class DebuggingAgent:
     """
     Analyzes a codebase for errors and attempts to fix them using an LLM within a verification loop.
     """
-    def __init__(self, model="llama3", max_attempts=3):
+    def __init__(self, model="llama3", max_attempts=3, max_workers=4, repair_mode="patch"):
+        """
+        repair_mode "patch" sends only the error regions and applies the model's line edits,
+        falling back to a full rewrite when they do not apply or validate; "rewrite" always
+        asks for the complete corrected file.
+        """
         self.logger = logging.getLogger(self.__class__.__name__)
         self.model = model
+        self.llm_client = get_llm_client()
         self.max_attempts = max_attempts
+        self.max_workers = max_workers
+        self.repair_mode = repair_mode
+        self.last_report = {}
+        self.repair_stats = {"patched": 0, "rewritten": 0, "patch_fallbacks": 0, "output_chars": 0}
+        self._stats_lock = threading.Lock()
         self.logger.info(f"DebuggingAgent initialized with model: {self.model}")
 
-    def _run_linter(self, file_path: str) -> str:
+    def _run_linter(self, file_path: str, disable: list = None) -> str:
         """Runs pylint on a file and returns a string of errors."""
         self.logger.info(f"Running linter on {file_path}...")
+        args = [file_path, '--exit-zero']
+        if disable:
+            args.append(f"--disable={','.join(disable)}")
         try:
-            result = subprocess.run(
-                ['pylint', file_path, '--exit-zero'],
-                capture_output=True, text=True, check=False
-            )
-            errors = [line for line in result.stdout.splitlines() if 'E:' in line or 'F:' in line]
+            result = run_analyzer('pylint', args)
+            if result.returncode != 0 and "No module named pylint" in result.stderr:
+                raise FileNotFoundError("pylint")
+            errors = [line for line in result.stdout.splitlines() if PYLINT_MESSAGE.match(line)]
             if not errors:
                 self.logger.info(f"{os.path.basename(file_path)} is clean.")
                 return ""
@@ -53,35 +79,134 @@ class DebuggingAgent:
         3.  Your entire response must be ONLY the raw, corrected, and complete Python source code for the file. Do not add any explanations or markdown.
         """
 
-    def _debug_file(self, file_path: str) -> bool:
+    def _create_patch_prompt(self, code: str, windows: list, errors: str) -> str:
+        """Creates a prompt showing only the numbered error regions and asking for line-range edits."""
+        return f"""
+        You are an expert Python programmer and debugger. Fix the Pylint errors below. Only the relevant
+        regions of the file are shown, with line numbers; "..." marks lines that are left out.
+        **Source Regions:**
+        ```
+        {format_windows(code, windows)}
+        ```
+        **Pylint Errors:**
+        ```
+        {errors}
+        ```
+        **Instructions:**
+        1.  Reply ONLY with one or more edit blocks, each replacing an inclusive range of shown lines:
+            EDIT <first line>-<last line>
+            <the new lines, without line numbers, with their full indentation>
+            END
+        2.  An edit may contain more or fewer lines than it replaces; an empty edit deletes the lines.
+            To add a line, replace a neighbouring line with itself plus the new line.
+        3.  Edits must not overlap and may only touch lines that are shown. No explanations or markdown.
+        """
+
+    def _count(self, key: str, amount: int = 1):
+        with self._stats_lock:  # Repairs run on a worker pool.
+            self.repair_stats[key] += amount
+
+    def _ask(self, prompt: str) -> str:
+        response = self.llm_client.chat(model=self.model, messages=[{'role': 'user', 'content': prompt}])
+        content = response['message']['content']
+        self._count("output_chars", len(content))
+        return content
+
+    def _patch_file(self, file_path: str, code: str, errors: str, disable: list = None) -> bool:
+        """
+        Patch-mode repair: asks for line edits to the error regions, applies them, and keeps
+        the result only if it parses and no error remains in the edited lines. Returns False
+        (leaving the file untouched) when the patch cannot be used.
+        """
+        error_lines = [int(m.group(2)) for m in map(PYLINT_MESSAGE.match, errors.splitlines()) if m]
+        windows = error_windows(code, error_lines)
+        try:
+            answer = self._ask(self._create_patch_prompt(code, windows, errors))
+            patched, touched = apply_line_edits(code, parse_line_edits(answer.replace("```", "")), windows)
+            ast.parse(patched)
+        except (PatchError, SyntaxError) as e:
+            self.logger.warning(f"Patch for {os.path.basename(file_path)} rejected: {e}")
+            return False
+
+        with open(file_path, 'w', encoding='utf-8') as f:
+            f.write(patched)
+        remaining = self._run_linter(file_path, disable)
+        for match in map(PYLINT_MESSAGE.match, remaining.splitlines()):
+            if match and any(first <= int(match.group(2)) <= last for first, last in touched):
+                self.logger.warning(f"Patch for {os.path.basename(file_path)} left errors in the edited lines.")
+                with open(file_path, 'w', encoding='utf-8') as f:
+                    f.write(code)
+                return False
+        self.logger.info(f"Applied {len(touched)} line edit(s) to {os.path.basename(file_path)}.")
+        return True
+
+    def _run_project_linter(self, file_paths: list, enable: list = ("E", "F")) -> dict:
+        """
+        Runs a single pylint pass restricted to the given checks (by default every error
+        and fatal message) over many files. Returns {file_path: errors} for failing files.
+        """
+        if not file_paths:
+            return {}
+        self.logger.info(f"Running project-level linter ({', '.join(enable)}) on {len(file_paths)} file(s)...")
+        args = [*file_paths, '--exit-zero', '--disable=all', f"--enable={','.join(enable)}",
+                '--msg-template={path}:{line}:{column}: {msg_id}: {msg} ({symbol})']
+        try:
+            result = run_analyzer('pylint', args)
+            if result.returncode != 0 and "No module named pylint" in result.stderr:
+                raise FileNotFoundError("pylint")
+        except FileNotFoundError:
+            self.logger.error("`pylint` command not found. Please ensure it is installed.")
+            return {}
+        errors_by_file = {}
+        normalized = {os.path.normpath(p): p for p in file_paths}
+        for line in result.stdout.splitlines():
+            match = PYLINT_MESSAGE.match(line)
+            if not match:
+                continue
+            path = normalized.get(os.path.normpath(match.group(1)))
+            if path:
+                errors_by_file.setdefault(path, []).append(line)
+        return {path: "\n".join(lines) for path, lines in errors_by_file.items()}
+
+    def _repair_file(self, file_path: str, errors: str, disable: list = None) -> bool:
+        """Asks the LLM to fix the given errors and writes the result. Returns False if no fix could be applied."""
+        self.logger.warning(f"Found errors in {file_path}:\n{errors}")
+        with open(file_path, 'r', encoding='utf-8') as f:
+            current_code = f.read()
+
+        try:
+            self.logger.info(f"Asking LLM for a fix to {os.path.basename(file_path)}...")
+            if self.repair_mode == "patch" and current_code.count("\n") >= PATCH_MIN_LINES:
+                if self._patch_file(file_path, current_code, errors, disable):
+                    self._count("patched")
+                    return True
+                self._count("patch_fallbacks")
+                self.logger.info("Falling back to a full-file rewrite.")
+            prompt = self._create_debugging_prompt(current_code, errors)
+            fixed_code = self._ask(prompt).strip().replace("```python", "").replace("```", "")
+            self._count("rewritten")
+
+            with open(file_path, 'w', encoding='utf-8') as f:
+                f.write(fixed_code)
+            self.logger.info("Applied LLM's fix. Re-verifying...")
+            return True
+        except Exception as e:
+            self.logger.error(f"Failed to get or apply fix from LLM: {e}")
+            return False
+
+    def _debug_file(self, file_path: str, disable: list = None) -> bool:
         """Runs the lint-repair-verify loop for a single file."""
         for attempt in range(self.max_attempts):
             self.logger.info(f"Debugging attempt {attempt + 1}/{self.max_attempts} for {os.path.basename(file_path)}")
-            errors = self._run_linter(file_path)
+            errors = self._run_linter(file_path, disable)
             if not errors:
                 return True
             if "FATAL" in errors:
                 return False
-
-            self.logger.warning(f"Found errors in {file_path}:\n{errors}")
-            with open(file_path, 'r', encoding='utf-8') as f:
-                current_code = f.read()
-            
-            prompt = self._create_debugging_prompt(current_code, errors)
-            
-            try:
-                self.logger.info("Asking LLM for a fix...")
-                response = ollama.chat(model=self.model, messages=[{'role': 'user', 'content': prompt}])
-                fixed_code = response['message']['content'].strip().replace("```python", "").replace("```", "")
-                
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    f.write(fixed_code)
-                self.logger.info("Applied LLM's fix. Re-verifying...")
-            except Exception as e:
-                self.logger.error(f"Failed to get or apply fix from LLM: {e}")
+            if not self._repair_file(file_path, errors, disable):
                 return False
         
-        final_errors = self._run_linter(file_path)
+        final_errors = self._run_linter(file_path, disable)
         if not final_errors:
             self.logger.info(f"Successfully debugged {file_path}.")
             return True
@@ -89,19 +214,86 @@ class DebuggingAgent:
             self.logger.error(f"Failed to debug {file_path} after {self.max_attempts} attempts. Final errors:\n{final_errors}")
             return False
 
-    def debug_codebase(self, project_path: str) -> bool:
-        """Finds all Python files in a directory and attempts to debug them, excluding venv."""
-        self.logger.info(f"Starting to debug codebase at: {project_path}")
-        all_files_ok = True
+    def debug_file_isolated(self, file_path: str) -> bool:
+        """Debugs one freshly written file, ignoring checks that depend on the rest of the project."""
+        return self._debug_file(file_path, disable=CROSS_FILE_CHECKS)
+
+    def _find_python_files(self, project_path: str) -> list:
+        file_paths = []
         for root, dirs, files in os.walk(project_path):
             # THE FIX: Exclude virtual environment and hidden directories from the scan
             dirs[:] = [d for d in dirs if not d.startswith('.') and d not in ['venv', '__pycache__']]
-            
-            for file in files:
-                if file.endswith('.py'):
-                    if not self._debug_file(os.path.join(root, file)):
-                        all_files_ok = False
-        
+            file_paths.extend(os.path.join(root, file) for file in files if file.endswith('.py'))
+        return file_paths
+
+    def _repair_sweep(self, file_paths: list, failing: dict, lint_s: float, enable: list = ("E", "F")) -> dict:
+        """
+        Repairs every failing file on a bounded pool of workers, then re-lints only the files
+        that changed in one pylint run restricted to the same enable set that found them, for
+        up to max_attempts rounds. Returns a report with the time spent linting versus repairing.
+        """
+        report = {"files": len(file_paths), "initially_failing": len(failing), "rounds": 0,
+                  "llm_repairs": 0, "lint_runs": 1, "lint_s": lint_s, "repair_s": 0.0}
+        unfixable = set()
+        with self._stats_lock:
+            stats_before = dict(self.repair_stats)
+        for _ in range(self.max_attempts):
+            if not failing:
+                break
+            report["rounds"] += 1
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(failing))) as executor:
+                applied = dict(zip(failing, executor.map(self._repair_file, failing, failing.values())))
+            report["repair_s"] += time.perf_counter() - started
+            report["llm_repairs"] += len(applied)
+            unfixable.update(path for path, ok in applied.items() if not ok)
+
+            changed = [path for path, ok in applied.items() if ok]
+            started = time.perf_counter()
+            failing = self._run_project_linter(changed, enable)
+            report["lint_s"] += time.perf_counter() - started
+            report["lint_runs"] += 1
+        unfixable.update(failing)
+
+        report["unfixed_files"] = sorted(unfixable)
+        with self._stats_lock:
+            report["repairs"] = {key: value - stats_before[key] for key, value in self.repair_stats.items()}
+        report["ok"] = not unfixable
+        report["lint_s"] = round(report["lint_s"], 2)
+        report["repair_s"] = round(report["repair_s"], 2)
+        self.logger.info(f"Repair sweep: {report['initially_failing']}/{report['files']} file(s) failing, "
+                         f"{len(unfixable)} left unfixed after {report['rounds']} round(s). "
+                         f"Linting took {report['lint_s']}s over {report['lint_runs']} run(s), repairing {report['repair_s']}s.")
+        self.last_report = report
+        return report
+
+    def debug_cross_file_issues(self, project_path: str) -> dict:
+        """
+        Final project-level pass after every file has been debugged in isolation: one pylint
+        run restricted to CROSS_FILE_CHECKS, then a parallel repair sweep of the failing files only.
+        """
+        file_paths = self._find_python_files(project_path)
+        started = time.perf_counter()
+        failing = self._run_project_linter(file_paths, CROSS_FILE_CHECKS)
+        self.logger.info(f"Cross-file pass found issues in {len(failing)} of {len(file_paths)} file(s).")
+        report = self._repair_sweep(file_paths, failing, time.perf_counter() - started, CROSS_FILE_CHECKS)
+        return {"ok": report["ok"], "repaired_files": sorted(failing), "report": report}
+
+    def debug_codebase(self, project_path: str, parallel: bool = True) -> bool:
+        """
+        Finds all Python files in a directory and attempts to debug them, excluding venv.
+        By default one project-wide pylint pass finds the failing files, which are then
+        repaired concurrently (see _repair_sweep); parallel=False debugs file by file.
+        """
+        self.logger.info(f"Starting to debug codebase at: {project_path}")
+        file_paths = self._find_python_files(project_path)
+        if parallel:
+            started = time.perf_counter()
+            failing = self._run_project_linter(file_paths)
+            all_files_ok = self._repair_sweep(file_paths, failing, time.perf_counter() - started)["ok"]
+        else:
+            all_files_ok = all([self._debug_file(file_path) for file_path in file_paths])
+
         if all_files_ok:
             self.logger.info("Codebase debugging completed successfully.")
         else:
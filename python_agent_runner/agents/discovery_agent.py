@@ -1,12 +1,12 @@
 # agents/discovery_agent.py
 import json
-import ollama
+from ..shared.llm_client import get_llm_client
 
 class DiscoveryAgent:
     def __init__(self):
         self.model_name = 'llama3'
         # Point the client to the Ollama service within the Docker network
-        self.client = ollama.Client(host='http://ollama:11434')
+        self.client = get_llm_client(host='http://ollama:11434')
         print(f"DiscoveryAgent (Containerized) Initialized for model: {self.model_name}.")
 
     def decide_next_action(self, user_message: str) -> dict:
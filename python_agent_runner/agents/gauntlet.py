@@ -1,94 +1,179 @@
-import subprocess
 import tempfile
 import os
 import sys
 import json
+import hashlib
+import logging
+import subprocess
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from ..shared.analyzer_daemon import run_analyzer
+
+PYLINT_DISABLE = "C0114,C0115,C0116"
+# Order in which failures are reported by evaluate(); it matches the original sequential gauntlet.
+CHECK_ORDER = ("linter", "security", "complexity")
+EVALUATION_CACHE_SIZE = 256
+
+# Verdicts shared by every Gauntlet instance, keyed by code hash plus analyzer configuration.
+_evaluation_cache = OrderedDict()
+_evaluation_cache_lock = threading.Lock()
 
 class Gauntlet:
     # CORRECTED: Added max_complexity to the __init__ method
     def __init__(self, min_score=7.0, max_complexity=10):
         self.min_score = min_score
         self.max_complexity = max_complexity
-        print(f"Gauntlet initialized. Min pylint score: {self.min_score}, Max complexity: {self.max_complexity}")
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.logger.info(f"Gauntlet initialized. Min pylint score: {self.min_score}, Max complexity: {self.max_complexity}")
 
-    def run_linter_check(self, code_to_test):
-        """
-        Runs a pylint check on a string of code and returns a pass/fail result.
-        """
-        print("\n--- The Gauntlet: Linter Check ---")
+    def _write_temp_file(self, code_to_test):
         with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False, encoding='utf-8') as temp_file:
             temp_file.write(code_to_test)
-            temp_file_path = temp_file.name
+            return temp_file.name
+
+    def _run_check(self, check, code_to_test):
+        temp_file_path = self._write_temp_file(code_to_test)
         try:
-            command = [sys.executable, '-m', 'pylint', temp_file_path, '--disable=C0114,C0115,C0116', '--output-format=text']
-            result = subprocess.run(command, capture_output=True, text=True, check=False)
-            score_line = [line for line in result.stdout.split('\n') if 'Your code has been rated at' in line]
-            if not score_line:
-                return {"passed": False, "score": 0, "details": "Pylint execution error."}
-            score = float(score_line[0].split(' at ')[1].split('/')[0])
-            if score >= self.min_score:
-                return {"passed": True, "score": score, "details": result.stdout}
-            else:
-                return {"passed": False, "score": score, "details": result.stdout}
+            return check(temp_file_path)
         finally:
             os.remove(temp_file_path)
 
-    def run_security_check(self, code_to_test):
-        """Runs a bandit security check on the code."""
-        print("\n--- The Gauntlet: Security Scan (Bandit) ---")
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False, encoding='utf-8') as temp_file:
-            temp_file.write(code_to_test)
-            temp_file_path = temp_file.name
+    def _guarded(self, name, check, temp_file_path):
+        """Runs one check, turning an analyzer that could not run into a failed result flagged as an error."""
+        try:
+            return check(temp_file_path)
+        except (OSError, ValueError, subprocess.SubprocessError) as e:
+            self.logger.error(f"The {name} check could not run: {e}")
+            return {"passed": False, "error": True, "details": f"{name.capitalize()} execution error: {e}"}
+
+    def _cache_key(self, code_to_test):
+        config = json.dumps({"min_score": self.min_score, "max_complexity": self.max_complexity,
+                             "pylint_disable": PYLINT_DISABLE, "python": sys.version}, sort_keys=True)
+        return hashlib.sha256(f"{config}\n{code_to_test}".encode('utf-8')).hexdigest()
+
+    def evaluate(self, code_to_test):
+        """
+        Runs the linter, security and complexity checks concurrently on one temp file and
+        returns a combined verdict: passed, the first failed check (in CHECK_ORDER) and its
+        details, plus every individual result. Each result carries an "error" flag that is
+        set when its analyzer could not run. Verdicts are memoized by code and configuration,
+        so resubmitting identical code costs nothing; verdicts with an error are not cached.
+        """
+        key = self._cache_key(code_to_test)
+        with _evaluation_cache_lock:
+            cached = _evaluation_cache.get(key)
+            if cached is not None:
+                _evaluation_cache.move_to_end(key)
+        if cached is not None:
+            self.logger.info("The Gauntlet: Reusing verdict for identical code.")
+            return {**cached, "cached": True}
+
+        started = time.perf_counter()
+        checks = {"linter": self._lint_file, "security": self._security_scan_file, "complexity": self._complexity_file}
+        temp_file_path = self._write_temp_file(code_to_test)
         try:
-            command = [sys.executable, '-m', 'bandit', '-f', 'json', temp_file_path]
-            result = subprocess.run(command, capture_output=True, text=True, check=False)
-            # Bandit exits with a non-zero code if issues are found, so we parse stdout.
-            if result.stdout:
-                report = json.loads(result.stdout)
-                if report['results']:
-                    print(f"Result: FAILED - {len(report['results'])} security issues found.")
-                    return {"passed": False, "details": json.dumps(report['results'], indent=2)}
-            
-            print("Result: PASSED - No security issues found.")
-            return {"passed": True, "details": "No security issues found."}
+            with ThreadPoolExecutor(max_workers=len(checks)) as executor:
+                futures = {name: executor.submit(self._guarded, name, check, temp_file_path) for name, check in checks.items()}
+                results = {name: future.result() for name, future in futures.items()}
         finally:
             os.remove(temp_file_path)
 
+        failed_check = next((name for name in CHECK_ORDER if not results[name]["passed"]), None)
+        verdict = {
+            "passed": failed_check is None,
+            "failed_check": failed_check,
+            "details": results[failed_check]["details"] if failed_check else "All checks passed.",
+            "checks": results,
+            "error": any(result["error"] for result in results.values()),
+            "elapsed_s": round(time.perf_counter() - started, 3),
+        }
+        self.logger.info(f"The Gauntlet: {'PASSED' if verdict['passed'] else f'FAILED ({failed_check})'} "
+                         f"in {verdict['elapsed_s']}s.")
+        if verdict["error"]:
+            # An analyzer failure says nothing about the code; the next submission must re-run it.
+            return {**verdict, "cached": False}
+        with _evaluation_cache_lock:
+            _evaluation_cache[key] = verdict
+            while len(_evaluation_cache) > EVALUATION_CACHE_SIZE:
+                _evaluation_cache.popitem(last=False)
+        return {**verdict, "cached": False}
+
+    def run_linter_check(self, code_to_test):
+        """
+        Runs a pylint check on a string of code and returns a pass/fail result.
+        """
+        self.logger.info("The Gauntlet: Linter Check")
+        return self._run_check(self._lint_file, code_to_test)
+
+    def _lint_file(self, temp_file_path):
+        result = run_analyzer('pylint', [temp_file_path, f'--disable={PYLINT_DISABLE}', '--output-format=text'])
+        score_line = [line for line in result.stdout.split('\n') if 'Your code has been rated at' in line]
+        if not score_line:
+            # Exit status bits 1 (fatal) and 32 (usage error) mean pylint itself failed; a syntax error
+            # in the code also leaves no score, but is a genuine verdict reported in stdout.
+            if result.returncode < 0 or result.returncode & (1 | 32):
+                return {"passed": False, "error": True, "score": 0, "details": "Pylint execution error."}
+            return {"passed": False, "error": False, "score": 0, "details": result.stdout or "Pylint produced no score."}
+        score = float(score_line[0].split(' at ')[1].split('/')[0])
+        if score >= self.min_score:
+            return {"passed": True, "error": False, "score": score, "details": result.stdout}
+        else:
+            return {"passed": False, "error": False, "score": score, "details": result.stdout}
+
+    def run_security_check(self, code_to_test):
+        """Runs a bandit security check on the code."""
+        self.logger.info("The Gauntlet: Security Scan (Bandit)")
+        return self._run_check(self._security_scan_file, code_to_test)
+
+    def _security_scan_file(self, temp_file_path):
+        result = run_analyzer('bandit', ['-f', 'json', temp_file_path])
+        # Bandit exits with 1 if issues are found, so we parse stdout; any other failure means it did not run.
+        if not result.stdout and result.returncode != 0:
+            return {"passed": False, "error": True, "details": f"Bandit execution error: {result.stderr.strip()}"}
+        if result.stdout:
+            report = json.loads(result.stdout)
+            if report['results']:
+                self.logger.info(f"Result: FAILED - {len(report['results'])} security issues found.")
+                return {"passed": False, "error": False, "details": json.dumps(report['results'], indent=2)}
+
+        self.logger.info("Result: PASSED - No security issues found.")
+        return {"passed": True, "error": False, "details": "No security issues found."}
+
     def run_complexity_check(self, code_to_test):
         """Runs a radon cyclomatic complexity check."""
-        print("\n--- The Gauntlet: Complexity Analysis (Radon) ---")
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False, encoding='utf-8') as temp_file:
-            temp_file.write(code_to_test)
-            temp_file_path = temp_file.name
-        try:
-            command = [sys.executable, '-m', 'radon', 'cc', '-s', '-j', temp_file_path]
-            result = subprocess.run(command, capture_output=True, text=True, check=False)
-            
-            if not result.stdout.strip():
-                 print("Result: PASSED - Radon produced no output (likely no complex blocks).")
-                 return {"passed": True, "details": "No complex blocks found."}
+        self.logger.info("The Gauntlet: Complexity Analysis (Radon)")
+        return self._run_check(self._complexity_file, code_to_test)
 
-            report = json.loads(result.stdout)
-            high_complexity_blocks = []
-            for file_report in report.values():
-                for block in file_report:
-                    if isinstance(block, dict) and block.get('complexity', 0) > self.max_complexity:
-                        high_complexity_blocks.append(block)
-            
-            if high_complexity_blocks:
-                print(f"Result: FAILED - Code with complexity > {self.max_complexity} found.")
-                return {"passed": False, "details": json.dumps(high_complexity_blocks, indent=2)}
-            else:
-                print(f"Result: PASSED - All code blocks are within complexity limits.")
-                return {"passed": True, "details": "Max complexity found is acceptable."}
-        finally:
-            os.remove(temp_file_path)
+    def _complexity_file(self, temp_file_path):
+        result = run_analyzer('radon', ['cc', '-s', '-j', temp_file_path])
+        
+        if not result.stdout.strip():
+            if result.returncode != 0:
+                return {"passed": False, "error": True, "details": f"Radon execution error: {result.stderr.strip()}"}
+            self.logger.info("Result: PASSED - Radon produced no output (likely no complex blocks).")
+            return {"passed": True, "error": False, "details": "No complex blocks found."}
+
+        report = json.loads(result.stdout)
+        high_complexity_blocks = []
+        for file_report in report.values():
+            for block in file_report:
+                if isinstance(block, dict) and block.get('complexity', 0) > self.max_complexity:
+                    high_complexity_blocks.append(block)
+        
+        if high_complexity_blocks:
+            self.logger.info(f"Result: FAILED - Code with complexity > {self.max_complexity} found.")
+            return {"passed": False, "error": False, "details": json.dumps(high_complexity_blocks, indent=2)}
+        else:
+            self.logger.info("Result: PASSED - All code blocks are within complexity limits.")
+            return {"passed": True, "error": False, "details": "Max complexity found is acceptable."}
 
     def run_unit_tests(self, source_code, test_code, filename):
         """
         Runs pytest on the generated source code and test code.
         """
-        print("\n--- The Gauntlet: Unit Test Runner ---")
+        self.logger.info("The Gauntlet: Unit Test Runner")
         with tempfile.TemporaryDirectory() as temp_dir:
             # Add an __init__.py to the temp directory to make it a package
             init_path = os.path.join(temp_dir, "__init__.py")
@@ -103,13 +188,12 @@ class Gauntlet:
             with open(test_path, "w", encoding="utf-8") as f:
                 f.write(test_code)
 
-            print(f"Running pytest on {test_path}")
-            command = [sys.executable, '-m', 'pytest', test_path]
-            result = subprocess.run(command, capture_output=True, text=True, check=False, cwd=temp_dir)
+            self.logger.info(f"Running pytest on {test_path}")
+            result = run_analyzer('pytest', [test_path], cwd=temp_dir)
 
             if result.returncode == 0:
-                print("Result: PASSED")
+                self.logger.info("Result: PASSED")
                 return {"passed": True, "details": result.stdout}
             else:
-                print("Result: FAILED")
+                self.logger.info("Result: FAILED")
                 return {"passed": False, "details": result.stdout + "\n" + result.stderr}
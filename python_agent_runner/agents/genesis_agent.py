@@ -1,6 +1,10 @@
 import logging
 import os
 import json
+import hashlib
+import re
+import shutil
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from .planning_agent import PlanningAgent
 from .simulation_agent import SimulationAgent
@@ -8,12 +12,26 @@ from .code_generation_agent import CodeGenerationAgent
 from .debugging_agent import DebuggingAgent
 from .security_agent import SecurityAgent
 from ..shared.code_utils import summarize_python_code
+from ..shared.file_scheduler import flatten_file_structure, build_dependency_graph, plan_generation_waves, transitive_dependencies
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
+MANIFEST_NAME = ".miso_genesis.json"
+
 class GenesisAgent:
-    """Orchestrates the Plan -> Simulate -> Generate -> Debug -> Secure pipeline."""
-    def __init__(self, output_dir="generated_projects"):
+    """
+    Orchestrates the Plan -> Simulate -> Generate -> Debug -> Secure pipeline.
+
+    With stream_generation, each file is written incrementally while the model
+    generates it, and progress_callback receives the per-file progress events
+    emitted by CodeGenerationAgent.generate_code_streaming.
+
+    Every project gets a manifest with the input hash of each file (its path,
+    description and the summaries of its dependencies). With incremental, a
+    rerun reuses any file whose input hash matches the previous run of the same
+    project instead of regenerating it.
+    """
+    def __init__(self, output_dir="generated_projects", max_workers=4, stream_generation=True, progress_callback=None, incremental=False):
         self.logger = logging.getLogger(self.__class__.__name__)
         self.planning_agent = PlanningAgent()
         self.simulation_agent = SimulationAgent()
@@ -21,34 +39,146 @@ class GenesisAgent:
         self.debugging_agent = DebuggingAgent()
         self.security_agent = SecurityAgent()
         self.output_dir = output_dir
+        self.max_workers = max_workers
+        self.stream_generation = stream_generation
+        self.progress_callback = progress_callback
+        self.incremental = incremental
         os.makedirs(self.output_dir, exist_ok=True)
 
-    def _create_project_files(self, project_path: str, file_structure: dict) -> bool:
-        """Recursively creates project files, building and passing context."""
-        project_context = {}
+    def _file_input_hash(self, rel_path: str, description: str, project_context: dict) -> str:
+        """Hashes everything that determines a file's generated content."""
+        payload = json.dumps([rel_path, description, sorted(project_context.items())], ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _find_previous_project(self, base_project_name: str):
+        """Returns the most recent earlier project directory with the same base name that has a manifest."""
+        candidates = [
+            os.path.join(self.output_dir, d) for d in os.listdir(self.output_dir)
+            if re.fullmatch(re.escape(base_project_name) + r"_\d{8}_\d{6}", d) and os.path.isfile(os.path.join(self.output_dir, d, MANIFEST_NAME))
+        ]
+        return max(candidates, key=os.path.getmtime) if candidates else None
+
+    def _load_manifest(self, project_path: str):
         try:
-            def process_level(current_path, structure):
-                os.makedirs(current_path, exist_ok=True)
-                for name, content in structure.items():
-                    full_path = os.path.join(current_path, name)
-                    if isinstance(content, dict):
-                        if not process_level(full_path, content): return False
-                    elif isinstance(content, str):
-                        os.makedirs(os.path.dirname(full_path), exist_ok=True)
-                        generated_code = self.code_generation_agent.generate_code(os.path.relpath(full_path, start=project_path), content, project_context)
-                        if generated_code is None: return False
-                        with open(full_path, 'w', encoding='utf-8') as f: f.write(generated_code)
-                        self.logger.info(f"Successfully wrote file: {full_path}")
-                        if full_path.endswith('.py'):
-                            summary = summarize_python_code(generated_code)
-                            project_context[os.path.relpath(full_path, start=project_path)] = summary
-                return True
-            return process_level(project_path, file_structure)
+            with open(os.path.join(project_path, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            manifest["path"] = project_path
+            return manifest
+        except Exception as e:
+            self.logger.warning(f"Could not load Genesis manifest from {project_path}: {e}")
+            return None
+
+    def _log_plan_diff(self, previous_manifest: dict, file_structure: dict):
+        """Logs how the new plan's files differ from the previous run's plan."""
+        old_files = dict(flatten_file_structure(previous_manifest.get("plan", {}).get("file_structure", {})))
+        new_files = dict(flatten_file_structure(file_structure))
+        added = [p for p in new_files if p not in old_files]
+        removed = [p for p in old_files if p not in new_files]
+        changed = [p for p in new_files if p in old_files and new_files[p] != old_files[p]]
+        self.logger.info(f"Plan diff against {previous_manifest['path']}: {len(added)} added, {len(removed)} removed, "
+                         f"{len(changed)} changed, {len(new_files) - len(added) - len(changed)} unchanged file description(s).")
+
+    def _generate_file(self, project_path: str, rel_path: str, description: str, project_context: dict, on_file_written=None, related_paths=None,
+                       previous_project: dict = None, manifest_files: dict = None):
+        """Generates and writes one file. Returns its summary (or "" for non-Python files), or None on failure."""
+        full_path = os.path.join(project_path, rel_path)
+        input_hash = self._file_input_hash(rel_path, description, project_context)
+        previous_entry = (previous_project or {}).get("files", {}).get(rel_path)
+        if previous_entry and previous_entry.get("input_hash") == input_hash:
+            previous_path = os.path.join(previous_project["path"], rel_path)
+            if os.path.isfile(previous_path):
+                # Copied rather than hard-linked: debugging rewrites files in place and must not touch the previous run.
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                shutil.copy2(previous_path, full_path)
+                self.logger.info(f"Reused unchanged file from previous run: {full_path}")
+                if manifest_files is not None:
+                    manifest_files[rel_path] = {**previous_entry, "reused": True}
+                if on_file_written: on_file_written(full_path, True)
+                return previous_entry.get("summary", "")
+        if self.stream_generation:
+            generated_code = self.code_generation_agent.generate_code(rel_path, description, project_context, output_path=full_path, on_progress=self.progress_callback, related_paths=related_paths)
+            if generated_code is None: return None
+        else:
+            generated_code = self.code_generation_agent.generate_code(rel_path, description, project_context, related_paths=related_paths)
+            if generated_code is None: return None
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            with open(full_path, 'w', encoding='utf-8') as f: f.write(generated_code)
+        self.logger.info(f"Successfully wrote file: {full_path}")
+        summary = summarize_python_code(generated_code) if rel_path.endswith('.py') else ""
+        if manifest_files is not None:
+            manifest_files[rel_path] = {"input_hash": input_hash, "summary": summary, "reused": False}
+        if on_file_written: on_file_written(full_path, False)
+        return summary
+
+    def _create_project_files(self, project_path: str, file_structure: dict, declared_dependencies: dict = None, on_file_written=None,
+                              previous_project: dict = None, manifest_files: dict = None) -> bool:
+        """
+        Generates project files in dependency order. Files whose dependencies are
+        all written are generated concurrently in waves, and each file receives
+        the summaries of the Python files it depends on as context.
+        on_file_written, if given, is called with (file_path, reused) as soon as a file is written.
+        Files unchanged since previous_project (a loaded manifest) are copied instead of generated;
+        manifest_files, if given, is filled with each file's manifest entry.
+        """
+        summaries = {}
+        try:
+            os.makedirs(project_path, exist_ok=True)
+            files = flatten_file_structure(file_structure)
+            descriptions = dict(files)
+            graph = build_dependency_graph(files, declared_dependencies)
+            waves = plan_generation_waves(graph)
+            self.logger.info(f"Scheduled {len(files)} files into {len(waves)} generation wave(s).")
+
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                for wave_number, wave in enumerate(waves, start=1):
+                    self.logger.info(f"Generation wave {wave_number}/{len(waves)}: {wave}")
+                    futures = {}
+                    for rel_path in wave:
+                        context = {dep: summaries[dep] for dep in transitive_dependencies(graph, rel_path) if summaries.get(dep)}
+                        futures[rel_path] = executor.submit(self._generate_file, project_path, rel_path, descriptions[rel_path], context, on_file_written, graph[rel_path],
+                                                         previous_project, manifest_files)
+                    for rel_path, future in futures.items():
+                        summary = future.result()
+                        if summary is None:
+                            for pending in futures.values(): pending.cancel()
+                            return False
+                        summaries[rel_path] = summary
+            return True
         except Exception as e:
             self.logger.error(f"An error occurred during file creation: {e}")
             return False
 
+    def _review_file(self, file_path: str, known_clean: bool = False) -> dict:
+        """
+        Debugs and security-scans one generated Python file as soon as it is written.
+        known_clean marks a reused file whose previous run debugged it successfully.
+        """
+        debugged = True if known_clean else self.debugging_agent.debug_file_isolated(file_path)
+        return {"debugged": debugged, "security": self.security_agent.static_scan(file_path)}
+
+    def _merge_security_reports(self, file_reports: dict) -> dict:
+        """Combines per-file static scan reports into one project report."""
+        issues, scan_errors = [], []
+        for file_path, report in file_reports.items():
+            security = report["security"]
+            issues.extend(security.get("issues", []))
+            if security.get("status") == "FAIL":
+                scan_errors.append({"file": file_path, "reason": security.get("reason")})
+        merged = {"status": "INSECURE" if issues else "SECURE", "issues": issues}
+        if scan_errors: merged["scan_errors"] = scan_errors
+        return merged
+
+    def _write_manifest(self, project_path: str, objective: str, plan: dict, manifest_files: dict):
+        manifest = {"objective": objective, "created": datetime.now().isoformat(), "plan": plan, "files": manifest_files}
+        with open(os.path.join(project_path, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+
     def create_codebase(self, proposal: dict):
+        """
+        Runs the full pipeline for a proposal. Set proposal["incremental"] (or the agent's
+        incremental flag) to reuse unchanged files from the latest run of the same project,
+        or proposal["previous_output_path"] to reuse from a specific earlier run.
+        """
         base_project_name = proposal.get('project_name', 'untitled_project').replace(' ', '_').lower()
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         project_name_unique = f"{base_project_name}_{timestamp}"
@@ -57,6 +187,15 @@ class GenesisAgent:
         project_path = os.path.join(self.output_dir, project_name_unique)
 
         self.logger.info(f"--- Starting New Project: {project_name_unique} ---")
+
+        previous_project = None
+        if proposal.get("previous_output_path") or proposal.get("incremental", self.incremental):
+            previous_path = proposal.get("previous_output_path") or self._find_previous_project(base_project_name)
+            previous_project = self._load_manifest(previous_path) if previous_path else None
+            if previous_project:
+                self.logger.info(f"Incremental mode: reusing unchanged files from {previous_path}")
+            else:
+                self.logger.info("Incremental mode: no previous run found. Generating everything.")
         
         # 1. PLAN
         self.logger.info("Phase 1: Planning...")
@@ -65,27 +204,54 @@ class GenesisAgent:
 
         # 2. SIMULATE
         self.logger.info("Phase 2: Simulation...")
-        sim_report = self.simulation_agent.run_simulation(plan)
+        sim_report = plan.get("plan_metadata", {}).get("simulation_report")
+        if sim_report is None:
+            sim_report = self.simulation_agent.run_simulation(plan)
+        else:
+            self.logger.info("Reusing the risk simulation from the planning tournament.")
         if sim_report.get("status", "FAIL").upper() == "FAIL":
             return {"status": "FAIL", "reason": "Simulation failed.", "report": sim_report}
         
-        # 3. GENERATE
-        self.logger.info("Phase 3: Code Generation...")
+        # 3. GENERATE, streaming every written Python file straight into per-file DEBUG & SECURE
+        self.logger.info("Phase 3: Code Generation (with per-file Debugging & Security Scan)...")
         file_structure = plan.get("file_structure")
         
         if not file_structure or not isinstance(file_structure, dict) or not file_structure:
             return {"status": "FAIL", "reason": "Planning Agent produced an empty or invalid plan."}
-        if not self._create_project_files(project_path, file_structure):
-            return {"status": "FAIL", "reason": "Code generation failed."}
+        if previous_project:
+            self._log_plan_diff(previous_project, file_structure)
+        reviews, manifest_files = {}, {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as review_executor:
+            def on_file_written(file_path, reused):
+                if file_path.endswith('.py'):
+                    # Reused files are only trusted if the run that produced them debugged them cleanly.
+                    entry = manifest_files.get(os.path.relpath(file_path, project_path), {})
+                    known_clean = reused and entry.get("debugged") is True
+                    reviews[os.path.normpath(file_path)] = review_executor.submit(self._review_file, file_path, known_clean)
+            if not self._create_project_files(project_path, file_structure, plan.get("dependencies"), on_file_written, previous_project, manifest_files):
+                review_executor.shutdown(cancel_futures=True)
+                return {"status": "FAIL", "reason": "Code generation failed."}
+            file_reports = {file_path: future.result() for file_path, future in reviews.items()}
+        reused_files = sorted(p for p, entry in manifest_files.items() if entry.get("reused"))
+        if previous_project:
+            self.logger.info(f"Incremental mode: reused {len(reused_files)} of {len(manifest_files)} file(s).")
 
-        # 4. DEBUG & 5. SECURE
-        self.logger.info("Phase 4: Debugging...")
-        self.debugging_agent.debug_codebase(project_path)
+        # 4. DEBUG & 5. SECURE: project-level pass for cross-file issues only
+        self.logger.info("Phase 4: Cross-file Debugging...")
+        cross_file_report = self.debugging_agent.debug_cross_file_issues(project_path)
+        unfixed = {os.path.normpath(p) for p in cross_file_report.get("report", {}).get("unfixed_files", [])}
+        for rel_path, entry in manifest_files.items():
+            full_path = os.path.normpath(os.path.join(project_path, rel_path))
+            if full_path in file_reports:
+                entry["debugged"] = file_reports[full_path]["debugged"] and full_path not in unfixed
+        self._write_manifest(project_path, objective, plan, manifest_files)
         
         self.logger.info("Phase 5: Security Scan...")
-        sec_report = self.security_agent.scan_codebase(project_path)
+        for file_path in cross_file_report["repaired_files"]:
+            file_reports.setdefault(os.path.normpath(file_path), {"debugged": True})["security"] = self.security_agent.static_scan(file_path)
+        sec_report = self._merge_security_reports(file_reports)
         if sec_report.get("status") == "INSECURE":
-            return {"status": "SUCCESS_WITH_SECURITY_WARNINGS", "reason": "Codebase generated, but security issues were found.", "output_path": project_path, "security_report": sec_report}
+            return {"status": "SUCCESS_WITH_SECURITY_WARNINGS", "reason": "Codebase generated, but security issues were found.", "output_path": project_path, "security_report": sec_report, "reused_files": reused_files}
 
         self.logger.info(f"--- Project Pipeline Completed Successfully. Output at: {project_path} ---")
-        return {"status": "SUCCESS", "reason": "Codebase generated and debugged successfully.", "output_path": project_path}
+        return {"status": "SUCCESS", "reason": "Codebase generated and debugged successfully.", "output_path": project_path, "reused_files": reused_files}
@@ -1,7 +1,7 @@
 import logging
 import json
-import ollama
 import requests
+from ..shared.llm_client import get_llm_client
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
@@ -12,6 +12,7 @@ class MarketAgent:
     def __init__(self, model="llama3"):
         self.logger = logging.getLogger(self.__class__.__name__)
         self.model = model
+        self.llm_client = get_llm_client()
         self.hn_api_base = "https://hacker-news.firebaseio.com/v0"
         self.reddit_sources = ["smallbusiness", "Entrepreneur", "sideproject"]
         self.logger.info("MarketAgent v2 initialized.")
@@ -86,7 +87,7 @@ class MarketAgent:
         self.logger.info("Sending headlines to LLM for trend analysis...")
 
         try:
-            response = ollama.chat(model=self.model, messages=[{'role': 'user', 'content': prompt}], format='json')
+            response = self.llm_client.chat(model=self.model, messages=[{'role': 'user', 'content': prompt}], format='json')
             report = json.loads(response['message']['content'])
             self.logger.info("Successfully generated market trends report.")
             return report
@@ -1,20 +1,169 @@
 # python_agent_runner/agents/ontology_agent.py
 import ast
+import hashlib
+import logging
 import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from ..shared.ontology_index import OntologyIndex
+
+# Below this many files, starting worker processes costs more than it saves.
+PARALLEL_THRESHOLD = 64
+# Subgraph pages are capped so a mind-map payload stays small whatever the repository size.
+MAX_GRAPH_PAGE = 200
+GRAPH_CACHE_SIZE = 512
+
+class _EntityVisitor(ast.NodeVisitor):
+    """Collects imports and every class and function, with qualified names, in a single walk of the tree."""
+    def __init__(self):
+        self.imports = set()
+        self.entities = []
+        self._scope = []
+
+    def visit_Import(self, node):
+        self.imports.update(alias.name for alias in node.names)
+
+    def visit_ImportFrom(self, node):
+        self.imports.add("." * node.level + (node.module or ""))
+
+    def _visit_definition(self, node, methods=None):
+        self._scope.append(node.name)
+        self.entities.append({
+            "qualified_name": ".".join(self._scope),
+            "name": node.name,
+            "kind": type(node).__name__,
+            "lineno": node.lineno,
+            "end_lineno": getattr(node, "end_lineno", None),
+            "docstring": ast.get_docstring(node),
+            "methods": methods,
+        })
+        self.generic_visit(node)
+        self._scope.pop()
+
+    def visit_ClassDef(self, node):
+        self._visit_definition(node, [n.name for n in node.body if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef))])
+
+    def visit_FunctionDef(self, node):
+        self._visit_definition(node)
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+def _analyze_source_file(file_path, known_sha256=None):
+    """
+    Parses one file. Runs in worker processes. Returns (file_path, result): result is
+    None if the file cannot be read, {"sha256"} alone if its hash equals known_sha256,
+    and otherwise the hash, a parsed flag, imports and entities.
+    """
+    try:
+        with open(file_path, 'rb') as source_file:
+            source = source_file.read()
+    except OSError:
+        return file_path, None
+    sha256 = hashlib.sha256(source).hexdigest()
+    if sha256 == known_sha256:
+        return file_path, {"sha256": sha256}
+    try:
+        tree = ast.parse(source, filename=file_path)
+    except (SyntaxError, ValueError):
+        return file_path, {"sha256": sha256, "parsed": False, "imports": [], "entities": []}
+    visitor = _EntityVisitor()
+    visitor.visit(tree)
+    return file_path, {"sha256": sha256, "parsed": True, "imports": sorted(visitor.imports), "entities": visitor.entities}
 
 class OntologyAgent:
+    """
+    Extracts the classes, functions and imports of Python code. Results are kept in
+    a persistent OntologyIndex, so re-analysis only parses files whose mtime/size
+    changed (and whose content hash differs), and entity lookups are index queries.
+    """
+    def __init__(self, max_workers=None, index_path=".miso_cache/ontology_index.sqlite3"):
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.index = OntologyIndex(index_path)
+        # Computed subgraphs, keyed by (root, node, index generation). Any index change bumps the generation.
+        self._graph_cache = OrderedDict()
+        self._graph_lock = threading.Lock()
+        self._generation = 0
+
     def analyze_file(self, file_path):
-        try:
-            with open(file_path, 'r', encoding='utf-8') as source_file:
-                tree = ast.parse(source_file.read())
-            imports = sorted({node.name for node in ast.walk(tree) if isinstance(node, ast.ImportFrom)})
-            classes = sorted([node.name for node in ast.walk(tree) if isinstance(node, ast.ClassDef)])
-            functions = sorted([node.name for node in ast.walk(tree) if isinstance(node, ast.FunctionDef)])
-            return {"imports": imports, "classes": classes, "functions": functions}
-        except Exception:
+        result = _analyze_source_file(file_path)[1]
+        if not result or not result["parsed"]:
             return None
+        entities = result["entities"]
+        return {
+            "imports": result["imports"],
+            "classes": sorted(e["name"] for e in entities if e["kind"] == "ClassDef"),
+            "functions": sorted(e["name"] for e in entities if e["kind"] != "ClassDef"),
+        }
 
-    def analyze_directory(self, dir_path):
+    def _find_python_files(self, dir_path):
+        return [
+            os.path.join(root, file)
+            for root, _, files in os.walk(os.path.abspath(dir_path))
+            for file in files if file.endswith('.py')
+        ]
+
+    def _analyze_files(self, file_paths, known_hashes, workers):
+        """Yields (file_path, result) for every file, in a process pool when there is more than one worker."""
+        if workers <= 1:
+            yield from map(_analyze_source_file, file_paths, known_hashes)
+            return
+        chunksize = max(1, len(file_paths) // (workers * 8))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            yield from executor.map(_analyze_source_file, file_paths, known_hashes, chunksize=chunksize)
+
+    def _refresh(self, file_paths, indexed_states, parallel):
+        """
+        Re-analyzes the files whose mtime or size differ from indexed_states ({path: (mtime, size, sha256)}).
+        Returns (files checked, files parsed, workers used).
+        """
+        stats = {}
+        for path in file_paths:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            stats[path] = (st.st_mtime, st.st_size)
+        stale = [path for path in stats if indexed_states.get(path, (None, None))[:2] != stats[path]]
+        if parallel is None:
+            parallel = len(stale) >= PARALLEL_THRESHOLD
+        workers = min(self.max_workers, len(stale)) if parallel and stale else 1
+        known_hashes = [indexed_states[path][2] if path in indexed_states else None for path in stale]
+        records, parsed = [], 0
+        for path, result in self._analyze_files(stale, known_hashes, workers):
+            records.append((path, *stats[path], result))
+            parsed += bool(result and "entities" in result)
+            if len(records) >= 500:
+                self.index.update_files(records)
+                records = []
+        self.index.update_files(records)
+        if stale:
+            self._generation += 1
+        return len(stale), parsed, workers
+
+    def _update_index(self, root, parallel=None):
+        """Refreshes the index for every .py file under root. Returns (files, checked, parsed, workers, removed)."""
+        file_paths = self._find_python_files(root)
+        checked, parsed, workers = self._refresh(file_paths, self.index.file_states(root), parallel)
+        removed = self.index.remove_missing(root, set(file_paths))
+        if removed:
+            self._generation += 1
+        return file_paths, checked, parsed, workers, removed
+
+    def analyze_directory(self, dir_path, parallel=None):
+        """
+        Brings the index up to date for every .py file under dir_path and returns the
+        merged entities. Changed files are parsed in a process pool when parallel is
+        True, or by default when at least PARALLEL_THRESHOLD of them changed.
+
+        entity_map maps each entity's qualified name to its file; names defined in
+        more than one file are keyed as "<relative path>::<qualified name>". Every bare
+        name (e.g. a method's) is also kept as an alias for its first definition, since
+        the mind map labels nodes by bare name.
+        summary["report"] gives the throughput and how many files were reused.
+        """
         summary = {
             "files_analyzed": 0,
             "all_classes": set(),
@@ -22,35 +171,151 @@ class OntologyAgent:
             "entity_map": {}
         }
         try:
-            for root, _, files in os.walk(dir_path):
-                for file in files:
-                    if file.endswith('.py'):
-                        file_path = os.path.join(root, file)
-                        entities = self.analyze_file(file_path)
-                        if entities:
-                            summary["files_analyzed"] += 1
-                            for cls in entities.get("classes", []):
-                                summary["all_classes"].add(cls)
-                                summary["entity_map"][cls] = file_path
-                            for func in entities.get("functions", []):
-                                summary["all_functions"].add(func)
-                                summary["entity_map"][func] = file_path
+            started = time.perf_counter()
+            root = os.path.abspath(dir_path)
+            file_paths, checked, parsed, workers, removed = self._update_index(root, parallel)
+            self.index.add_root(root)
+
+            indexed = self.index.directory_summary(root)
+            summary["files_analyzed"] = indexed["files_parsed"]
+            locations = {}
+            for file_path, qualified_name, name, kind in indexed["entities"]:
+                (summary["all_classes"] if kind == "ClassDef" else summary["all_functions"]).add(name)
+                locations.setdefault(qualified_name, []).append(file_path)
+            for qualified_name, paths in locations.items():
+                if len(paths) == 1:
+                    summary["entity_map"][qualified_name] = paths[0]
+                else:
+                    for path in paths:
+                        summary["entity_map"][f"{os.path.relpath(path, root)}::{qualified_name}"] = path
+            for file_path, _, name, _ in indexed["entities"]:
+                summary["entity_map"].setdefault(name, file_path)
             summary["all_classes"] = sorted(list(summary["all_classes"]))
             summary["all_functions"] = sorted(list(summary["all_functions"]))
+            elapsed = time.perf_counter() - started
+            summary["report"] = {
+                "files_found": len(file_paths),
+                "files_changed": checked,
+                "files_parsed": parsed,
+                "files_reused": len(file_paths) - parsed,
+                "files_removed": removed,
+                "files_failed": indexed["files_failed"],
+                "workers": workers,
+                "elapsed_s": round(elapsed, 3),
+                "files_per_sec": round(len(file_paths) / elapsed, 1) if elapsed > 0 else 0.0,
+            }
+            self.logger.info(f"Analyzed {len(file_paths)} files in {dir_path} in {elapsed:.2f}s: {parsed} parsed "
+                             f"with {workers} worker(s), {len(file_paths) - parsed} reused from the index.")
             return {"status": "Success", "summary": summary}
         except Exception as e:
             return {"status": f"Error: {e}", "summary": {}}
 
+    def indexed_root(self, dir_path):
+        """Returns the analyzed directory that dir_path is or lies inside, or None if it was never analyzed."""
+        return self.index.indexed_root(dir_path) if dir_path else None
+
     def get_entity_details(self, file_path, entity_name):
+        """Answers from the index; the file is only re-parsed if it changed since it was indexed."""
         try:
-            with open(file_path, 'r', encoding='utf-8') as source_file:
-                tree = ast.parse(source_file.read())
-            for node in ast.walk(tree):
-                if isinstance(node, (ast.ClassDef, ast.FunctionDef)) and node.name == entity_name:
-                    details = {"name": node.name, "type": type(node).__name__, "docstring": ast.get_docstring(node) or "No description provided."}
-                    if isinstance(node, ast.ClassDef):
-                        details["methods"] = [n.name for n in node.body if isinstance(n, ast.FunctionDef)]
-                    return {"status": "Success", "details": details}
-            return {"status": f"Entity '{entity_name}' not found."}
+            path = os.path.abspath(file_path)
+            if "::" in entity_name:
+                entity_name = entity_name.rsplit("::", 1)[1]
+            state = self.index.file_state(path)
+            self._refresh([path], {path: state} if state else {}, parallel=False)
+            if self.index.file_state(path) is None:
+                return {"status": f"Error analyzing file: '{file_path}' could not be read."}
+            details = self.index.find_entity(path, entity_name)
+            if details is None:
+                return {"status": f"Entity '{entity_name}' not found."}
+            details["docstring"] = details["docstring"] or "No description provided."
+            if details["type"] != "ClassDef":
+                details.pop("methods")
+            return {"status": "Success", "details": details}
         except Exception as e:
             return {"status": f"Error analyzing file: {e}"}
+
+    def _directory_children(self, root, rel_dir):
+        base = os.path.join(root, rel_dir) if rel_dir else root
+        counts = self.index.top_level_entity_counts(base)
+        subdirs, modules = {}, []
+        for path in self.index.file_states(base):
+            parts = os.path.relpath(path, base).split(os.sep)
+            if len(parts) > 1:
+                entry = subdirs.setdefault(parts[0], {"children": set(), "package": False})
+                entry["children"].add(parts[1])
+                entry["package"] |= parts[1:] == ["__init__.py"]
+            else:
+                modules.append(path)
+        children = [
+            {"id": f"dir:{os.path.join(rel_dir, name)}", "label": name, "kind": "package" if info["package"] else "directory",
+             "child_count": len(info["children"])}
+            for name, info in sorted(subdirs.items())
+        ]
+        children.extend(
+            {"id": f"module:{os.path.relpath(path, root)}", "label": os.path.basename(path), "kind": "module",
+             "child_count": counts.get(path, 0)}
+            for path in sorted(modules)
+        )
+        return children
+
+    def _entity_children(self, root, rel_path, parent=None):
+        entities = self.index.file_entities(os.path.join(root, rel_path))
+        depth = 0 if parent is None else parent.count(".") + 1
+        child_counts = {}
+        for qualified_name, _, _ in entities:
+            if "." in qualified_name:
+                owner = qualified_name.rsplit(".", 1)[0]
+                child_counts[owner] = child_counts.get(owner, 0) + 1
+        return [
+            {"id": f"entity:{rel_path}::{qualified_name}", "label": name,
+             "kind": "class" if kind == "ClassDef" else "function", "child_count": child_counts.get(qualified_name, 0)}
+            for qualified_name, name, kind in entities
+            if qualified_name.count(".") == depth and (parent is None or qualified_name.startswith(parent + "."))
+        ]
+
+    def _graph_children(self, root, node_id):
+        """Computes (and caches) every child of a graph node: directories, modules, classes or functions."""
+        key = (root, node_id, self._generation)
+        with self._graph_lock:
+            if key in self._graph_cache:
+                self._graph_cache.move_to_end(key)
+                return self._graph_cache[key]
+        kind, _, ref = node_id.partition(":")
+        rel_path = os.path.normpath(ref.split("::", 1)[0]) if ref else ""
+        if os.path.isabs(rel_path) or rel_path.split(os.sep)[0] == "..":
+            raise ValueError(f"Graph node '{node_id}' is outside the analyzed directory.")
+        if kind == "dir":
+            children = self._directory_children(root, ref)
+        elif kind == "module":
+            children = self._entity_children(root, ref)
+        elif kind == "entity" and "::" in ref:
+            children = self._entity_children(root, *ref.split("::", 1))
+        else:
+            raise ValueError(f"Unknown graph node '{node_id}'.")
+        with self._graph_lock:
+            self._graph_cache[key] = children
+            while len(self._graph_cache) > GRAPH_CACHE_SIZE:
+                self._graph_cache.popitem(last=False)
+        return children
+
+    def get_subgraph(self, dir_path, node_id="", offset=0, limit=50):
+        """
+        Returns one page of a node's children for the mind map, starting from the
+        top-level package view (node_id "") and drilling into "dir:<path>",
+        "module:<path>" and "entity:<path>::<qualified name>" nodes on demand.
+        The index is refreshed when the top-level view is requested.
+        """
+        try:
+            root = os.path.abspath(dir_path)
+            if not node_id:
+                self._update_index(root)
+                node_id = "dir:"
+            limit = max(1, min(limit, MAX_GRAPH_PAGE))
+            offset = max(0, offset)
+            children = self._graph_children(root, node_id)
+            page = children[offset:offset + limit]
+            next_offset = offset + len(page) if offset + len(page) < len(children) else None
+            return {"status": "Success", "node": node_id, "children": page, "total": len(children),
+                    "offset": offset, "limit": limit, "next_offset": next_offset}
+        except ValueError as e:
+            return {"status": f"Error: {e}"}
@@ -1,20 +1,31 @@
 import logging
 import json
-import ollama
+import time
 import chromadb
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from .simulation_agent import SimulationAgent
+from ..shared.embedding_cache import embed_texts
+from ..shared.llm_client import get_llm_client
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
 class PlanningAgent:
     """
     Generates multiple diverse plans, informed by past projects from the Codex,
-    and selects the best one after scoring.
+    and selects the best one after a concurrent scoring tournament.
+
+    Candidate plans are evaluated in parallel. With score_threshold set, the
+    tournament stops as soon as one plan reaches it. With fuse_simulation, each
+    evaluation also runs the risk simulation, and the winner carries its report
+    in plan["plan_metadata"]["simulation_report"] so no extra round trip is needed.
     """
-    def __init__(self, model="llama3", num_plans=3):
+    def __init__(self, model="llama3", num_plans=3, score_threshold=None, fuse_simulation=True):
         self.logger = logging.getLogger(self.__class__.__name__)
         self.model = model
+        self.llm_client = get_llm_client()
         self.num_plans = num_plans
+        self.score_threshold = score_threshold
+        self.fuse_simulation = fuse_simulation
         self.simulation_agent = SimulationAgent(model=model)
         try:
             self.chroma_client = chromadb.PersistentClient(path="miso_code_db")
@@ -27,8 +38,8 @@ class PlanningAgent:
     def _retrieve_context_from_codex(self, objective: str, n_results=3) -> str:
         if not self.code_collection: return "No historical context available."
         try:
-            response = ollama.embeddings(model='mxbai-embed-large', prompt=objective)
-            results = self.code_collection.query(query_embeddings=[response["embedding"]], n_results=n_results)
+            embedding = embed_texts(self.llm_client, 'mxbai-embed-large', [objective])[0]
+            results = self.code_collection.query(query_embeddings=[embedding.tolist()], n_results=n_results)
             self.logger.info("Successfully retrieved context from Codex.")
             return "\n---\n".join(results['documents'][0])
         except Exception as e:
@@ -53,6 +64,7 @@ class PlanningAgent:
         1.  Generate a list containing {self.num_plans} completely separate and distinct project plans.
         2.  Provide architectural variety in your proposals.
         3.  **CRITICAL**: Your entire response must be a single, valid JSON object with one root key: "plans". The value of "plans" must be a list of JSON objects. Each object in the list must contain at least these three keys: "project_name" (string), "technologies" (list of strings), and a non-empty "file_structure" (dictionary).
+        4.  Optionally, each plan may include a "dependencies" dictionary mapping a file path to the list of file paths it imports, so independent files can be generated in parallel.
         """
 
     def create_plan(self, objective: str, max_retries=1) -> dict:
@@ -66,7 +78,7 @@ class PlanningAgent:
 
         for attempt in range(max_retries + 1):
             try:
-                response = ollama.chat(model=self.model, messages=[{'role': 'user', 'content': prompt}], format='json')
+                response = self.llm_client.chat(model=self.model, messages=[{'role': 'user', 'content': prompt}], format='json')
                 plans = json.loads(response['message']['content']).get("plans", [])
                 if plans and len(plans) > 0:
                     self.logger.info(f"Successfully generated {len(plans)} initial plans.")
@@ -77,15 +89,53 @@ class PlanningAgent:
         
         if not plans: return {"error": "LLM failed to generate any plans."}
 
-        scored_plans = []
-        for i, plan in enumerate(plans):
-            self.logger.info(f"Evaluating Plan {i+1}/{len(plans)}: '{plan.get('project_name')}'")
-            score_data = self.simulation_agent.score_plan_quality(plan)
-            scored_plans.append({"plan": plan, "score": score_data.get('overall_score', 0)})
-
+        scored_plans, early_cutoff = self._run_tournament(plans)
         if not scored_plans: return {"error": "Failed to score any generated plans."}
 
         best_plan_item = max(scored_plans, key=lambda x: x['score'])
         self.logger.info(f"Selected best plan ('{best_plan_item.get('plan', {}).get('project_name')}') with score {best_plan_item.get('score')}/100.")
         
-        return best_plan_item.get('plan', {"error": "Could not select best plan."})
+        best_plan = best_plan_item.get('plan', {"error": "Could not select best plan."})
+        best_plan["plan_metadata"] = {
+            "score": best_plan_item['score'],
+            "early_cutoff": early_cutoff,
+            "candidates": [
+                {"index": item['index'], "project_name": item['plan'].get('project_name'), "score": item['score'], "scoring_latency_s": item['latency_s']}
+                for item in sorted(scored_plans, key=lambda x: x['index'])
+            ],
+        }
+        if best_plan_item.get('simulation') is not None:
+            best_plan["plan_metadata"]["simulation_report"] = best_plan_item['simulation']
+        return best_plan
+
+    def _evaluate_candidate(self, index: int, plan: dict) -> dict:
+        """Scores one candidate plan (and simulates its risks when fused), timing the call."""
+        self.logger.info(f"Evaluating Plan {index+1}: '{plan.get('project_name')}'")
+        started = time.perf_counter()
+        simulation = None
+        if self.fuse_simulation:
+            evaluation = self.simulation_agent.evaluate_plan(plan)
+            score_data, simulation = evaluation["score"], evaluation["simulation"]
+        else:
+            score_data = self.simulation_agent.score_plan_quality(plan)
+        try:
+            score = float(score_data.get('overall_score', 0))
+        except (TypeError, ValueError):
+            score = 0.0
+        return {"index": index, "plan": plan, "score": score, "simulation": simulation, "latency_s": round(time.perf_counter() - started, 3)}
+
+    def _run_tournament(self, plans: list) -> tuple:
+        """Evaluates all candidate plans concurrently. Returns (scored_plans, early_cutoff)."""
+        scored_plans = []
+        executor = ThreadPoolExecutor(max_workers=len(plans))
+        try:
+            futures = [executor.submit(self._evaluate_candidate, i, plan) for i, plan in enumerate(plans)]
+            for future in as_completed(futures):
+                item = future.result()
+                scored_plans.append(item)
+                if self.score_threshold is not None and item['score'] >= self.score_threshold:
+                    self.logger.info(f"Plan {item['index']+1} reached the score threshold ({item['score']} >= {self.score_threshold}). Stopping tournament early.")
+                    return scored_plans, len(scored_plans) < len(plans)
+            return scored_plans, False
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
@@ -1,6 +1,6 @@
 import logging
 import json
-import ollama
+from ..shared.llm_client import get_llm_client
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
@@ -12,6 +12,7 @@ class ProductManagerAgent:
     def __init__(self, model="llama3"):
         self.logger = logging.getLogger(self.__class__.__name__)
         self.model = model
+        self.llm_client = get_llm_client()
         self.logger.info("ProductManagerAgent initialized.")
 
     def _create_effort_estimation_prompt(self, proposal: dict) -> str:
@@ -54,7 +55,7 @@ class ProductManagerAgent:
 
             prompt = self._create_effort_estimation_prompt(proposal)
             try:
-                response = ollama.chat(
+                response = self.llm_client.chat(
                     model=self.model,
                     messages=[{'role': 'user', 'content': prompt}],
                     format='json'
@@ -1,5 +1,5 @@
 import logging
-import ollama
+from ..shared.llm_client import get_llm_client
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
@@ -10,6 +10,7 @@ class PromptEnhancerAgent:
     def __init__(self, model="llama3"):
         self.logger = logging.getLogger(self.__class__.__name__)
         self.model = model
+        self.llm_client = get_llm_client()
         self.logger.info(f"PromptEnhancerAgent initialized with model: {self.model}")
 
     def _create_enhancement_prompt(self, objective: str) -> str:
@@ -36,7 +37,7 @@ class PromptEnhancerAgent:
         prompt = self._create_enhancement_prompt(raw_objective)
 
         try:
-            response = ollama.chat(
+            response = self.llm_client.chat(
                 model=self.model,
                 messages=[{'role': 'user', 'content': prompt}]
             )
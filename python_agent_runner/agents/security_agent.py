@@ -1,76 +1,185 @@
 import logging
-import subprocess
 import json
 import os
-import ollama
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from importlib import metadata
 from .code_generation_agent import CodeGenerationAgent
+from ..shared.analyzer_daemon import run_analyzer
+from ..shared.attack_surface import select_attack_surface
+from ..shared.llm_client import get_llm_client
+from ..shared.security_scan_cache import SecurityScanCache, content_hash
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
+
+def _bandit_version() -> str:
+    try:
+        return metadata.version("bandit")
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def _fingerprint(root: str, issue: dict) -> tuple:
+    """Identifies an issue independently of its line number, which shifts whenever code above it changes."""
+    return os.path.relpath(issue["file"], root).replace("\\", "/"), issue.get("test_id"), issue["issue"]
+
+
 class SecurityAgent:
     """
     Performs defensive (static analysis) and offensive (red team) security tests.
     """
-    def __init__(self, model="llama3"):
+    def __init__(self, model="llama3", scan_cache_path=".miso_cache/security_scan.sqlite3", max_workers=None,
+                 red_team_token_budget=2000):
         self.logger = logging.getLogger(self.__class__.__name__)
         self.model = model
+        self.llm_client = get_llm_client()
         self.code_gen_agent = CodeGenerationAgent(model=model)
+        self.scan_cache = SecurityScanCache(scan_cache_path, _bandit_version())
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.red_team_token_budget = red_team_token_budget
         self.logger.info("SecurityAgent initialized.")
 
-    def static_scan(self, project_path: str) -> dict:
-        """Runs a Bandit scan on a directory and returns a structured report."""
-        # This is the original scan_codebase method, renamed for clarity
-        self.logger.info(f"Starting static security scan on codebase at: {project_path}")
-        command = ['bandit', '-r', project_path, '-f', 'json']
+    def _python_files(self, project_path: str) -> list:
+        if os.path.isfile(project_path):
+            return [project_path]
+        file_paths = []
+        for root, dirs, files in os.walk(project_path):
+            dirs[:] = [d for d in dirs if not d.startswith('.') and d not in ['venv', '__pycache__']]
+            file_paths.extend(os.path.join(root, file) for file in files if file.endswith('.py'))
+        return sorted(file_paths)
+
+    def _run_bandit(self, file_paths: list) -> dict:
+        """Scans the given files in one bandit run. Returns {normalized path: {"findings", "error"}}."""
+        result = run_analyzer('bandit', ['-f', 'json', '-q', *file_paths])
         try:
-            result = subprocess.run(command, capture_output=True, text=True, check=False)
-            if not result.stdout or not result.stdout.strip():
-                return {"status": "SECURE", "issues": []}
             report = json.loads(result.stdout)
-            issues = report.get('results', [])
-            if not issues:
-                return {"status": "SECURE", "issues": []}
-            else:
-                simplified_issues = [{"file": i.get("filename"), "issue": i.get("issue_text"), "severity": i.get("issue_severity"), "line": i.get("line_number")} for i in issues]
-                return {"status": "INSECURE", "issues": simplified_issues}
+        except ValueError:
+            raise RuntimeError(f"bandit produced no report: {(result.stderr or result.stdout).strip()[:500]}")
+        scanned = {os.path.normpath(path): {"findings": [], "error": None} for path in file_paths}
+        for issue in report.get('results', []):
+            scanned.setdefault(os.path.normpath(issue.get("filename", "")), {"findings": [], "error": None})["findings"].append({
+                "issue": issue.get("issue_text"), "severity": issue.get("issue_severity"),
+                "line": issue.get("line_number"), "test_id": issue.get("test_id"),
+            })
+        for error in report.get('errors', []):
+            scanned.setdefault(os.path.normpath(error.get("filename", "")), {"findings": [], "error": None})["error"] = error.get("reason")
+        return scanned
+
+    def _scan_files(self, file_paths: list) -> dict:
+        """Runs bandit over file_paths split into up to max_workers concurrent batches."""
+        if not file_paths:
+            return {}
+        batches = [file_paths[i::self.max_workers] for i in range(min(self.max_workers, len(file_paths)))]
+        scanned = {}
+        with ThreadPoolExecutor(max_workers=len(batches)) as executor:
+            for batch_result in executor.map(self._run_bandit, batches):
+                scanned.update(batch_result)
+        return scanned
+
+    def _load_baseline(self, baseline_path: str) -> Counter:
+        """Returns how many times each fingerprint occurred when the baseline was saved."""
+        with open(baseline_path, 'r', encoding='utf-8') as f:
+            return Counter(tuple(entry) for entry in json.load(f).get("fingerprints", []))
+
+    def save_baseline(self, project_path: str, baseline_path: str) -> dict:
+        """
+        Records the project's current findings so later scans with baseline=baseline_path only
+        report new ones. A fingerprint is listed once per occurrence, so a new copy of a
+        baselined finding is still reported.
+        """
+        report = self.static_scan(project_path)
+        if report["status"] == "FAIL":
+            return report
+        root = project_path if os.path.isdir(project_path) else os.path.dirname(project_path)
+        fingerprints = sorted((_fingerprint(root, issue) for issue in report["issues"]), key=str)
+        with open(baseline_path, 'w', encoding='utf-8') as f:
+            json.dump({"fingerprints": fingerprints}, f, indent=2)
+        self.logger.info(f"Saved a security baseline of {len(fingerprints)} finding(s) to {baseline_path}.")
+        return report
+
+    def static_scan(self, project_path: str, baseline: str = None) -> dict:
+        """
+        Runs Bandit over a directory (or a single file) and returns a structured report.
+        Findings are cached per file content, so only new or changed files are scanned;
+        with a baseline written by save_baseline, only issues absent from it (or occurring more
+        often than it recorded) are reported.
+        """
+        self.logger.info(f"Starting static security scan on codebase at: {project_path}")
+        started = time.perf_counter()
+        try:
+            hashes = {path: content_hash(path) for path in self._python_files(project_path)}
+            hashes = {path: sha256 for path, sha256 in hashes.items() if sha256}
+            results = self.scan_cache.get_many(list(set(hashes.values())))
+            # One representative path per unseen content hash; identical files are scanned once.
+            to_scan = list({sha256: path for path, sha256 in hashes.items() if sha256 not in results}.values())
+            scanned = self._scan_files(to_scan)
+            fresh = {hashes[path]: scanned[os.path.normpath(path)] for path in to_scan}
+            self.scan_cache.put_many(fresh)
+            results.update(fresh)
         except Exception as e:
             self.logger.error(f"An unexpected error occurred during static scan: {e}")
             return {"status": "FAIL", "reason": str(e)}
 
+        issues, scan_errors = [], []
+        for path, sha256 in hashes.items():
+            result = results[sha256]
+            issues.extend({"file": path, **finding} for finding in result["findings"])
+            if result["error"]:
+                scan_errors.append({"file": path, "reason": result["error"]})
+
+        baselined = 0
+        if baseline:
+            known = self._load_baseline(baseline)
+            root = project_path if os.path.isdir(project_path) else os.path.dirname(project_path)
+            new_issues = []
+            for issue in issues:
+                fingerprint = _fingerprint(root, issue)
+                if known[fingerprint] > 0:
+                    known[fingerprint] -= 1
+                else:
+                    new_issues.append(issue)
+            baselined, issues = len(issues) - len(new_issues), new_issues
+
+        elapsed = time.perf_counter() - started
+        self.logger.info(f"Static scan: {len(hashes)} file(s), {len(to_scan)} scanned, "
+                         f"{len(hashes) - len(to_scan)} from cache, {len(issues)} issue(s) in {elapsed:.2f}s.")
+        report = {"status": "INSECURE" if issues else "SECURE", "issues": issues,
+                  "scan": {"files": len(hashes), "scanned": len(to_scan), "cached": len(hashes) - len(to_scan),
+                           "baselined": baselined, "elapsed_s": round(elapsed, 3)}}
+        if scan_errors:
+            report["scan_errors"] = scan_errors
+        return report
+
     def _brainstorm_vulnerabilities(self, codebase: str) -> str:
-        """Uses an LLM to brainstorm potential logical vulnerabilities."""
+        """Uses an LLM to brainstorm potential logical vulnerabilities in an already budgeted codebase excerpt."""
         self.logger.info("Brainstorming potential vulnerabilities...")
         prompt = f"""
         You are a senior penetration tester. Analyze the following codebase for potential logical vulnerabilities, not just simple syntax errors.
         Focus on issues like insecure direct object references, authentication bypass, or race conditions.
 
-        **Codebase:**
+        **Codebase (the most security-relevant excerpts):**
         ```
-        {codebase[:8000]}
+        {codebase}
         ```
 
         **Instructions:**
         Identify the single most likely and critical logical vulnerability. Describe it in one clear sentence.
         Respond with ONLY the one-sentence description.
         """
-        response = ollama.chat(model=self.model, messages=[{'role': 'user', 'content': prompt}])
+        response = self.llm_client.chat(model=self.model, messages=[{'role': 'user', 'content': prompt}])
         return response['message']['content'].strip()
 
     def run_red_team_test(self, project_path: str) -> dict:
         """Performs a red team exercise on a generated project."""
         self.logger.info(f"--- Starting Red Team Test for {project_path} ---")
         
-        # 1. Ingest Codebase
-        codebase_content = ""
-        for root, _, files in os.walk(project_path):
-            for file in files:
-                if file.endswith('.py') or file.endswith('.html') or file.endswith('.js'):
-                    try:
-                        with open(os.path.join(root, file), 'r', encoding='utf-8') as f:
-                            codebase_content += f"--- FILE: {file} ---\n{f.read()}\n\n"
-                    except: continue
-
+        # 1. Ingest Codebase: the attack-surface chunks (routes, auth, SQL, subprocess, deserialization) that fit the budget
+        codebase_content, ingestion = select_attack_surface(project_path, self.red_team_token_budget)
         if not codebase_content: return {"status": "FAIL", "reason": "No code found to analyze."}
+        self.logger.info(f"Ingested {len(ingestion['included'])} of {ingestion['chunks_seen']} chunk(s) from "
+                         f"{ingestion['files_seen']} file(s) ({ingestion['used_tokens']}/{ingestion['budget_tokens']} tokens).")
 
         # 2. Brainstorm Vulnerability
         vulnerability_hypothesis = self._brainstorm_vulnerabilities(codebase_content)
@@ -90,6 +199,7 @@ class SecurityAgent:
             "status": "COMPLETE",
             "vulnerability_found": vulnerability_hypothesis,
             "generated_exploit_script": exploit_script,
-            "result": "NOT_EXECUTED (Sandbox required)"
+            "result": "NOT_EXECUTED (Sandbox required)",
+            "ingestion": ingestion
         }
         return report
@@ -1,6 +1,6 @@
 import logging
 import json
-import ollama
+from ..shared.llm_client import get_llm_client
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
@@ -11,6 +11,7 @@ class SimulationAgent:
     def __init__(self, model="llama3"):
         self.logger = logging.getLogger(self.__class__.__name__)
         self.model = model
+        self.llm_client = get_llm_client()
         self.logger.info(f"SimulationAgent initialized with model: {self.model}")
 
     def _create_risk_prompt(self, plan_json_str: str) -> str:
@@ -30,7 +31,7 @@ class SimulationAgent:
         plan_json_str = json.dumps(plan, indent=2)
         prompt = self._create_risk_prompt(plan_json_str)
         try:
-            response = ollama.chat(model=self.model, messages=[{'role': 'user', 'content': prompt}], format='json')
+            response = self.llm_client.chat(model=self.model, messages=[{'role': 'user', 'content': prompt}], format='json')
             report = json.loads(response['message']['content'])
             self.logger.info("Risk simulation complete.")
             return report
@@ -54,10 +55,45 @@ class SimulationAgent:
         plan_json_str = json.dumps(plan, indent=2)
         prompt = self._create_scoring_prompt(plan_json_str)
         try:
-            response = ollama.chat(model=self.model, messages=[{'role': 'user', 'content': prompt}], format='json')
+            response = self.llm_client.chat(model=self.model, messages=[{'role': 'user', 'content': prompt}], format='json')
             score_data = json.loads(response['message']['content'])
             self.logger.info(f"Plan scored successfully: {score_data.get('overall_score')}/100")
             return score_data
         except Exception as e:
             self.logger.error(f"Failed to score plan: {e}")
             return {"overall_score": 0, "justification": "Error during scoring."}
+
+    def _create_evaluation_prompt(self, plan_json_str: str) -> str:
+        """Creates a single prompt that both scores a plan and runs the risk simulation on it."""
+        return f"""
+        You are an expert AI system architect. Evaluate the following project plan in one pass:
+        1. Score its quality from 1-100 based on simplicity, scalability, and maintainability.
+        2. Perform a "proactive foresight" simulation: analyze the plan for risks, flaws, or missed edge cases.
+        You MUST respond with ONLY a single, valid JSON object with "overall_score", "justification", "status" ("PASS" or "FAIL"), "confidence_score", and "risks".
+        
+        **Project Plan:**
+        {plan_json_str}
+        """
+
+    def evaluate_plan(self, plan: dict) -> dict:
+        """
+        Scores a plan and simulates its risks with one LLM call. Returns
+        {"score": <score_plan_quality result>, "simulation": <run_simulation result>}.
+        """
+        self.logger.info("Evaluating plan (score + risk simulation)...")
+        plan_json_str = json.dumps(plan, indent=2)
+        prompt = self._create_evaluation_prompt(plan_json_str)
+        try:
+            response = self.llm_client.chat(model=self.model, messages=[{'role': 'user', 'content': prompt}], format='json')
+            evaluation = json.loads(response['message']['content'])
+            self.logger.info(f"Plan evaluated: {evaluation.get('overall_score')}/100, status {evaluation.get('status')}")
+            return {
+                "score": {"overall_score": evaluation.get("overall_score", 0), "justification": evaluation.get("justification", "")},
+                "simulation": {"status": evaluation.get("status", "FAIL"), "confidence_score": evaluation.get("confidence_score", 0.0), "risks": evaluation.get("risks", [])},
+            }
+        except Exception as e:
+            self.logger.error(f"Failed to evaluate plan: {e}")
+            return {
+                "score": {"overall_score": 0, "justification": "Error during scoring."},
+                "simulation": {"status": "FAIL", "confidence_score": 0.0, "risks": [{"description": "Failed to generate simulation report."}]},
+            }
@@ -1,7 +1,7 @@
 import logging
 import json
-import ollama
 from .catalyst_agent import CatalystAgent
+from ..shared.llm_client import get_llm_client
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
@@ -10,6 +10,7 @@ class TriageAgent:
     def __init__(self, model="llama3", final_threshold=6.0):
         self.logger = logging.getLogger(self.__class__.__name__)
         self.model = model
+        self.llm_client = get_llm_client()
         self.final_threshold = final_threshold
         self.catalyst_agent = CatalystAgent(model=model)
         self.logger.info(f"TriageAgent initialized with final score threshold: {self.final_threshold}")
@@ -60,7 +61,7 @@ class TriageAgent:
             try:
                 # Step 1: Get Relevance Score
                 relevance_prompt = self._create_relevance_prompt(paper)
-                relevance_response = ollama.chat(model=self.model, messages=[{'role': 'user', 'content': relevance_prompt}], format='json')
+                relevance_response = self.llm_client.chat(model=self.model, messages=[{'role': 'user', 'content': relevance_prompt}], format='json')
                 relevance_data = json.loads(relevance_response['message']['content'])
                 relevance_score = self._normalize_score(relevance_data.get("relevance_score", 0))
                 
@@ -1,17 +1,39 @@
 # python_agent_runner/agents/ui_agent.py
-import ollama
 import json
+import os
+import re
 from .genesis_agent import GenesisAgent
 from .ontology_agent import OntologyAgent
+from ..shared.llm_client import get_llm_client
 
 class UIAgent:
     def __init__(self):
         self.creation_sessions = {}
         self.genesis_agent = GenesisAgent()
         self.ontology_agent = OntologyAgent()
+        self.llm_client = get_llm_client()
 
     def process_request(self, user_input, user_id):
-        # (Your existing analyze/explain logic can remain here)
+        command = user_input.strip()
+        explain = re.match(r"^explain\s+(\S+)\s+in\s+(.+)$", command, re.IGNORECASE)
+        if explain:
+            result = self.ontology_agent.get_entity_details(explain.group(2).strip(), explain.group(1))
+            if result["status"] != "Success":
+                return {'response': result["status"]}
+            return {'response': json.dumps(result["details"], indent=2)}
+        analyze = re.match(r"^analyze\s+(.+)$", command, re.IGNORECASE)
+        if analyze:
+            root = os.path.abspath(analyze.group(1).strip())
+            if not os.path.isdir(root):
+                return {'response': f"'{root}' is not a directory."}
+            result = self.ontology_agent.analyze_directory(root)
+            if result["status"] != "Success":
+                return {'response': result["status"]}
+            summary = result["summary"]
+            # The mind map loads the graph of graph_root from /api/graph, one neighbourhood at a time.
+            return {'response': f"Analyzed {summary['files_analyzed']} files: {len(summary['all_classes'])} classes, "
+                                f"{len(summary['all_functions'])} functions.",
+                    'graph_root': root}
 
         if user_id not in self.creation_sessions:
             self.creation_sessions[user_id] = {
@@ -41,7 +63,7 @@ class UIAgent:
             Respond with a single, valid JSON object containing three keys: "response_type" (either "dialogue" or "handoff"), "brief" (the updated JSON brief), and "response" (your next message to the user).
             """
             
-            response = ollama.chat(model='llama3', messages=[{'role': 'user', 'content': prompt}])
+            response = self.llm_client.chat(model='llama3', messages=[{'role': 'user', 'content': prompt}])
             llm_output_text = response['message']['content'].strip()
             
             if "```json" in llm_output_text:
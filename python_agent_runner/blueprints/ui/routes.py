@@ -42,6 +42,27 @@ def send_message():
     response_data = ui_agent.process_request(message, user_id)
     return jsonify(response_data)
 
+@ui_bp.route('/api/graph')
+def get_graph():
+    """
+    One page of the mind-map graph: the top-level view of ?root=, or the children of ?node=.
+    root must be a directory analyzed with "analyze <path>" (or lie inside one).
+    """
+    root = request.args.get('root', '')
+    if ui_agent.ontology_agent.indexed_root(root) is None:
+        return jsonify({'error': 'Query parameter root must be a directory that has been analyzed'}), 403
+    if not os.path.isdir(root):
+        return jsonify({'error': 'Query parameter root must be an existing directory'}), 400
+    result = ui_agent.ontology_agent.get_subgraph(
+        root,
+        node_id=request.args.get('node', ''),
+        offset=request.args.get('offset', 0, type=int),
+        limit=request.args.get('limit', 50, type=int),
+    )
+    if result["status"] != "Success":
+        return jsonify({'error': result["status"]}), 404
+    return jsonify(result)
+
 @ui_bp.route('/submit_feedback', methods=['POST'])
 def submit_feedback():
     data = request.get_json()
@@ -1,16 +1,85 @@
-// Initialize the Mermaid library
-mermaid.initialize({ startOnLoad: true });
+var graphRoot = null; // The analyzed directory the mind map is showing
 
-var entityMap = {}; // Global map to store entity file paths
+function handleExplainClick(nodeId) {
+    // Entity node ids are "entity:<relative path>::<qualified name>".
+    const [relPath, qualifiedName] = nodeId.slice('entity:'.length).split('::');
+    const command = `explain ${qualifiedName} in ${graphRoot}/${relPath}`;
+    document.getElementById('user-input').value = command;
+    document.getElementById('send-btn').click();
+}
+
+async function fetchGraphPage(nodeId, offset) {
+    const params = new URLSearchParams({ root: graphRoot, node: nodeId, offset: offset });
+    const response = await fetch(`/api/graph?${params}`);
+    const data = await response.json();
+    if (!response.ok) {
+        throw new Error(data.error || `Graph request failed with status ${response.status}`);
+    }
+    return data;
+}
+
+// Appends one page of a node's children to list, followed by a "more" entry while pages remain.
+async function loadGraphChildren(list, nodeId, offset) {
+    const page = await fetchGraphPage(nodeId, offset);
+    page.children.forEach(child => list.appendChild(createGraphNode(child)));
+    if (page.next_offset !== null) {
+        const more = document.createElement('li');
+        more.className = 'graph-more';
+        more.textContent = `Show more (${page.total - page.next_offset} left)`;
+        more.addEventListener('click', async () => {
+            more.remove();
+            await loadGraphChildren(list, nodeId, page.next_offset);
+        });
+        list.appendChild(more);
+    }
+}
+
+function createGraphNode(node) {
+    const item = document.createElement('li');
+    const label = document.createElement('span');
+    label.className = `graph-node graph-${node.kind}`;
+    label.textContent = node.child_count > 0 ? `${node.label} (${node.child_count})` : node.label;
+    item.appendChild(label);
+
+    let children = null;
+    label.addEventListener('click', async () => {
+        if (node.id.startsWith('entity:') && node.child_count === 0) {
+            handleExplainClick(node.id);
+            return;
+        }
+        if (children) {
+            // Already loaded: just fold or unfold the neighbourhood.
+            children.hidden = !children.hidden;
+            return;
+        }
+        children = document.createElement('ul');
+        item.appendChild(children);
+        try {
+            await loadGraphChildren(children, node.id, 0);
+        } catch (error) {
+            console.error('Error loading graph node:', error);
+            children.remove();
+            children = null;
+        }
+    });
+    if (node.id.startsWith('entity:') && node.child_count > 0) {
+        // Classes expand on click; their name still explains on double click.
+        label.addEventListener('dblclick', () => handleExplainClick(node.id));
+    }
+    return item;
+}
 
-function handleExplainClick(entityName) {
-    const filePath = entityMap[entityName];
-    if (filePath) {
-        const command = `explain ${entityName} in ${filePath}`;
-        document.getElementById('user-input').value = command;
-        document.getElementById('send-btn').click();
-    } else {
-        console.error(`File path for entity '${entityName}' not found.`);
+async function renderMindMap(container, root) {
+    graphRoot = root;
+    const tree = document.createElement('ul');
+    tree.className = 'graph-tree';
+    container.innerHTML = '';
+    container.appendChild(tree);
+    try {
+        await loadGraphChildren(tree, '', 0);
+    } catch (error) {
+        console.error('Error loading mind map:', error);
+        container.textContent = 'The mind map could not be loaded.';
     }
 }
 
@@ -35,36 +104,9 @@ document.addEventListener('DOMContentLoaded', () => {
             const data = await response.json();
             appendMessage('miso', data.response);
 
-            if (data.entity_map) {
-                entityMap = data.entity_map;
-            }
-
-            if (data.visualization_data) {
-                const vizElement = document.createElement('div');
-                vizElement.className = 'mermaid';
-                vizElement.textContent = data.visualization_data;
-                mindmapContainer.innerHTML = '';
-                mindmapContainer.appendChild(vizElement);
-                await mermaid.run({ nodes: [vizElement] });
-
-                // --- Corrected Logic: Find nodes by their text content ---
-                setTimeout(() => {
-                    if (entityMap) {
-                        const textElements = mindmapContainer.querySelectorAll('text');
-                        textElements.forEach(textEl => {
-                            const entityName = textEl.textContent.trim();
-                            if (entityMap[entityName]) {
-                                const parentNode = textEl.closest('g');
-                                if (parentNode) {
-                                    parentNode.style.cursor = 'pointer';
-                                    parentNode.addEventListener('click', () => {
-                                        handleExplainClick(entityName);
-                                    });
-                                }
-                            }
-                        });
-                    }
-                }, 100); // A small delay to ensure rendering is complete
+            if (data.graph_root) {
+                // Only the top level is fetched now; each node's neighbourhood loads when it is opened.
+                await renderMindMap(mindmapContainer, data.graph_root);
             }
         } catch (error) {
             console.error('Error sending message:', error);
@@ -5,9 +5,11 @@ from agents.test_generation_agent import TestGenerationAgent
 import os
 import json
 
+GAUNTLET_STAGES = {"linter": "Linter", "security": "Security Scan", "complexity": "Complexity Check"}
+
 def run_colosseum_challenge(challenge, target_file, max_retries=3):
     """
-    Runs a full generate -> (lint -> security -> complexity) -> correct -> audit -> generate_tests -> run_tests cycle.
+    Runs a full generate -> (lint + security + complexity) -> correct -> audit -> generate_tests -> run_tests cycle.
     """
     print(f"--- COLOSSEUM CHALLENGE STARTED ---")
     print(f"Target: {target_file}\nChallenge: {challenge}")
@@ -31,23 +33,11 @@ def run_colosseum_challenge(challenge, target_file, max_retries=3):
 
         challenger_code = genesis_agent.generate_challenger_code(current_challenge, challenger_code)
         
-        # --- THE GAUNTLET: FULL SEQUENCE ---
-        linter_result = gauntlet.run_linter_check(challenger_code)
-        if not linter_result["passed"]:
-            print(f"\nAttempt #{attempt + 1} FAILED Linter. Retrying...")
-            failure_details = linter_result['details']
-            continue
-
-        security_result = gauntlet.run_security_check(challenger_code)
-        if not security_result["passed"]:
-            print(f"\nAttempt #{attempt + 1} FAILED Security Scan. Retrying...")
-            failure_details = security_result['details']
-            continue
-
-        complexity_result = gauntlet.run_complexity_check(challenger_code)
-        if not complexity_result["passed"]:
-            print(f"\nAttempt #{attempt + 1} FAILED Complexity Check. Retrying...")
-            failure_details = complexity_result['details']
+        # --- THE GAUNTLET: linter, security and complexity run concurrently ---
+        verdict = gauntlet.evaluate(challenger_code)
+        if not verdict["passed"]:
+            print(f"\nAttempt #{attempt + 1} FAILED {GAUNTLET_STAGES[verdict['failed_check']]}. Retrying...")
+            failure_details = verdict['details']
             continue
         
         print("\nChallenger code PASSED all quantitative checks. Proceeding to Auditor review.")
@@ -0,0 +1,357 @@
+import contextlib
+import io
+import logging
+import multiprocessing
+import os
+import runpy
+import secrets
+import stat
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+
+logger = logging.getLogger("AnalyzerDaemon")
+
+TOOLS = ("pylint", "bandit", "radon", "pytest")
+DEFAULT_PORT = 50551
+# After a failed connection, callers go straight to subprocess mode for this long.
+RETRY_AFTER_S = 30.0
+# pylint options that execute or import code named by the caller.
+UNSAFE_PYLINT_OPTIONS = ("--init-hook", "--load-plugins", "--rcfile")
+
+
+def _state_dir() -> str:
+    """Private per-user directory (0700) holding the daemon's key and, on POSIX, its socket."""
+    return os.environ.get("MISO_ANALYZER_DIR", os.path.join(os.path.expanduser("~"), ".miso", "analyzer"))
+
+
+def _address():
+    """The daemon's socket: MISO_ANALYZER_ADDRESS (host:port) if set, else a Unix socket in the state directory."""
+    configured = os.environ.get("MISO_ANALYZER_ADDRESS")
+    if configured:
+        host, _, port = configured.rpartition(":")
+        return host or "127.0.0.1", int(port)
+    if sys.platform == "win32":
+        return "127.0.0.1", DEFAULT_PORT
+    return os.path.join(_state_dir(), "analyzer.sock")
+
+
+def _is_private(path: str) -> bool:
+    """True if path belongs to this user and grants no access to group or others."""
+    if sys.platform == "win32":
+        return True
+    info = os.stat(path)
+    return info.st_uid == os.getuid() and not info.st_mode & (stat.S_IRWXG | stat.S_IRWXO)
+
+
+def _authkey(create: bool = False):
+    """
+    Returns the daemon's secret: MISO_ANALYZER_AUTHKEY if set, else a random key kept in a
+    0600 file in the private state directory, generated on first use when create is set.
+    Returns None when no private key is available; clients then use subprocesses.
+    """
+    configured = os.environ.get("MISO_ANALYZER_AUTHKEY")
+    if configured:
+        return configured.encode("utf-8")
+    directory = _state_dir()
+    key_path = os.path.join(directory, "authkey")
+    try:
+        if create:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+            if not os.path.exists(key_path):
+                with contextlib.suppress(FileExistsError):
+                    fd = os.open(key_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+                    with os.fdopen(fd, "wb") as f:
+                        f.write(secrets.token_bytes(32))
+        if not (_is_private(directory) and _is_private(key_path)):
+            logger.error(f"Analyzer key {key_path} or its directory is accessible to other users; ignoring it.")
+            return None
+        with open(key_path, "rb") as f:
+            return f.read() or None
+    except OSError:
+        return None
+
+
+def _is_own_temp_dir(path: str) -> bool:
+    """True for an existing directory strictly inside the system temp directory that this user owns."""
+    temp_root = os.path.realpath(tempfile.gettempdir())
+    path = os.path.realpath(path)
+    if path == temp_root or os.path.commonpath([temp_root, path]) != temp_root or not os.path.isdir(path):
+        return False
+    return sys.platform == "win32" or os.stat(path).st_uid == os.getuid()
+
+
+def _check_request(tool: str, args: list, cwd: str):
+    """Returns why a run request is refused, or None. pytest imports conftest files and plugins from
+    its directory, so it only runs on test files inside a temp directory the caller created."""
+    if tool not in TOOLS:
+        return f"Unsupported tool: {tool}"
+    if not isinstance(args, list) or not all(isinstance(arg, str) for arg in args):
+        return "Arguments must be a list of strings."
+    if tool == "pylint" and any(arg.split("=", 1)[0] in UNSAFE_PYLINT_OPTIONS for arg in args):
+        return f"pylint options {', '.join(UNSAFE_PYLINT_OPTIONS)} are not accepted."
+    if tool == "pytest":
+        if not cwd or not _is_own_temp_dir(cwd):
+            return "pytest only runs in a temporary directory created by the caller."
+        root = os.path.realpath(cwd)
+        for arg in args:
+            target = os.path.realpath(os.path.join(root, arg))
+            if arg.startswith("-") or os.path.commonpath([root, target]) != root or not os.path.exists(target):
+                return "pytest arguments must be test paths inside its working directory."
+    return None
+
+
+# --- Worker side -------------------------------------------------------------
+
+def _preimport():
+    """Pool initializer: pays the tools' import cost once per worker instead of once per run."""
+    for module in ("pylint.lint", "bandit.cli.main", "radon.cli", "pytest"):
+        try:
+            __import__(module)
+        except ImportError:
+            pass
+
+
+class _Capture(io.StringIO):
+    """Output buffer standing in for a real stream: tools may read its name or close it (bandit does both)."""
+    def __init__(self, name):
+        super().__init__()
+        self.name = name
+
+    def close(self):
+        pass
+
+
+def _is_installed_module(module) -> bool:
+    path = getattr(module, "__file__", None) or ""
+    return not path or path.startswith((sys.prefix, sys.base_prefix)) or "site-packages" in path
+
+
+def _run_tool(tool: str, args: list, cwd: str = None) -> dict:
+    """Runs `python -m <tool> <args>` inside this worker and returns its exit code and captured output."""
+    if tool == "pylint":
+        with contextlib.suppress(ImportError):
+            from astroid import MANAGER
+            MANAGER.clear_cache()  # Files are re-linted after edits; never serve a stale AST.
+    saved_argv, saved_path, saved_cwd = sys.argv[:], sys.path[:], os.getcwd()
+    saved_modules = set(sys.modules)
+    saved_handlers = logging.root.handlers[:]
+    stdout, stderr = _Capture("<stdout>"), _Capture("<stderr>")
+    returncode = 0
+    try:
+        if cwd:
+            os.chdir(cwd)
+        sys.argv = [tool, *args]
+        sys.path.insert(0, os.getcwd())  # As `python -m` does.
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            try:
+                runpy.run_module(tool, run_name="__main__", alter_sys=True)
+            except SystemExit as exit_:
+                code = exit_.code
+                returncode = code if isinstance(code, int) else (0 if code is None else 1)
+                if code is not None and not isinstance(code, int):
+                    print(code, file=sys.stderr)
+            except Exception as e:
+                returncode = 1
+                print(f"{type(e).__name__}: {e}", file=sys.stderr)
+    finally:
+        sys.argv, sys.path[:] = saved_argv, saved_path
+        os.chdir(saved_cwd)
+        logging.root.handlers[:] = saved_handlers
+        # Forget modules the run imported from the analyzed code (e.g. test modules) so the next run re-imports them.
+        for name in set(sys.modules) - saved_modules:
+            if not _is_installed_module(sys.modules[name]):
+                del sys.modules[name]
+    return {"returncode": returncode, "stdout": stdout.getvalue(), "stderr": stderr.getvalue()}
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+# --- Server side -------------------------------------------------------------
+
+class AnalyzerDaemon:
+    """
+    Long-lived analyzer service: a pool of worker processes with pylint, bandit,
+    radon and pytest already imported, reachable over a local socket (a Unix
+    socket in a 0700 directory on POSIX) authenticated with a private per-user
+    key. A worker that hangs past its request timeout or fails a health check
+    gets the whole pool restarted; workers are also recycled every
+    max_tasks_per_worker runs to bound state leaking between analyses.
+    """
+    def __init__(self, address=None, workers=None, max_tasks_per_worker=200, health_interval=30.0):
+        self.authkey = _authkey(create=True)
+        if self.authkey is None:
+            raise RuntimeError(f"No private analyzer key is available in {_state_dir()}; refusing to start.")
+        self.address = address or _address()
+        self.workers = workers or os.cpu_count() or 2
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self.health_interval = health_interval
+        self._pool_lock = threading.Lock()
+        self._pool = None
+        self._stopping = threading.Event()
+        self.started = time.time()
+        self.served = 0
+        self.restarts = 0
+        self._start_pool()
+
+    def _start_pool(self):
+        # Spawned, not forked: the server is multithreaded and the pool re-creates workers from a helper thread.
+        context = multiprocessing.get_context("spawn")
+        with self._pool_lock:
+            old, self._pool = self._pool, context.Pool(
+                self.workers, initializer=_preimport, maxtasksperchild=self.max_tasks_per_worker
+            )
+        if old is not None:
+            old.terminate()
+        logger.info(f"Analyzer pool started with {self.workers} worker(s).")
+
+    def _restart_pool(self, reason: str):
+        logger.warning(f"Restarting analyzer pool: {reason}")
+        self.restarts += 1
+        self._start_pool()
+
+    def health_check(self, timeout: float = 10.0) -> bool:
+        try:
+            with self._pool_lock:
+                pool = self._pool
+            pool.apply_async(_ping).get(timeout=timeout)
+            return True
+        except Exception as e:
+            self._restart_pool(f"health check failed ({type(e).__name__}: {e})")
+            return False
+
+    def _status(self) -> dict:
+        return {"ok": self.health_check(), "pid": os.getpid(), "workers": self.workers,
+                "uptime_s": round(time.time() - self.started, 1), "served": self.served, "restarts": self.restarts}
+
+    def _handle(self, request: dict) -> dict:
+        op = request.get("op")
+        if op == "ping":
+            return self._status()
+        if op == "shutdown":
+            self._stopping.set()
+            threading.Thread(target=self._wake_listener, daemon=True).start()
+            return {"ok": True}
+        if op != "run":
+            return {"ok": False, "error": f"Unsupported request: {op}"}
+        refusal = _check_request(request.get("tool"), request.get("args", []), request.get("cwd"))
+        if refusal:
+            logger.warning(f"Refused analyzer request: {refusal}")
+            return {"ok": False, "error": refusal}
+        with self._pool_lock:
+            pool = self._pool
+        try:
+            result = pool.apply_async(_run_tool, (request["tool"], request.get("args", []), request.get("cwd"))) \
+                .get(timeout=request.get("timeout") or 300)
+        except multiprocessing.TimeoutError:
+            self._restart_pool(f"{request['tool']} run exceeded its timeout")
+            return {"ok": False, "error": "timeout"}
+        except Exception as e:
+            return {"ok": False, "error": f"{type(e).__name__}: {e}"}
+        self.served += 1
+        return {"ok": True, **result}
+
+    def _wake_listener(self):
+        """Unblocks accept() so serve_forever notices a shutdown."""
+        with contextlib.suppress(OSError):
+            Client(self.address, authkey=self.authkey).close()
+
+    def _serve_connection(self, conn):
+        with conn:
+            while not self._stopping.is_set():
+                try:
+                    request = conn.recv()
+                except (EOFError, OSError):
+                    return
+                conn.send(self._handle(request))
+
+    def _health_loop(self):
+        while not self._stopping.wait(self.health_interval):
+            self.health_check()
+
+    def serve_forever(self):
+        threading.Thread(target=self._health_loop, daemon=True).start()
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.remove(self.address)  # Left behind by a daemon that did not shut down cleanly.
+        with Listener(self.address, authkey=self.authkey) as listener:
+            logger.info(f"Analyzer daemon listening on {self.address}.")
+            while not self._stopping.is_set():
+                try:
+                    conn = listener.accept()
+                except (OSError, multiprocessing.AuthenticationError) as e:
+                    logger.warning(f"Rejected analyzer connection: {e}")
+                    continue
+                threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+        with self._pool_lock:
+            self._pool.terminate()
+        logger.info("Analyzer daemon stopped.")
+
+
+# --- Client side -------------------------------------------------------------
+
+_unavailable_until = 0.0
+_state_lock = threading.Lock()
+
+
+def _request(message: dict, timeout: float = None) -> dict:
+    authkey = _authkey()
+    if authkey is None:
+        raise ConnectionRefusedError("No private analyzer key; the daemon has not been started by this user.")
+    with Client(_address(), authkey=authkey) as conn:
+        conn.send(message)
+        if timeout and not conn.poll(timeout):
+            raise TimeoutError("Analyzer daemon did not answer in time.")
+        return conn.recv()
+
+
+def daemon_status() -> dict:
+    """Health check: the daemon's status, or {"ok": False, "error"} if it cannot be reached."""
+    try:
+        return _request({"op": "ping"}, timeout=15)
+    except Exception as e:
+        return {"ok": False, "error": f"{type(e).__name__}: {e}"}
+
+
+def run_analyzer(tool: str, args: list, cwd: str = None, timeout: float = 300) -> subprocess.CompletedProcess:
+    """
+    Runs `python -m <tool> <args>` through the warm analyzer daemon, falling back to a
+    fresh subprocess when the daemon is disabled (MISO_ANALYZER_DAEMON=off), not running
+    or fails the request. Either way the caller gets a CompletedProcess, or
+    subprocess.TimeoutExpired after timeout seconds.
+    """
+    global _unavailable_until
+    command = [sys.executable, "-m", tool, *args]
+    if os.environ.get("MISO_ANALYZER_DAEMON", "on").lower() != "off" and time.monotonic() >= _unavailable_until:
+        try:
+            reply = _request({"op": "run", "tool": tool, "args": list(args), "cwd": cwd, "timeout": timeout},
+                             timeout=timeout + 5)
+            if reply.get("ok"):
+                return subprocess.CompletedProcess(command, reply["returncode"], reply["stdout"], reply["stderr"])
+            if reply.get("error") == "timeout":
+                raise subprocess.TimeoutExpired(command, timeout)  # A subprocess would hang just the same.
+            logger.warning(f"Analyzer daemon could not run {tool} ({reply.get('error')}). Using a subprocess.")
+        except (OSError, EOFError, TimeoutError, multiprocessing.AuthenticationError) as e:
+            with _state_lock:
+                _unavailable_until = time.monotonic() + RETRY_AFTER_S
+            logger.info(f"Analyzer daemon unavailable ({type(e).__name__}). Using subprocesses for {RETRY_AFTER_S:.0f}s.")
+    return subprocess.run(command, capture_output=True, text=True, check=False, cwd=cwd, timeout=timeout)
+
+
+if __name__ == "__main__":
+    import argparse
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="MISO warm analyzer daemon (pylint, bandit, radon, pytest).")
+    parser.add_argument("command", choices=["serve", "status", "stop"])
+    parser.add_argument("--workers", type=int, default=None)
+    options = parser.parse_args()
+    if options.command == "serve":
+        AnalyzerDaemon(workers=options.workers).serve_forever()
+    elif options.command == "status":
+        print(daemon_status())
+    else:
+        print(_request({"op": "shutdown"}, timeout=15))
@@ -0,0 +1,104 @@
+import heapq
+import os
+import re
+
+from .context_selector import estimate_tokens
+
+SOURCE_EXTENSIONS = ('.py', '.html', '.js')
+EXCLUDED_DIRS = ['venv', '__pycache__', 'node_modules']
+# Python chunks start at a module-level or method-level decorator, def or class.
+PYTHON_BOUNDARY = re.compile(r"^ {0,4}(?:@|(?:async\s+)?def\s|class\s)")
+DECORATOR = re.compile(r"^\s*@")
+
+# (weight, pattern) for code an attacker would look at first.
+ATTACK_SURFACE_PATTERNS = [
+    (6.0, re.compile(r"@\w+\.(?:route|get|post|put|patch|delete|websocket)\(|add_url_rule|APIRouter|Blueprint\(")),
+    (4.0, re.compile(r"\brequest\.(?:args|form|json|files|values|cookies|headers|get_json|data)\b")),
+    (5.0, re.compile(r"login|logout|passw|token|session|jwt|auth|permission|is_admin|current_user|csrf|role", re.I)),
+    (5.0, re.compile(r"\.execute(?:many|script)?\(|cursor\(|\.raw\(|\btext\(|\b(?:SELECT|INSERT|UPDATE|DELETE)\s", re.I)),
+    (6.0, re.compile(r"\bsubprocess\b|os\.system|os\.popen|shell\s*=\s*True|\beval\(|\bexec\(")),
+    (6.0, re.compile(r"\bpickle\b|\bmarshal\b|\bshelve\b|yaml\.load\(|jsonpickle")),
+    (3.0, re.compile(r"\bopen\(|send_file|send_from_directory|os\.path\.join|\bupload", re.I)),
+    (4.0, re.compile(r"render_template_string|Markup\(|\|\s*safe\b|innerHTML|dangerouslySetInnerHTML|document\.write")),
+    (3.0, re.compile(r"SECRET_KEY|API_KEY|debug\s*=\s*True|verify\s*=\s*False|CORS\(")),
+]
+
+
+def iter_source_chunks(project_path: str, max_lines: int = 60):
+    """
+    Streams (relative_path, first_line, text) chunks of every source file under
+    project_path. Python files are cut at function and class boundaries, other
+    files (and oversized definitions) into windows of at most max_lines lines.
+    """
+    for root, dirs, files in os.walk(project_path):
+        dirs[:] = sorted(d for d in dirs if not d.startswith('.') and d not in EXCLUDED_DIRS)
+        for file in sorted(files):
+            if not file.endswith(SOURCE_EXTENSIONS):
+                continue
+            path = os.path.join(root, file)
+            rel_path = os.path.relpath(path, project_path)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    lines, first = [], 1
+                    for number, line in enumerate(f, start=1):
+                        at_boundary = file.endswith('.py') and PYTHON_BOUNDARY.match(line) \
+                            and not (lines and DECORATOR.match(lines[-1]))
+                        if lines and (at_boundary or len(lines) >= max_lines):
+                            yield rel_path, first, "".join(lines)
+                            lines, first = [], number
+                        lines.append(line)
+                    if lines:
+                        yield rel_path, first, "".join(lines)
+            except (OSError, UnicodeDecodeError):
+                continue
+
+
+def score_chunk(rel_path: str, text: str) -> float:
+    """Attack-surface relevance of a chunk: weighted pattern hits (capped per pattern), discounted for tests."""
+    score = sum(weight * min(3, len(pattern.findall(text))) for weight, pattern in ATTACK_SURFACE_PATTERNS)
+    name = os.path.basename(rel_path)
+    if name.startswith('test_') or name.endswith('_test.py') or '/tests/' in f"/{rel_path.replace(os.sep, '/')}":
+        score *= 0.3
+    return score
+
+
+def format_chunk(rel_path: str, first: int, text: str) -> str:
+    last = first + text.count("\n") - (1 if text.endswith("\n") else 0)
+    return f"--- FILE: {rel_path} (lines {first}-{last}) ---\n{text}\n"
+
+
+def select_attack_surface(project_path: str, token_budget: int = 2000, max_lines: int = 60) -> tuple:
+    """
+    Streams the project's chunks, keeps only the highest-scoring ones needed to fill
+    token_budget (a bounded heap, so memory stays flat on large projects), and packs
+    them in file order. Returns (codebase_text, usage).
+    """
+    heap, held_tokens, seen, files = [], 0, 0, set()
+    for order, (rel_path, first, text) in enumerate(iter_source_chunks(project_path, max_lines)):
+        seen += 1
+        files.add(rel_path)
+        entry = format_chunk(rel_path, first, text)
+        cost = estimate_tokens(entry)
+        if cost > token_budget:
+            continue
+        # Earlier chunks win ties (-order), so file headers beat identical boilerplate further down.
+        heapq.heappush(heap, (score_chunk(rel_path, text), -order, cost, rel_path, first, entry))
+        held_tokens += cost
+        while heap and held_tokens - heap[0][2] >= token_budget:
+            held_tokens -= heapq.heappop(heap)[2]
+
+    selected, used = [], 0
+    for score, _, cost, rel_path, first, entry in sorted(heap, reverse=True):
+        if used + cost <= token_budget:
+            selected.append((rel_path, first, score, entry))
+            used += cost
+    selected.sort()
+    usage = {
+        "budget_tokens": token_budget,
+        "used_tokens": used,
+        "files_seen": len(files),
+        "chunks_seen": seen,
+        "included": [f"{rel_path}:{first}" for rel_path, first, _, _ in selected],
+        "top_score": max((score for _, _, score, _ in selected), default=0.0),
+    }
+    return "".join(entry for _, _, _, entry in selected), usage
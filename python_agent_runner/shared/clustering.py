@@ -0,0 +1,254 @@
+import logging
+import math
+
+import numpy as np
+
+logger = logging.getLogger("Clustering")
+
+# Upper bound on the elements of any temporary (rows x clusters) matrix, so
+# memory stays bounded no matter how many embeddings or clusters there are.
+MAX_BLOCK_ELEMENTS = 2 ** 24
+
+
+def _unit_rows(embeddings) -> np.ndarray:
+    """Returns the embeddings as L2-normalized float32 rows, so squared distances track cosine distance."""
+    X = np.asarray(embeddings, dtype=np.float32)
+    if X.ndim != 2:
+        raise ValueError(f"Expected a 2-D embedding matrix, got shape {X.shape}.")
+    norms = np.linalg.norm(X, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return X / norms
+
+
+def _block_size(n_columns: int) -> int:
+    return max(256, min(8192, MAX_BLOCK_ELEMENTS // max(1, n_columns)))
+
+
+def _compact(labels: np.ndarray) -> np.ndarray:
+    """Renumbers cluster labels to 0..k-1, keeping -1 (noise) as is."""
+    labels = np.asarray(labels, dtype=np.int64)
+    compacted = labels.copy()
+    clustered = labels != -1
+    if clustered.any():
+        _, compacted[clustered] = np.unique(labels[clustered], return_inverse=True)
+    return compacted
+
+
+def count_nodes(labels) -> int:
+    """Number of nodes the next tree level will have: one per cluster plus one per noise point."""
+    labels = np.asarray(labels)
+    return int(np.count_nonzero(labels == -1) + np.unique(labels[labels != -1]).size)
+
+
+def target_cluster_count(n: int, cluster_size: int) -> int:
+    """Number of clusters for n nodes; always fewer than n so every level shrinks."""
+    if n <= 1:
+        return n
+    return min(n - 1, max(1, math.ceil(n / max(2, cluster_size))))
+
+
+def pca_reduce(X: np.ndarray, n_components: int) -> np.ndarray:
+    """Projects X onto its top principal components, accumulating the covariance block by block."""
+    n, d = X.shape
+    n_components = max(1, min(n_components, d, n))
+    mean = X.mean(axis=0, dtype=np.float64).astype(np.float32)
+    block = _block_size(d)
+    cov = np.zeros((d, d), dtype=np.float64)
+    for start in range(0, n, block):
+        centered = X[start:start + block] - mean
+        cov += centered.T @ centered
+    _, eigvecs = np.linalg.eigh(cov)
+    components = np.ascontiguousarray(eigvecs[:, ::-1][:, :n_components], dtype=np.float32)
+    reduced = np.empty((n, n_components), dtype=np.float32)
+    for start in range(0, n, block):
+        reduced[start:start + block] = (X[start:start + block] - mean) @ components
+    return reduced
+
+
+def _assign(X: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Labels every row of X with its nearest centroid, in blocks."""
+    labels = np.empty(len(X), dtype=np.int64)
+    centroid_sq = np.einsum("ij,ij->i", centroids, centroids)
+    block = _block_size(len(centroids))
+    for start in range(0, len(X), block):
+        distances = centroid_sq - 2.0 * (X[start:start + block] @ centroids.T)
+        labels[start:start + block] = distances.argmin(axis=1)
+    return labels
+
+
+def _kmeans_plus_plus(X: np.ndarray, n_clusters: int, rng: np.random.Generator) -> np.ndarray:
+    """k-means++ seeding on a sample of X."""
+    sample_size = min(len(X), max(10 * n_clusters, 1000))
+    sample = X[rng.choice(len(X), size=sample_size, replace=False)]
+    centroids = np.empty((n_clusters, X.shape[1]), dtype=np.float32)
+    centroids[0] = sample[rng.integers(sample_size)]
+    closest = ((sample - centroids[0]) ** 2).sum(axis=1)
+    for i in range(1, n_clusters):
+        total = closest.sum()
+        index = rng.choice(sample_size, p=closest / total) if total > 0 else rng.integers(sample_size)
+        centroids[i] = sample[index]
+        np.minimum(closest, ((sample - centroids[i]) ** 2).sum(axis=1), out=closest)
+    return centroids
+
+
+def _minibatch_kmeans(X: np.ndarray, n_clusters: int, rng: np.random.Generator,
+                      batch_size: int = 1024, n_epochs: int = 5) -> np.ndarray:
+    """Mini-batch k-means (Sculley, 2010). Returns the centroids."""
+    n = len(X)
+    centroids = _kmeans_plus_plus(X, n_clusters, rng)
+    counts = np.zeros(n_clusters, dtype=np.float32)
+    batch_size = min(n, max(batch_size, 2 * n_clusters))
+    for _ in range(max(1, math.ceil(n_epochs * n / batch_size))):
+        batch = X[rng.integers(n, size=batch_size)]
+        labels = _assign(batch, centroids)
+        batch_counts = np.bincount(labels, minlength=n_clusters).astype(np.float32)
+        batch_sums = np.zeros_like(centroids)
+        np.add.at(batch_sums, labels, batch)
+        counts += batch_counts
+        touched = batch_counts > 0
+        centroids[touched] += (batch_sums[touched] - batch_counts[touched, None] * centroids[touched]) / counts[touched, None]
+    return centroids
+
+
+def kmeans_labels(X: np.ndarray, n_clusters: int, seed: int = 0, n_components: int = 32, **options) -> np.ndarray:
+    """Mini-batch k-means on PCA-reduced embeddings."""
+    reduced = pca_reduce(X, n_components)
+    rng = np.random.default_rng(seed)
+    centroids = _minibatch_kmeans(reduced, n_clusters, rng, **options)
+    return _assign(reduced, centroids)
+
+
+def gmm_labels(X: np.ndarray, n_clusters: int, seed: int = 0, n_components: int = 10,
+               max_iter: int = 10, tol: float = 1e-3, reg_covar: float = 1e-4) -> np.ndarray:
+    """
+    Diagonal-covariance Gaussian mixture on PCA-reduced embeddings, as in RAPTOR.
+    EM accumulates its sufficient statistics block by block; each node is assigned
+    to the component with the highest responsibility.
+    """
+    Z = pca_reduce(X, n_components).astype(np.float64)
+    n, d = Z.shape
+    rng = np.random.default_rng(seed)
+    means = _minibatch_kmeans(Z.astype(np.float32), n_clusters, rng).astype(np.float64)
+    variances = np.full((n_clusters, d), Z.var(axis=0).mean() / n_clusters + reg_covar)
+    log_weights = np.full(n_clusters, -math.log(n_clusters))
+    block = _block_size(n_clusters)
+
+    def log_responsibilities(rows):
+        precisions = 1.0 / variances
+        log_prob = -0.5 * (
+            (rows ** 2) @ precisions.T
+            - 2.0 * rows @ (means * precisions).T
+            + ((means ** 2) * precisions).sum(axis=1)
+            + np.log(variances).sum(axis=1)
+            + d * math.log(2 * math.pi)
+        ) + log_weights
+        peak = log_prob.max(axis=1, keepdims=True)
+        log_norm = peak + np.log(np.exp(log_prob - peak).sum(axis=1, keepdims=True))
+        return log_prob - log_norm, log_norm
+
+    previous = -np.inf
+    for iteration in range(max_iter):
+        weights = np.zeros(n_clusters)
+        sums = np.zeros((n_clusters, d))
+        squares = np.zeros((n_clusters, d))
+        log_likelihood = 0.0
+        for start in range(0, n, block):
+            rows = Z[start:start + block]
+            log_resp, log_norm = log_responsibilities(rows)
+            resp = np.exp(log_resp)
+            weights += resp.sum(axis=0)
+            sums += resp.T @ rows
+            squares += resp.T @ (rows ** 2)
+            log_likelihood += log_norm.sum()
+        alive = weights > 1e-8
+        means[alive] = sums[alive] / weights[alive, None]
+        variances[alive] = np.maximum(squares[alive] / weights[alive, None] - means[alive] ** 2, 0.0) + reg_covar
+        log_weights = np.log(np.maximum(weights, 1e-12) / n)
+        log_likelihood /= n
+        if log_likelihood - previous < tol:
+            logger.debug(f"GMM converged after {iteration + 1} iterations.")
+            break
+        previous = log_likelihood
+
+    labels = np.empty(n, dtype=np.int64)
+    for start in range(0, n, block):
+        labels[start:start + block] = log_responsibilities(Z[start:start + block])[0].argmax(axis=1)
+    return labels
+
+
+def neighbour_labels(X: np.ndarray, n_clusters: int, seed: int = 0, n_components: int = 16) -> np.ndarray:
+    """
+    Approximate-neighbour grouping: nodes are ordered by random-hyperplane (LSH)
+    bucket, then by their first principal component, and consecutive runs of
+    equal size become clusters. O(n log n) with no pairwise distances at all.
+    """
+    n = len(X)
+    rng = np.random.default_rng(seed)
+    n_bits = min(62, max(1, math.ceil(math.log2(max(2, n_clusters)))))
+    reduced = pca_reduce(X, n_components)
+    planes = rng.standard_normal((reduced.shape[1], n_bits)).astype(np.float32)
+    bits = (reduced @ planes) > 0
+    codes = bits.astype(np.int64) @ (np.int64(1) << np.arange(n_bits, dtype=np.int64))
+    order = np.lexsort((reduced[:, 0], codes))
+    labels = np.empty(n, dtype=np.int64)
+    for label, members in enumerate(np.array_split(order, n_clusters)):
+        labels[members] = label
+    return labels
+
+
+def dbscan_labels(X: np.ndarray, n_clusters: int = None, seed: int = 0, eps: float = 0.5, min_samples: int = 2) -> np.ndarray:
+    """The original clustering: cosine DBSCAN over the full embedding matrix. Noise is labelled -1."""
+    from sklearn.cluster import DBSCAN
+    return DBSCAN(eps=eps, min_samples=min_samples, metric='cosine').fit(X).labels_
+
+
+CLUSTERING_METHODS = {
+    "gmm": gmm_labels,
+    "kmeans": kmeans_labels,
+    "neighbours": neighbour_labels,
+    "dbscan": dbscan_labels,
+}
+
+
+def _split_oversized(X: np.ndarray, labels: np.ndarray, max_cluster_size: int) -> np.ndarray:
+    """Splits clusters larger than max_cluster_size into even runs along their widest direction."""
+    labels = labels.copy()
+    next_label = labels.max() + 1
+    for label in np.unique(labels[labels != -1]):
+        members = np.flatnonzero(labels == label)
+        if len(members) <= max_cluster_size:
+            continue
+        points = X[members]
+        centered = points - points.mean(axis=0)
+        direction = centered[np.einsum("ij,ij->i", centered, centered).argmax()]
+        ordered = members[np.argsort(centered @ direction)]
+        for part in np.array_split(ordered, math.ceil(len(members) / max_cluster_size))[1:]:
+            labels[part] = next_label
+            next_label += 1
+    return labels
+
+
+def cluster_embeddings(embeddings, method: str = "gmm", cluster_size: int = 6, max_cluster_size: int = None,
+                       seed: int = 0, **options) -> np.ndarray:
+    """
+    Clusters one RAPTOR level and returns a label per node (-1 = noise, DBSCAN only).
+
+    Every method is asked for fewer clusters than there are nodes, and if the
+    result still would not shrink the level (DBSCAN marking everything as
+    noise) it falls back to k-means, so each level is strictly smaller than the
+    one below it. Clusters above max_cluster_size (default 3 * cluster_size)
+    are split so no summary prompt grows without bound.
+    """
+    if method not in CLUSTERING_METHODS:
+        raise ValueError(f"Unknown clustering method '{method}'. Expected one of {sorted(CLUSTERING_METHODS)}.")
+    X = _unit_rows(embeddings)
+    n = len(X)
+    if n <= 2:
+        return np.zeros(n, dtype=np.int64)
+    n_clusters = target_cluster_count(n, cluster_size)
+    labels = np.asarray(CLUSTERING_METHODS[method](X, n_clusters, seed=seed, **options), dtype=np.int64)
+    if count_nodes(labels) >= n:
+        logger.warning(f"'{method}' clustering did not reduce {n} nodes. Falling back to k-means.")
+        labels = kmeans_labels(X, n_clusters, seed=seed)
+    labels = _split_oversized(X, labels, max(2, max_cluster_size or 3 * cluster_size))
+    return _compact(labels)
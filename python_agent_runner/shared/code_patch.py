@@ -0,0 +1,92 @@
+import re
+
+# A replacement block in the LLM's answer: "EDIT <first>-<last>", the new lines, "END".
+EDIT_BLOCK = re.compile(r"^EDIT (\d+)-(\d+)[ \t]*\n(.*?)^END[ \t]*$", re.MULTILINE | re.DOTALL)
+NUMBERED_LINE = re.compile(r"^\s*\d+\| ?")
+IMPORT_LINE = re.compile(r"^(?:import|from)\s")
+
+
+class PatchError(ValueError):
+    """Raised when an LLM's line edits cannot be applied safely."""
+
+
+def _import_header_end(lines: list, limit: int = 40) -> int:
+    """Returns the 1-based last line of the module's leading import block (0 if it has none)."""
+    end = 0
+    for number, line in enumerate(lines[:limit], start=1):
+        if IMPORT_LINE.match(line):
+            end = number
+    return end
+
+
+def error_windows(code: str, line_numbers: list, context: int = 8) -> list:
+    """
+    Returns merged (first, last) 1-based line ranges covering every error line with
+    context lines on each side, plus the import header so missing imports can be added.
+    """
+    lines = code.splitlines()
+    ranges = [(max(1, n - context), min(len(lines), n + context)) for n in line_numbers if 1 <= n <= len(lines)]
+    header_end = _import_header_end(lines)
+    if header_end:
+        ranges.append((1, header_end))
+    merged = []
+    for first, last in sorted(ranges):
+        if merged and first <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], last))
+        else:
+            merged.append((first, last))
+    return merged
+
+
+def format_windows(code: str, windows: list) -> str:
+    """Renders the windows with line numbers, "..." marking the lines left out."""
+    lines = code.splitlines()
+    parts = []
+    for first, last in windows:
+        if first > 1:
+            parts.append("...")
+        parts.extend(f"{n:>5}| {lines[n - 1]}" for n in range(first, last + 1))
+    if windows and windows[-1][1] < len(lines):
+        parts.append("...")
+    return "\n".join(parts)
+
+
+def parse_line_edits(text: str) -> list:
+    """Parses EDIT blocks into (first, last, replacement_lines) tuples. Raises PatchError if there are none."""
+    edits = []
+    for match in EDIT_BLOCK.finditer(text):
+        first, last = int(match.group(1)), int(match.group(2))
+        replacement = match.group(3).splitlines()
+        # Models sometimes echo the line-number gutter back; strip it when every line has one.
+        if replacement and all(NUMBERED_LINE.match(line) for line in replacement):
+            replacement = [NUMBERED_LINE.sub("", line, count=1) for line in replacement]
+        edits.append((first, last, replacement))
+    if not edits:
+        raise PatchError("No EDIT blocks found in the response.")
+    return edits
+
+
+def apply_line_edits(code: str, edits: list, windows: list = None) -> tuple:
+    """
+    Applies line-range edits to code. Edits must not overlap and, when windows are
+    given, must stay inside the lines the model was shown. Returns (new_code,
+    touched) where touched lists the (first, last) range of each edit in new_code.
+    """
+    lines = code.splitlines()
+    ordered = sorted(edits)
+    for i, (first, last, _) in enumerate(ordered):
+        if not 1 <= first <= last <= len(lines):
+            raise PatchError(f"Edit {first}-{last} is outside the file (1-{len(lines)}).")
+        if i and first <= ordered[i - 1][1]:
+            raise PatchError(f"Edit {first}-{last} overlaps edit {ordered[i - 1][0]}-{ordered[i - 1][1]}.")
+        if windows is not None and not any(w_first <= first and last <= w_last for w_first, w_last in windows):
+            raise PatchError(f"Edit {first}-{last} touches lines that were not shown.")
+
+    touched, shift = [], 0
+    for first, last, replacement in ordered:
+        touched.append((first + shift, first + shift + max(len(replacement), 1) - 1))
+        shift += len(replacement) - (last - first + 1)
+    for first, last, replacement in reversed(ordered):
+        lines[first - 1:last] = replacement
+    new_code = "\n".join(lines) + ("\n" if code.endswith("\n") else "")
+    return new_code, touched
@@ -0,0 +1,80 @@
+import os
+import re
+
+from .file_scheduler import reference_patterns
+
+# Rough characters-per-token ratio for code with the llama3 tokenizer.
+CHARS_PER_TOKEN = 4
+IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_]{2,}")
+SUMMARY_NAME = re.compile(r"(?:def|class)\s+([A-Za-z_][A-Za-z0-9_]*)")
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate used for prompt budgeting."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def format_context_entry(path: str, summary: str) -> str:
+    return f"--- File: {path} ---\n{summary}\n"
+
+
+def _path_proximity(path_a: str, path_b: str) -> float:
+    """1.0 for files in the same directory, decreasing with every directory level apart."""
+    dirs_a = os.path.dirname(path_a.replace("\\", "/")).split("/")
+    dirs_b = os.path.dirname(path_b.replace("\\", "/")).split("/")
+    common = 0
+    for a, b in zip(dirs_a, dirs_b):
+        if a != b:
+            break
+        common += 1
+    distance = (len(dirs_a) - common) + (len(dirs_b) - common)
+    return 1.0 / (1 + distance)
+
+
+def score_context_entry(file_path: str, file_description: str, candidate_path: str, summary: str, related_paths=()) -> float:
+    """
+    Scores how relevant an existing file's summary is to the file being generated:
+    declared plan relationships weigh most, then explicit references to the file in
+    the description, then names its summary defines that the description uses, then
+    path proximity.
+    """
+    score = 0.0
+    if candidate_path in related_paths:
+        score += 10.0
+    if any(p.search(file_description) for p in reference_patterns(candidate_path)):
+        score += 6.0
+    description_words = set(IDENTIFIER.findall(file_description.lower()))
+    defined_names = {name.lower() for name in SUMMARY_NAME.findall(summary)}
+    score += min(3.0, 1.0 * len(description_words & defined_names))
+    score += 2.0 * _path_proximity(file_path, candidate_path)
+    return score
+
+
+def select_context(file_path: str, file_description: str, project_context: dict, token_budget: int, related_paths=()) -> tuple:
+    """
+    Ranks the summaries in project_context by relevance to file_path and greedily
+    packs the best ones under token_budget. Returns (selected_context, usage) where
+    usage reports the budget, tokens used and which files were included or dropped.
+    """
+    related_paths = set(related_paths or ())
+    ranked = sorted(
+        project_context.items(),
+        key=lambda item: score_context_entry(file_path, file_description, item[0], item[1], related_paths),
+        reverse=True,
+    )
+    selected, dropped, used = {}, [], 0
+    for path, summary in ranked:
+        cost = estimate_tokens(format_context_entry(path, summary))
+        if used + cost <= token_budget:
+            selected[path] = summary
+            used += cost
+        else:
+            dropped.append(path)
+    usage = {
+        "budget_tokens": token_budget,
+        "used_tokens": used,
+        "available_files": len(project_context),
+        "included": list(selected),
+        "dropped": dropped,
+    }
+    return selected, usage
@@ -0,0 +1,279 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+logger = logging.getLogger("EmbeddingCache")
+
+# SQLite limits the number of host parameters per statement.
+_SQL_BATCH = 500
+
+
+def _text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _batches(items: list, size: int = _SQL_BATCH):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class EmbeddingCache:
+    """
+    Persistent embedding store shared by every process on the host.
+
+    Vectors live in one fixed-capacity float32 file per model that is
+    memory-mapped, so lookups read straight from the page cache with no
+    serialization. A SQLite index maps (model, text hash) to a row ("slot") of
+    that file and tracks last access for LRU eviction once a model's file is
+    full. A slot is only published (ready=1) after its vector is written and
+    readers re-check the index after copying, so an eviction racing with a
+    read in another process is seen as a miss instead of a wrong vector.
+    """
+    def __init__(self, directory: str, max_entries: int = 100_000):
+        self.directory = directory
+        self.max_entries = max_entries
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(directory, "index.sqlite3"), timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS models (
+                model TEXT PRIMARY KEY,
+                dim INTEGER NOT NULL,
+                capacity INTEGER NOT NULL,
+                next_slot INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS entries (
+                model TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                slot INTEGER NOT NULL,
+                ready INTEGER NOT NULL DEFAULT 0,
+                last_access REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (model, text_hash)
+            );
+            CREATE INDEX IF NOT EXISTS idx_entries_lru ON entries(model, last_access);
+        """)
+        self._conn.commit()
+        self._arrays = {}
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        logger.info(f"Embedding cache opened at {directory}.")
+
+    def _vector_path(self, model: str) -> str:
+        return os.path.join(self.directory, re.sub(r"[^A-Za-z0-9_.-]", "_", model) + ".f32")
+
+    def _vectors(self, model: str, dim: int = None):
+        """Returns the memory-mapped (capacity, dim) array for a model, creating it when dim is given."""
+        array = self._arrays.get(model)
+        if array is not None:
+            return array
+        row = self._conn.execute("SELECT dim, capacity FROM models WHERE model = ?", (model,)).fetchone()
+        if row is None:
+            if dim is None:
+                return None
+            self._conn.execute(
+                "INSERT OR IGNORE INTO models (model, dim, capacity) VALUES (?, ?, ?)", (model, dim, self.max_entries)
+            )
+            self._conn.commit()
+            row = self._conn.execute("SELECT dim, capacity FROM models WHERE model = ?", (model,)).fetchone()
+        model_dim, capacity = row
+        path = self._vector_path(model)
+        size = capacity * model_dim * 4
+        with open(path, "ab") as f:
+            if f.tell() < size:
+                f.truncate(size)  # Sparse on most filesystems; blocks are allocated as slots fill.
+        array = np.memmap(path, dtype=np.float32, mode="r+", shape=(capacity, model_dim))
+        self._arrays[model] = array
+        return array
+
+    def _ready_slots(self, model: str, hashes: list) -> dict:
+        slots = {}
+        for batch in _batches(hashes):
+            placeholders = ",".join("?" * len(batch))
+            slots.update(self._conn.execute(
+                f"SELECT text_hash, slot FROM entries WHERE model = ? AND ready = 1 AND text_hash IN ({placeholders})",
+                (model, *batch),
+            ).fetchall())
+        return slots
+
+    def get_many(self, model: str, texts: list) -> list:
+        """Returns a float32 vector (a private copy) per text, or None for texts that are not cached."""
+        hashes = [_text_hash(text) for text in texts]
+        with self._lock:
+            array = self._vectors(model)
+            if array is None:
+                self.misses += len(texts)
+                return [None] * len(texts)
+            found = self._ready_slots(model, list(set(hashes)))
+            keys = list(found)
+            copies = np.array(array[[found[key] for key in keys]]) if keys else None
+            still_valid = self._ready_slots(model, keys)
+            vectors = {key: copies[i] for i, key in enumerate(keys) if still_valid.get(key) == found[key]}
+            if vectors:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE entries SET last_access = ?, hits = hits + 1 WHERE model = ? AND text_hash = ?",
+                    [(now, model, key) for key in vectors],
+                )
+                self._conn.commit()
+            results = [vectors.get(key) for key in hashes]
+            hit_count = sum(vector is not None for vector in results)
+            self.hits += hit_count
+            self.misses += len(results) - hit_count
+        return results
+
+    def put_many(self, model: str, texts: list, vectors):
+        """Stores vectors for texts, evicting the least recently used entries of the model when it is full."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if len(texts) == 0:
+            return
+        if vectors.ndim != 2 or len(vectors) != len(texts):
+            raise ValueError(f"Expected {len(texts)} vectors, got an array of shape {vectors.shape}.")
+        pending = {_text_hash(text): vector for text, vector in zip(texts, vectors)}
+        with self._lock:
+            array = self._vectors(model, vectors.shape[1])
+            if array.shape[1] != vectors.shape[1]:
+                raise ValueError(f"Cached '{model}' vectors have {array.shape[1]} dimensions, got {vectors.shape[1]}.")
+            capacity = array.shape[0]
+            now = time.time()
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                existing = {}
+                for batch in _batches(list(pending)):
+                    placeholders = ",".join("?" * len(batch))
+                    existing.update((key, (slot, ready)) for key, slot, ready in self._conn.execute(
+                        f"SELECT text_hash, slot, ready FROM entries WHERE model = ? AND text_hash IN ({placeholders})",
+                        (model, *batch),
+                    ))
+                # Unpublished rows were left by a writer that died (or is still writing the same vector): reuse them.
+                unpublished = [(key, slot) for key, (slot, ready) in existing.items() if not ready]
+                new_keys = [key for key in pending if key not in existing][-capacity:]
+                next_slot = self._conn.execute("SELECT next_slot FROM models WHERE model = ?", (model,)).fetchone()[0]
+                fresh = min(len(new_keys), capacity - next_slot)
+                slots = list(range(next_slot, next_slot + fresh))
+                if fresh < len(new_keys):
+                    victims = self._conn.execute(
+                        "SELECT text_hash, slot FROM entries WHERE model = ? AND ready = 1 ORDER BY last_access ASC LIMIT ?",
+                        (model, len(new_keys) - fresh),
+                    ).fetchall()
+                    self._conn.executemany(
+                        "DELETE FROM entries WHERE model = ? AND text_hash = ?", [(model, key) for key, _ in victims]
+                    )
+                    slots.extend(slot for _, slot in victims)
+                    self.evictions += len(victims)
+                new_keys = new_keys[:len(slots)]
+                self._conn.executemany(
+                    "INSERT INTO entries (model, text_hash, slot, ready, last_access) VALUES (?, ?, ?, 0, ?)",
+                    [(model, key, slot, now) for key, slot in zip(new_keys, slots)],
+                )
+                self._conn.execute("UPDATE models SET next_slot = ? WHERE model = ?", (next_slot + fresh, model))
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+            new_keys = new_keys + [key for key, _ in unpublished]
+            slots = slots + [slot for _, slot in unpublished]
+            if not new_keys:
+                return
+            array[slots] = np.stack([pending[key] for key in new_keys])
+            array.flush()
+            self._conn.executemany(
+                "UPDATE entries SET ready = 1 WHERE model = ? AND text_hash = ? AND slot = ?",
+                [(model, key, slot) for key, slot in zip(new_keys, slots)],
+            )
+            self._conn.commit()
+            self.stores += len(new_keys)
+
+    def embed(self, llm_client, model: str, texts: list, batch_size: int = 64) -> np.ndarray:
+        """
+        Returns a (len(texts), dim) float32 matrix, embedding only the texts that
+        are not cached yet (in batches through llm_client.embed) and storing them.
+        """
+        vectors = self.get_many(model, texts)
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+        computed = {}
+        for batch in _batches(missing, batch_size):
+            response = llm_client.embed(model=model, input=batch)
+            embedded = np.asarray(response["embeddings"], dtype=np.float32)
+            self.put_many(model, batch, embedded)
+            computed.update(zip(batch, embedded))
+        if missing:
+            logger.info(f"Embedding cache: {len(texts) - len(missing)}/{len(texts)} '{model}' vectors served from cache.")
+        vectors = [vector if vector is not None else computed[text] for text, vector in zip(texts, vectors)]
+        return np.stack(vectors) if vectors else np.zeros((0, 0), dtype=np.float32)
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.execute("UPDATE models SET next_slot = 0")
+            self._conn.commit()
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            models = {
+                model: {"dim": dim, "capacity": capacity, "entries": entries}
+                for model, dim, capacity, entries in self._conn.execute(
+                    "SELECT m.model, m.dim, m.capacity, COUNT(e.text_hash) FROM models m "
+                    "LEFT JOIN entries e ON e.model = m.model AND e.ready = 1 GROUP BY m.model"
+                )
+            }
+            lookups = self.hits + self.misses
+            return {
+                "path": self.directory,
+                "models": models,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "stores": self.stores,
+                "evictions": self.evictions,
+            }
+
+    def close(self):
+        with self._lock:
+            self._arrays.clear()
+            self._conn.close()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache():
+    """Returns the process-wide EmbeddingCache, or None when MISO_EMBED_CACHE=off."""
+    global _cache
+    if os.environ.get("MISO_EMBED_CACHE", "on").lower() == "off":
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = EmbeddingCache(
+                os.environ.get("MISO_EMBED_CACHE_DIR", ".miso_cache/embeddings"),
+                max_entries=int(os.environ.get("MISO_EMBED_CACHE_MAX_ENTRIES", 100_000)),
+            )
+        return _cache
+
+
+def embed_texts(llm_client, model: str, texts: list, batch_size: int = 64) -> np.ndarray:
+    """Embeds texts through the shared cache (or directly when it is disabled) as a float32 matrix."""
+    cache = get_embedding_cache()
+    if cache is not None:
+        return cache.embed(llm_client, model, texts, batch_size=batch_size)
+    vectors = []
+    for batch in _batches(list(texts), batch_size):
+        vectors.extend(llm_client.embed(model=model, input=batch)["embeddings"])
+    return np.asarray(vectors, dtype=np.float32)
+
+
+if __name__ == '__main__':
+    import sys
+    cache_dir = sys.argv[1] if len(sys.argv) > 1 else os.environ.get("MISO_EMBED_CACHE_DIR", ".miso_cache/embeddings")
+    print(json.dumps(EmbeddingCache(cache_dir).get_stats(), indent=2))
@@ -0,0 +1,209 @@
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import subprocess
+import sys
+
+if sys.platform == "win32":
+    import msvcrt
+else:
+    import fcntl
+
+logger = logging.getLogger("EnvironmentCache")
+
+MARKER_NAME = ".miso_env.json"
+REQUIREMENT_NAME = re.compile(r"^([A-Za-z0-9][A-Za-z0-9._-]*)(.*)$")
+# Options whose argument is a file or directory, resolved against wherever pip is run.
+FILE_OPTION = re.compile(r"^(?:-e|--editable|-r|--requirement|-c|--constraint)(?:[\s=]|$)")
+
+
+def venv_python(venv_path: str) -> str:
+    return os.path.join(venv_path, 'Scripts', 'python.exe') if sys.platform == "win32" else os.path.join(venv_path, 'bin', 'python')
+
+
+def _bin_dir(venv_path: str) -> str:
+    return os.path.join(venv_path, 'Scripts' if sys.platform == "win32" else 'bin')
+
+
+def normalize_requirements(requirements: list) -> list:
+    """
+    Canonical, sorted, de-duplicated requirement lines: comments and blank lines
+    dropped, project names lower-cased with runs of -_. collapsed to "-" (PEP 503)
+    and whitespace removed from version specifiers.
+    """
+    normalized = set()
+    for line in requirements:
+        line = line.split(" #", 1)[0].strip()
+        if not line or line.startswith('#'):
+            continue
+        match = REQUIREMENT_NAME.match(line)
+        if match and not line.startswith('-'):
+            name, rest = match.groups()
+            line = re.sub(r"[-_.]+", "-", name).lower() + re.sub(r"\s+", "", rest)
+        normalized.add(line)
+    return sorted(normalized)
+
+
+def local_references(requirements: list) -> list:
+    """
+    Requirement lines that name local files or directories ("-e .", "-r base.txt",
+    "./pkg"). What they install depends on the repository they come from, so two
+    projects with the same lines can need different environments.
+    """
+    local = []
+    for line in normalize_requirements(requirements):
+        if FILE_OPTION.match(line) or ("://" not in line and (line.startswith(('.', '~')) or '/' in line or '\\' in line)):
+            local.append(line)
+    return local
+
+
+def environment_key(requirements: list) -> str:
+    """Hash of the interpreter, platform and normalized requirements; equal keys can share one venv."""
+    identity = json.dumps({"python": sys.version, "platform": sys.platform, "requirements": normalize_requirements(requirements)})
+    return hashlib.sha256(identity.encode("utf-8")).hexdigest()[:24]
+
+
+def _link_or_copy(source, destination):
+    """Hard-links a file into the clone, copying instead where links are not possible (e.g. across devices)."""
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copy2(source, destination)
+    return destination
+
+
+class EnvironmentCache:
+    """
+    Reusable virtual environments keyed by their normalized dependency set.
+
+    The first request for a dependency set builds a template venv, installing
+    from a shared local wheelhouse (filled with `pip wheel` only for packages it
+    does not hold yet). Later requests clone the template with hard links, which
+    takes no network and almost no disk; only the few files that embed the venv's
+    own path (script shebangs, activate scripts) are rewritten, as new files so
+    the template is never modified through a shared link.
+    """
+    def __init__(self, root: str = ".miso_cache/envs", timeout: int = 1800):
+        self.root = os.path.abspath(root)
+        self.templates_dir = os.path.join(self.root, "templates")
+        self.wheelhouse = os.path.join(self.root, "wheelhouse")
+        self.timeout = timeout
+        os.makedirs(self.templates_dir, exist_ok=True)
+        os.makedirs(self.wheelhouse, exist_ok=True)
+
+    @contextlib.contextmanager
+    def _key_lock(self, key: str):
+        """Holds an exclusive lock on one template across processes while it is checked, built and published."""
+        with open(os.path.join(self.templates_dir, f"{key}.lock"), "a+b") as lock_file:
+            if sys.platform == "win32":
+                lock_file.seek(0)
+                while True:
+                    try:
+                        msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:  # LK_LOCK gives up after about 10 seconds; keep waiting for the builder.
+                        continue
+            else:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if sys.platform == "win32":
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+                else:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _pip(self, python: str, args: list):
+        return subprocess.run([python, "-m", "pip", *args], check=True, capture_output=True, text=True,
+                              encoding='utf-8', timeout=self.timeout)
+
+    def _install_from_wheelhouse(self, python: str, requirements: list):
+        offline = ["install", "--no-index", "--find-links", self.wheelhouse, *requirements]
+        try:
+            self._pip(python, offline)
+            return
+        except subprocess.CalledProcessError:
+            logger.info("Wheelhouse is missing packages; downloading and building wheels once...")
+        self._pip(python, ["wheel", "--wheel-dir", self.wheelhouse, *requirements])
+        self._pip(python, offline)
+
+    def _build_template(self, key: str, requirements: list) -> str:
+        template = os.path.join(self.templates_dir, key)
+        staging = f"{template}.tmp-{os.getpid()}"
+        shutil.rmtree(staging, ignore_errors=True)
+        logger.info(f"Building environment template {key} for {len(requirements)} requirement(s)...")
+        try:
+            subprocess.run([sys.executable, "-m", "venv", staging], check=True, capture_output=True, text=True, encoding='utf-8')
+            self._install_from_wheelhouse(venv_python(staging), requirements)
+            with open(os.path.join(staging, MARKER_NAME), 'w', encoding='utf-8') as f:
+                json.dump({"key": key, "requirements": requirements, "template": template}, f, indent=2)
+            # The template's recorded paths must name its final location before it is published.
+            self._relocate(staging, staging, template)
+            os.rename(staging, template)
+        except OSError:
+            if not os.path.isdir(template):
+                raise
+            logger.info(f"Environment template {key} was built concurrently; using that one.")
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        return template
+
+    def _relocate(self, venv_path: str, old_prefix: str, new_prefix: str):
+        """Rewrites text files in the venv's script directory that embed old_prefix, replacing rather than editing them."""
+        bin_dir = _bin_dir(venv_path)
+        old, new = old_prefix.encode(), new_prefix.encode()
+        for name in os.listdir(bin_dir):
+            path = os.path.join(bin_dir, name)
+            if os.path.islink(path) or not os.path.isfile(path):
+                continue
+            with open(path, 'rb') as f:
+                content = f.read()
+            if old not in content or b"\0" in content[:1024]:
+                continue
+            mode = os.stat(path).st_mode
+            os.remove(path)  # Break any hard link to the template before writing.
+            with open(path, 'wb') as f:
+                f.write(content.replace(old, new))
+            os.chmod(path, mode)
+
+    def _is_current(self, venv_path: str, key: str) -> bool:
+        try:
+            with open(os.path.join(venv_path, MARKER_NAME), 'r', encoding='utf-8') as f:
+                return json.load(f).get("key") == key and os.path.exists(venv_python(venv_path))
+        except (OSError, ValueError):
+            return False
+
+    def provision(self, venv_path: str, requirements: list) -> tuple:
+        """
+        Makes venv_path an environment with exactly these requirements installed. Returns
+        (python_executable, how) where how is "existing", "cloned" or "built". Raises
+        ValueError for requirements with local references, which cannot be shared.
+        """
+        local = local_references(requirements)
+        if local:
+            raise ValueError(f"Requirements name local paths and cannot be cached: {', '.join(local)}")
+        requirements = normalize_requirements(requirements)
+        key = environment_key(requirements)
+        venv_path = os.path.abspath(venv_path)
+        if self._is_current(venv_path, key):
+            return venv_python(venv_path), "existing"
+
+        template = os.path.join(self.templates_dir, key)
+        how = "cloned"
+        # Only the lock holder may remove or publish this template, so a template another
+        # process has just published is never mistaken for a stale one and deleted.
+        with self._key_lock(key):
+            if not self._is_current(template, key):
+                shutil.rmtree(template, ignore_errors=True)  # A template left half-written by a crash.
+                template = self._build_template(key, requirements)
+                how = "built"
+        shutil.rmtree(venv_path, ignore_errors=True)
+        shutil.copytree(template, venv_path, symlinks=True, copy_function=_link_or_copy)
+        self._relocate(venv_path, template, venv_path)
+        logger.info(f"Environment at {venv_path} {how} from template {key}.")
+        return venv_python(venv_path), how
@@ -0,0 +1,124 @@
+import os
+import posixpath
+import re
+
+# Architectural roles, lowest first. Ranks only order files that the plan does not
+# order itself: they decide which side of a mutual reference or a dependency cycle
+# is generated first, so config and models come before the routes that use them.
+ROLE_RANKS = [
+    (0, ("config", "settings", "constants")),
+    (1, ("model", "schema", "db", "database", "util", "helper", "exception", "error")),
+    (2, ("service", "manager", "controller", "handler", "task", "logic", "core")),
+    (3, ("route", "view", "api", "endpoint", "blueprint", "app", "main", "cli", "server", "run")),
+    (4, ("test",)),
+]
+DEFAULT_RANK = 2
+
+
+def flatten_file_structure(file_structure: dict, prefix: str = "") -> list:
+    """
+    Flattens a plan's nested file_structure into an ordered list of (relative_path, description).
+    Paths always use "/", like the declared dependencies they are matched against.
+    """
+    files = []
+    for name, content in file_structure.items():
+        rel_path = posixpath.join(prefix, name) if prefix else name
+        if isinstance(content, dict):
+            files.extend(flatten_file_structure(content, rel_path))
+        elif isinstance(content, str):
+            files.append((rel_path, content))
+    return files
+
+
+def role_rank(rel_path: str) -> int:
+    """Ranks a file by the architectural role suggested by its path."""
+    parts = os.path.splitext(rel_path.replace("\\", "/").lower())[0].split("/")
+    # The file name decides; enclosing directories (nearest first) are the fallback.
+    for part in reversed(parts):
+        for rank, keywords in reversed(ROLE_RANKS):
+            if any(part.startswith(keyword) or part.endswith(keyword) or part.endswith(keyword + "s") for keyword in keywords):
+                return rank
+    return DEFAULT_RANK
+
+
+def reference_patterns(rel_path: str) -> list:
+    """Patterns a description might use to refer to a file: its path, file name or module."""
+    normalized = rel_path.replace("\\", "/")
+    names = {normalized, os.path.basename(normalized)}
+    patterns = []
+    if normalized.endswith(".py"):
+        module = os.path.splitext(normalized)[0].replace("/", ".")
+        if module.endswith(".__init__"):
+            module = module[:-len(".__init__")]
+        if "." in module:
+            names.add(module)
+        # A bare module name is a common word ("user", "app"), so only count it in an import or backticks.
+        bare = re.escape(module.rsplit(".", 1)[-1])
+        patterns.append(re.compile(rf"(?:\b(?:import|from)\s+(?:[\w.]+\.)?{bare}\b|`{bare}`)"))
+    patterns.extend(re.compile(r"(?<![\w./])" + re.escape(name) + r"(?![\w/])") for name in names if len(name) > 2)
+    return patterns
+
+
+def build_dependency_graph(files: list, declared_dependencies: dict = None) -> dict:
+    """
+    Derives which files each file depends on, using only what the plan states:
+    dependencies it declares ({path: [paths]}) and references to another file's
+    path or module name in a description. When two descriptions refer to each
+    other, only the reference to the lower-rank file is kept (equal ranks are
+    left to plan_generation_waves to break).
+    """
+    paths = [path for path, _ in files]
+    known = set(paths)
+    ranks = {path: role_rank(path) for path in paths}
+    patterns = {path: reference_patterns(path) for path in paths}
+    referenced = {path: set() for path in paths}
+    for path, description in files:
+        referenced[path].update(other for other in paths if other != path and any(p.search(description) for p in patterns[other]))
+
+    explicit = {path: set() for path in paths}
+    for path, others in referenced.items():
+        explicit[path].update(other for other in others if path not in referenced[other] or ranks[other] <= ranks[path])
+
+    for path, deps in (declared_dependencies or {}).items():
+        path = path.replace("\\", "/")
+        if path not in known:
+            continue
+        for dep in deps or []:
+            dep = dep.replace("\\", "/")
+            if dep in known and dep != path:
+                explicit[path].add(dep)
+    return explicit
+
+
+def plan_generation_waves(graph: dict) -> list:
+    """
+    Groups files into waves with Kahn's algorithm: every file only depends on
+    files from earlier waves. Cycles are broken by releasing the lowest-rank file,
+    and within a wave lower-rank files are started first.
+    """
+    order = {path: i for i, path in enumerate(graph)}
+    remaining = {path: set(deps) for path, deps in graph.items()}
+    waves = []
+    while remaining:
+        ready = [path for path, deps in remaining.items() if not deps]
+        if not ready:
+            ready = [min(remaining, key=lambda p: (role_rank(p), len(remaining[p]), order[p]))]
+        ready.sort(key=lambda p: (role_rank(p), order[p]))
+        waves.append(ready)
+        for path in ready:
+            del remaining[path]
+        for deps in remaining.values():
+            deps.difference_update(ready)
+    return waves
+
+
+def transitive_dependencies(graph: dict, path: str) -> list:
+    """Returns every file a file depends on, directly or indirectly, in plan order."""
+    seen, stack = set(), list(graph.get(path, ()))
+    while stack:
+        dep = stack.pop()
+        if dep in seen or dep == path:
+            continue
+        seen.add(dep)
+        stack.extend(graph.get(dep, ()))
+    return [p for p in graph if p in seen]
@@ -0,0 +1,94 @@
+import hashlib
+import logging
+import os
+import re
+import shutil
+import subprocess
+import time
+
+logger = logging.getLogger("GitMirrorCache")
+
+LAST_USED_NAME = "miso_last_used"
+
+
+def _git(args: list, cwd: str = None, timeout: int = 900) -> str:
+    result = subprocess.run(["git", *args], cwd=cwd, capture_output=True, text=True, check=True,
+                            encoding='utf-8', timeout=timeout)
+    return result.stdout.strip()
+
+
+def _file_url(path: str) -> str:
+    # --depth is ignored for plain local paths; it needs a file:// URL.
+    return "file://" + os.path.abspath(path).replace(os.sep, "/")
+
+
+class GitMirrorCache:
+    """
+    Bare mirrors of acquired repositories, from which working copies are made.
+
+    A repository's full history is fetched from its remote once into a bare
+    mirror and refreshed incrementally after that; working copies are shallow
+    clones of the local mirror, so they cost one local checkout. At most
+    max_mirrors mirrors are kept, least recently used first out.
+    """
+    def __init__(self, root: str = ".miso_cache/git_mirrors", max_mirrors: int = 20):
+        self.root = os.path.abspath(root)
+        self.max_mirrors = max_mirrors
+        os.makedirs(self.root, exist_ok=True)
+
+    def mirror_path(self, url: str) -> str:
+        name = re.sub(r"[^A-Za-z0-9_.-]", "_", os.path.basename(url.rstrip("/")).removesuffix(".git")) or "repo"
+        return os.path.join(self.root, f"{name}-{hashlib.sha1(url.encode('utf-8')).hexdigest()[:12]}.git")
+
+    def ensure_mirror(self, url: str, refresh: bool = True) -> str:
+        """Returns the bare mirror for url, creating it or fetching only what changed since the last refresh."""
+        mirror = self.mirror_path(url)
+        if os.path.isdir(mirror):
+            if refresh:
+                logger.info(f"Refreshing mirror of {url}...")
+                _git(["remote", "update", "--prune"], cwd=mirror)
+                _git(["gc", "--auto", "--quiet"], cwd=mirror)
+        else:
+            staging = f"{mirror}.tmp-{os.getpid()}"
+            shutil.rmtree(staging, ignore_errors=True)
+            logger.info(f"Creating mirror of {url}...")
+            try:
+                _git(["clone", "--mirror", "--quiet", url, staging])
+                os.rename(staging, mirror)
+            except OSError:
+                if not os.path.isdir(mirror):
+                    raise
+            finally:
+                shutil.rmtree(staging, ignore_errors=True)
+        with open(os.path.join(mirror, LAST_USED_NAME), "w", encoding="utf-8") as f:
+            f.write(str(time.time()))
+        self._prune(keep=mirror)
+        return mirror
+
+    def checkout(self, url: str, destination: str, depth: int = 1, refresh: bool = True) -> str:
+        """
+        Makes destination a shallow working copy of url's default branch, served from the
+        local mirror. An existing working copy is updated in place; untracked files (such
+        as a .venv) are kept.
+        """
+        mirror_url = _file_url(self.ensure_mirror(url, refresh=refresh))
+        if os.path.isdir(os.path.join(destination, ".git")):
+            _git(["fetch", "--quiet", f"--depth={depth}", mirror_url, "HEAD"], cwd=destination)
+            _git(["reset", "--quiet", "--hard", "FETCH_HEAD"], cwd=destination)
+            logger.info(f"Updated working copy at {destination}.")
+        else:
+            _git(["clone", "--quiet", f"--depth={depth}", mirror_url, destination])
+            _git(["remote", "set-url", "origin", url], cwd=destination)
+            logger.info(f"Created shallow working copy at {destination}.")
+        return destination
+
+    def _prune(self, keep: str):
+        mirrors = []
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if name.endswith(".git") and os.path.isdir(path) and path != keep:
+                marker = os.path.join(path, LAST_USED_NAME)
+                mirrors.append((os.path.getmtime(marker) if os.path.exists(marker) else 0.0, path))
+        for _, path in sorted(mirrors)[:max(0, len(mirrors) + 1 - self.max_mirrors)]:
+            logger.info(f"Evicting least recently used mirror {os.path.basename(path)}.")
+            shutil.rmtree(path, ignore_errors=True)
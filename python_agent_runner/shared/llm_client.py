@@ -0,0 +1,317 @@
+import logging
+import os
+import threading
+import time
+
+import httpx
+import ollama
+
+from .llm_cache import CACHE_MODES, LLMResponseCache, make_cache_key
+
+logger = logging.getLogger("LLMClient")
+
+
+class LLMClientError(Exception):
+    """Base class for errors raised by the shared LLM client."""
+
+
+class LLMBackpressureError(LLMClientError):
+    """Raised when a model's request queue is full or a queued request waits too long."""
+
+
+class LLMCacheMissError(LLMClientError):
+    """Raised in replay mode when a request has no cached response."""
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def _response_field(response, key):
+    """Reads a field from an ollama response object or a plain dict."""
+    try:
+        return response[key]
+    except (KeyError, TypeError, IndexError):
+        return getattr(response, key, None)
+
+
+def _response_to_dict(response) -> dict:
+    if hasattr(response, "model_dump"):
+        return response.model_dump(mode="json", exclude_none=True)
+    return dict(response)
+
+
+class _ModelGate:
+    """Bounds the number of in-flight and queued requests for a single model."""
+    def __init__(self, max_concurrency: int, max_queue: int):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self._condition = threading.Condition()
+        self.waiting = 0
+        self.in_flight = 0
+
+    def acquire(self, model: str, queue_timeout: float):
+        with self._condition:
+            if self.waiting >= self.max_queue:
+                raise LLMBackpressureError(f"Request queue for model '{model}' is full ({self.max_queue} waiting).")
+            self.waiting += 1
+            try:
+                acquired = self._condition.wait_for(lambda: self.in_flight < self.max_concurrency, timeout=queue_timeout)
+            finally:
+                self.waiting -= 1
+            if not acquired:
+                raise LLMBackpressureError(f"Timed out after {queue_timeout}s waiting for a '{model}' slot.")
+            self.in_flight += 1
+
+    def release(self):
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify()
+
+    def resize(self, max_concurrency: int):
+        """Changes the limit in place. Requests already in flight keep their slots; no new
+        request starts until in_flight drops below the new limit."""
+        with self._condition:
+            self.max_concurrency = max_concurrency
+            self._condition.notify_all()
+
+
+class _ModelStats:
+    """Per-model call counters."""
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.rejected = 0
+        self.cache_hits = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.queue_wait = 0.0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def as_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "rejected": self.rejected,
+            "cache_hits": self.cache_hits,
+            "total_latency_s": round(self.total_latency, 3),
+            "avg_latency_s": round(self.total_latency / self.calls, 3) if self.calls else 0.0,
+            "max_latency_s": round(self.max_latency, 3),
+            "total_queue_wait_s": round(self.queue_wait, 3),
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+        }
+
+
+class LLMClient:
+    """
+    Process-wide gateway to the Ollama server.
+
+    Wraps a single keep-alive ollama.Client so every agent shares one HTTP
+    connection pool, and puts a per-model concurrency limit with a bounded
+    wait queue in front of it. Every call records latency and token counts.
+
+    Chat responses can be served from a persistent LLMResponseCache. In
+    "readwrite" mode misses go to the server and are stored; in "replay" mode
+    misses raise LLMCacheMissError so a pipeline run is fully deterministic.
+    """
+    def __init__(self, host=None, max_concurrency=None, max_queue=None, queue_timeout=None,
+                 request_timeout=None, model_limits=None, cache_mode=None, cache_path=None):
+        self.host = host or os.environ.get("OLLAMA_HOST")
+        self.max_concurrency = max_concurrency or _env_int("MISO_LLM_MAX_CONCURRENCY", 2)
+        self.max_queue = max_queue or _env_int("MISO_LLM_MAX_QUEUE", 32)
+        self.queue_timeout = queue_timeout or _env_float("MISO_LLM_QUEUE_TIMEOUT", 600.0)
+        self.request_timeout = request_timeout or _env_float("MISO_LLM_REQUEST_TIMEOUT", 600.0)
+        self.model_limits = dict(model_limits or {})
+
+        pool_size = max([self.max_concurrency, *self.model_limits.values()]) * 4
+        self._client = ollama.Client(
+            host=self.host,
+            timeout=httpx.Timeout(self.request_timeout, connect=10.0),
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size, keepalive_expiry=60.0),
+        )
+        self._gates = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+        self.cache_mode = (cache_mode or os.environ.get("MISO_LLM_CACHE_MODE", "off")).lower()
+        if self.cache_mode not in CACHE_MODES:
+            raise ValueError(f"Unknown LLM cache mode '{self.cache_mode}'. Expected one of {CACHE_MODES}.")
+        self.cache = None
+        if self.cache_mode != "off":
+            self.cache = LLMResponseCache(
+                cache_path or os.environ.get("MISO_LLM_CACHE_PATH", ".miso_cache/llm_responses.sqlite3"),
+                max_bytes=_env_int("MISO_LLM_CACHE_MAX_MB", 256) * 1024 * 1024,
+            )
+        logger.info(f"LLMClient initialized for host {self.host or 'default'} "
+                    f"(concurrency={self.max_concurrency}/model, queue={self.max_queue}).")
+
+    def set_model_limit(self, model: str, max_concurrency: int):
+        """Overrides the concurrency limit for one model, resizing its gate if it is already in use."""
+        with self._lock:
+            self.model_limits[model] = max_concurrency
+            gate = self._gates.get(model)
+        if gate is not None:
+            gate.resize(max_concurrency)
+
+    def _gate(self, model: str) -> _ModelGate:
+        with self._lock:
+            gate = self._gates.get(model)
+            if gate is None:
+                gate = _ModelGate(self.model_limits.get(model, self.max_concurrency), self.max_queue)
+                self._gates[model] = gate
+            return gate
+
+    def _model_stats(self, model: str) -> _ModelStats:
+        with self._lock:
+            return self._stats.setdefault(model, _ModelStats())
+
+    def _record(self, model: str, started: float, queue_wait: float, response=None, failed=False):
+        latency = time.perf_counter() - started
+        stats = self._model_stats(model)
+        with self._lock:
+            stats.calls += 1
+            stats.total_latency += latency
+            stats.max_latency = max(stats.max_latency, latency)
+            stats.queue_wait += queue_wait
+            if failed:
+                stats.errors += 1
+            elif response is not None:
+                stats.prompt_tokens += _response_field(response, "prompt_eval_count") or 0
+                stats.completion_tokens += _response_field(response, "eval_count") or 0
+
+    def _enter(self, model: str) -> tuple:
+        """Waits for a slot on the model's gate. Returns (gate, queued_at)."""
+        gate = self._gate(model)
+        queued_at = time.perf_counter()
+        try:
+            gate.acquire(model, self.queue_timeout)
+        except LLMBackpressureError:
+            stats = self._model_stats(model)
+            with self._lock:
+                stats.rejected += 1
+            raise
+        return gate, queued_at
+
+    def _call(self, model: str, fn, **kwargs):
+        if kwargs.get("stream"):
+            return self._stream(model, fn, kwargs)
+        gate, queued_at = self._enter(model)
+        started = time.perf_counter()
+        try:
+            response = fn(model=model, **kwargs)
+        except Exception:
+            gate.release()
+            self._record(model, started, started - queued_at, failed=True)
+            raise
+        gate.release()
+        self._record(model, started, started - queued_at, response=response)
+        return response
+
+    def _stream(self, model: str, fn, kwargs: dict):
+        """
+        Takes the model slot on the first next() (so a stream that is never iterated holds
+        nothing), holds it until the stream is exhausted or closed, then records the final
+        chunk's counters.
+        """
+        gate, queued_at = self._enter(model)
+        started = time.perf_counter()
+        last_chunk = None
+        failed = False
+        try:
+            for chunk in fn(model=model, **kwargs):
+                last_chunk = chunk
+                yield chunk
+        except Exception:
+            failed = True
+            raise
+        finally:
+            gate.release()
+            self._record(model, started, started - queued_at, response=last_chunk, failed=failed)
+
+    def chat(self, model: str, messages: list, **kwargs):
+        """Same signature and return value as ollama.chat."""
+        if self.cache is None:
+            return self._call(model, self._client.chat, messages=messages, **kwargs)
+
+        stream = kwargs.get("stream", False)
+        key = make_cache_key(model, messages, **{k: v for k, v in kwargs.items() if k not in ("stream", "keep_alive")})
+        cached = self.cache.get(key)
+        if cached is not None:
+            stats = self._model_stats(model)
+            with self._lock:
+                stats.cache_hits += 1
+            response = ollama.ChatResponse.model_validate(cached)
+            return iter([response]) if stream else response
+        if self.cache_mode == "replay":
+            raise LLMCacheMissError(f"No cached response for '{model}' request {key[:12]} (replay mode).")
+
+        response = self._call(model, self._client.chat, messages=messages, **kwargs)
+        if stream:
+            return self._cache_stream(key, model, response)
+        self.cache.put(key, model, _response_to_dict(response))
+        return response
+
+    def _cache_stream(self, key: str, model: str, chunks):
+        """Passes a chat stream through and stores the assembled response once it completes."""
+        content = []
+        last_chunk = None
+        for chunk in chunks:
+            content.append(chunk["message"]["content"] or "")
+            last_chunk = chunk
+            yield chunk
+        if last_chunk is not None and _response_field(last_chunk, "done"):
+            assembled = _response_to_dict(last_chunk)
+            assembled.setdefault("message", {"role": "assistant"})["content"] = "".join(content)
+            self.cache.put(key, model, assembled)
+
+    def embeddings(self, model: str, prompt: str, **kwargs):
+        """Same signature and return value as ollama.embeddings."""
+        return self._call(model, self._client.embeddings, prompt=prompt, **kwargs)
+
+    def embed(self, model: str, input, **kwargs):
+        """Same signature and return value as ollama.embed (batched embeddings)."""
+        return self._call(model, self._client.embed, input=input, **kwargs)
+
+    def get_stats(self) -> dict:
+        """Returns a snapshot of per-model counters plus current queue depth."""
+        with self._lock:
+            snapshot = {model: stats.as_dict() for model, stats in self._stats.items()}
+            for model, gate in self._gates.items():
+                entry = snapshot.setdefault(model, _ModelStats().as_dict())
+                entry["in_flight"] = gate.in_flight
+                entry["queued"] = gate.waiting
+                entry["max_concurrency"] = gate.max_concurrency
+        return snapshot
+
+    def get_cache_stats(self) -> dict:
+        """Returns hit/miss statistics of the response cache, or just the mode when caching is off."""
+        if self.cache is None:
+            return {"mode": self.cache_mode}
+        return {"mode": self.cache_mode, **self.cache.get_stats()}
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_llm_client(host=None) -> LLMClient:
+    """Returns the shared LLMClient for a host, creating it on first use."""
+    key = host or os.environ.get("OLLAMA_HOST") or "default"
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = LLMClient(host=host)
+            _clients[key] = client
+        return client
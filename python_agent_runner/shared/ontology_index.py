@@ -0,0 +1,182 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger("OntologyIndex")
+
+
+class OntologyIndex:
+    """
+    Persistent SQLite index of analyzed Python files and the entities they define.
+
+    Each file row records the mtime, size and sha256 it was parsed at, so
+    re-analysis only touches files that changed. Entities are keyed by
+    (file, qualified name), e.g. "GenesisAgent.create_codebase", so the same
+    name defined in several files or classes never collides.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                mtime REAL NOT NULL,
+                size INTEGER NOT NULL,
+                sha256 TEXT NOT NULL,
+                parsed INTEGER NOT NULL,
+                imports TEXT NOT NULL DEFAULT '[]'
+            );
+            CREATE TABLE IF NOT EXISTS entities (
+                file_path TEXT NOT NULL REFERENCES files(path) ON DELETE CASCADE,
+                qualified_name TEXT NOT NULL,
+                name TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                lineno INTEGER NOT NULL,
+                end_lineno INTEGER,
+                docstring TEXT,
+                methods TEXT,
+                PRIMARY KEY (file_path, qualified_name)
+            );
+            CREATE INDEX IF NOT EXISTS idx_entities_name ON entities(name);
+            CREATE TABLE IF NOT EXISTS roots (
+                path TEXT PRIMARY KEY,
+                analyzed_at REAL NOT NULL
+            );
+        """)
+        self._conn.commit()
+
+    @staticmethod
+    def _under(directory: str):
+        """LIKE pattern matching every path below directory."""
+        prefix = os.path.join(os.path.abspath(directory), "")
+        return prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+    def add_root(self, directory: str):
+        """Records directory as an analyzed project root."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO roots (path, analyzed_at) VALUES (?, ?)", (os.path.abspath(directory), time.time())
+            )
+
+    def indexed_root(self, directory: str):
+        """Returns the analyzed root that directory is (or lies inside), compared by real path, or None."""
+        target = os.path.realpath(directory)
+        with self._lock:
+            roots = [row[0] for row in self._conn.execute("SELECT path FROM roots ORDER BY length(path) DESC")]
+        for root in roots:
+            real_root = os.path.realpath(root)
+            if os.path.commonpath([real_root, target]) == real_root:
+                return root
+        return None
+
+    def file_states(self, directory: str) -> dict:
+        """Returns {path: (mtime, size, sha256)} for every indexed file under directory."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT path, mtime, size, sha256 FROM files WHERE path LIKE ? ESCAPE '\\'", (self._under(directory),)
+            ).fetchall()
+        return {path: (mtime, size, sha256) for path, mtime, size, sha256 in rows}
+
+    def file_state(self, path: str):
+        with self._lock:
+            return self._conn.execute("SELECT mtime, size, sha256 FROM files WHERE path = ?", (path,)).fetchone()
+
+    def update_files(self, records: list):
+        """
+        Stores analysis results in one transaction. Each record is (path, mtime, size, result)
+        where result is None for a file that could not be read, {"sha256"} alone when the
+        content was unchanged, or the full analysis (sha256, imports, entities).
+        """
+        with self._lock, self._conn:
+            for path, mtime, size, result in records:
+                if result is None:
+                    self._conn.execute("DELETE FROM files WHERE path = ?", (path,))
+                elif "entities" not in result:
+                    self._conn.execute("UPDATE files SET mtime = ?, size = ? WHERE path = ?", (mtime, size, path))
+                else:
+                    self._conn.execute("DELETE FROM files WHERE path = ?", (path,))
+                    self._conn.execute(
+                        "INSERT INTO files (path, mtime, size, sha256, parsed, imports) VALUES (?, ?, ?, ?, ?, ?)",
+                        (path, mtime, size, result["sha256"], int(result["parsed"]), json.dumps(result["imports"])),
+                    )
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO entities (file_path, qualified_name, name, kind, lineno, end_lineno, docstring, methods) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        [
+                            (path, e["qualified_name"], e["name"], e["kind"], e["lineno"], e["end_lineno"], e["docstring"],
+                             json.dumps(e["methods"]) if e["methods"] is not None else None)
+                            for e in result["entities"]
+                        ],
+                    )
+
+    def remove_missing(self, directory: str, present: set) -> int:
+        """Drops indexed files under directory that no longer exist. Returns how many were removed."""
+        stale = [path for path in self.file_states(directory) if path not in present]
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM files WHERE path = ?", [(path,) for path in stale])
+        return len(stale)
+
+    def directory_summary(self, directory: str) -> dict:
+        """Returns parsed file count and every entity under directory as (file_path, qualified_name, name, kind) rows."""
+        pattern = self._under(directory)
+        with self._lock:
+            parsed = self._conn.execute(
+                "SELECT COUNT(*) FROM files WHERE parsed = 1 AND path LIKE ? ESCAPE '\\'", (pattern,)
+            ).fetchone()[0]
+            failed = self._conn.execute(
+                "SELECT COUNT(*) FROM files WHERE parsed = 0 AND path LIKE ? ESCAPE '\\'", (pattern,)
+            ).fetchone()[0]
+            entities = self._conn.execute(
+                "SELECT file_path, qualified_name, name, kind FROM entities WHERE file_path LIKE ? ESCAPE '\\' "
+                "ORDER BY file_path, lineno", (pattern,)
+            ).fetchall()
+        return {"files_parsed": parsed, "files_failed": failed, "entities": entities}
+
+    def top_level_entity_counts(self, directory: str) -> dict:
+        """Returns {path: number of module-level classes and functions} for every indexed file under directory."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT file_path, COUNT(*) FROM entities WHERE file_path LIKE ? ESCAPE '\\' "
+                "AND instr(qualified_name, '.') = 0 GROUP BY file_path", (self._under(directory),)
+            ).fetchall()
+        return dict(rows)
+
+    def file_entities(self, path: str) -> list:
+        """Returns (qualified_name, name, kind) for every entity of one file, in source order."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT qualified_name, name, kind FROM entities WHERE file_path = ? ORDER BY lineno", (path,)
+            ).fetchall()
+
+    def find_entity(self, path: str, entity_name: str):
+        """Looks up an entity in one file by qualified name, falling back to the first definition of a bare name."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT qualified_name, name, kind, lineno, end_lineno, docstring, methods FROM entities "
+                "WHERE file_path = ? AND (qualified_name = ? OR name = ?) "
+                "ORDER BY qualified_name = ? DESC, lineno LIMIT 1",
+                (path, entity_name, entity_name, entity_name),
+            ).fetchone()
+        if row is None:
+            return None
+        qualified_name, name, kind, lineno, end_lineno, docstring, methods = row
+        return {
+            "name": name,
+            "qualified_name": qualified_name,
+            "type": kind,
+            "lineno": lineno,
+            "end_lineno": end_lineno,
+            "docstring": docstring,
+            "methods": json.loads(methods) if methods is not None else None,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
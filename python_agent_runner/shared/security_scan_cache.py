@@ -0,0 +1,87 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger("SecurityScanCache")
+
+
+def content_hash(path: str):
+    """sha256 of a file's bytes, or None if it cannot be read."""
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+
+
+class SecurityScanCache:
+    """
+    Persistent bandit findings keyed by file content hash and scanner version.
+
+    Findings are stored without file names (only line, test id, severity and
+    text), so a file regenerated with identical content in another project is
+    never scanned twice.
+    """
+    def __init__(self, path: str, scanner_version: str):
+        self.path = path
+        self.scanner_version = scanner_version
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS scans (
+                sha256 TEXT NOT NULL,
+                scanner_version TEXT NOT NULL,
+                findings TEXT NOT NULL,
+                error TEXT,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (sha256, scanner_version)
+            );
+        """)
+        self._conn.commit()
+
+    def get_many(self, hashes: list) -> dict:
+        """Returns {sha256: {"findings", "error"}} for the hashes that are cached."""
+        found = {}
+        with self._lock:
+            for start in range(0, len(hashes), 500):
+                batch = hashes[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                for sha256, findings, error in self._conn.execute(
+                    f"SELECT sha256, findings, error FROM scans WHERE scanner_version = ? AND sha256 IN ({placeholders})",
+                    (self.scanner_version, *batch),
+                ):
+                    found[sha256] = {"findings": json.loads(findings), "error": error}
+            if found:
+                self._conn.executemany(
+                    "UPDATE scans SET last_used = ? WHERE sha256 = ? AND scanner_version = ?",
+                    [(time.time(), sha256, self.scanner_version) for sha256 in found],
+                )
+                self._conn.commit()
+        return found
+
+    def put_many(self, results: dict):
+        """Stores {sha256: {"findings", "error"}} in one transaction."""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO scans (sha256, scanner_version, findings, error, last_used) VALUES (?, ?, ?, ?, ?)",
+                [(sha256, self.scanner_version, json.dumps(result["findings"]), result.get("error"), now)
+                 for sha256, result in results.items()],
+            )
+
+    def prune(self, max_age_days: float = 30) -> int:
+        """Drops entries unused for max_age_days. Returns how many were removed."""
+        with self._lock, self._conn:
+            return self._conn.execute(
+                "DELETE FROM scans WHERE last_used < ?", (time.time() - max_age_days * 86400,)
+            ).rowcount
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
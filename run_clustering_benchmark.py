@@ -0,0 +1,67 @@
+import argparse
+import time
+import numpy as np
+from python_agent_runner.shared.clustering import CLUSTERING_METHODS, cluster_embeddings, count_nodes
+
+def make_embeddings(n, dim, n_topics, seed=0):
+    """Synthetic stand-in for code-chunk embeddings: noisy points around n_topics unit-norm topic vectors."""
+    rng = np.random.default_rng(seed)
+    topics = rng.standard_normal((n_topics, dim)).astype(np.float32)
+    topics /= np.linalg.norm(topics, axis=1, keepdims=True)
+    points = topics[rng.integers(n_topics, size=n)] + 0.6 * rng.standard_normal((n, dim)).astype(np.float32) / np.sqrt(dim)
+    return points / np.linalg.norm(points, axis=1, keepdims=True)
+
+def build_tree(embeddings, method, cluster_size):
+    """
+    Replays CodexIndexerAgent.index_project's level loop without the LLM: each
+    cluster's summary embedding is approximated by the mean of its members.
+    Returns (depth, seconds spent clustering, node count per level, halted).
+    """
+    levels = [len(embeddings)]
+    elapsed = 0.0
+    current = embeddings
+    while len(current) > 1:
+        started = time.perf_counter()
+        labels = cluster_embeddings(current, method=method, cluster_size=cluster_size) if method != "dbscan-raw" \
+            else CLUSTERING_METHODS["dbscan"](current)
+        elapsed += time.perf_counter() - started
+        if count_nodes(labels) >= len(current):
+            return len(levels) - 1, elapsed, levels, True
+        nodes = [current[labels == -1]]
+        clustered = labels != -1
+        if clustered.any():
+            n_clusters = labels[clustered].max() + 1
+            sums = np.zeros((n_clusters, current.shape[1]), dtype=np.float32)
+            np.add.at(sums, labels[clustered], current[clustered])
+            nodes.append(sums / np.linalg.norm(sums, axis=1, keepdims=True))
+        current = np.concatenate(nodes)
+        levels.append(len(current))
+    return len(levels) - 1, elapsed, levels, False
+
+def run_benchmark():
+    """Compares RAPTOR clustering methods on synthetic embeddings: time, tree depth and level sizes."""
+    parser = argparse.ArgumentParser(description="Benchmark RAPTOR clustering methods.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[500, 2000, 10000])
+    parser.add_argument("--dim", type=int, default=1024, help="Embedding width (mxbai-embed-large is 1024).")
+    parser.add_argument("--topics", type=int, default=50)
+    parser.add_argument("--cluster-size", type=int, default=6)
+    parser.add_argument("--methods", nargs="+", default=["dbscan-raw", "dbscan", "gmm", "kmeans", "neighbours"])
+    parser.add_argument("--dbscan-max", type=int, default=5000,
+                        help="Skip DBSCAN above this many nodes; its cosine distance matrix is quadratic in memory.")
+    args = parser.parse_args()
+
+    print("--- [MISO RAPTOR Clustering Benchmark] ---")
+    print("'dbscan-raw' is the original path (no reduction guarantee); 'dbscan' adds the k-means fallback.\n")
+    print(f"{'nodes':>7} {'method':>11} {'seconds':>9} {'depth':>6}  levels")
+    for n in args.sizes:
+        embeddings = make_embeddings(n, args.dim, args.topics)
+        for method in args.methods:
+            if method.startswith("dbscan") and n > args.dbscan_max:
+                print(f"{n:>7} {method:>11} {'skipped':>9}")
+                continue
+            depth, elapsed, levels, halted = build_tree(embeddings, method, args.cluster_size)
+            note = "  (halted: level did not shrink)" if halted else ""
+            print(f"{n:>7} {method:>11} {elapsed:>9.2f} {depth:>6}  {' -> '.join(map(str, levels))}{note}")
+
+if __name__ == "__main__":
+    run_benchmark()
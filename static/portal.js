@@ -40,7 +40,7 @@ document.addEventListener('DOMContentLoaded', () => {
             });
             const data = await response.json();
             if (data.task_id) {
-                pollIntervalId = setInterval(() => pollStatus(data.task_id), 3000);
+                pollIntervalId = setInterval(() => pollStatus(data.task_id), 1000);
             } else {
                 logContainer.textContent = `Error: ${data.error || 'Unknown error'}`;
                 resetCreateUi();
@@ -55,7 +55,11 @@ document.addEventListener('DOMContentLoaded', () => {
         try {
             const response = await fetch(`/api/status/${taskId}`);
             const data = await response.json();
-            logContainer.textContent = data.log_output || 'Waiting for log output...';
+            const progressLines = Object.values(data.progress || {}).map(
+                p => `[${p.state.toUpperCase()}] ${p.file} - ${p.bytes} bytes, ${p.chunks} chunks, ${p.elapsed_s}s`
+            );
+            const progressText = progressLines.length ? `--- FILE PROGRESS ---\n${progressLines.join('\n')}\n\n` : '';
+            logContainer.textContent = progressText + (data.log_output || 'Waiting for log output...');
             logContainer.scrollTop = logContainer.scrollHeight;
             if (data.status === 'COMPLETE' || data.status === 'FAILED') {
                 clearInterval(pollIntervalId);